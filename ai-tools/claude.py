@@ -1,3 +1,15 @@
+MANIFEST = {
+    'name': 'Claude Code',
+    'stdin': True,
+    'streaming': True,
+    'prompt_pieces': True,
+    'max_prompt_tokens': 180000,
+}
+
+def build_invocation(prompt):
+    # Return the argv for Anthropic Claude Code; the prompt is piped over stdin, piece by piece
+    return ['claude', '-p', '--allowedTools', 'Bash,Edit,Write'], prompt
+
 def execute(template_path):
     # Return the CLI string for Anthropic Claude Code
     with open(template_path, 'r') as file:
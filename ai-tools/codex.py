@@ -1,7 +1,25 @@
+# The prompt travels as a single argv entry, which Linux caps at 128 KiB including its terminating NUL
+MAX_PROMPT_BYTES = 128 * 1024 - 1
+
+MANIFEST = {
+    'name': 'OpenAI Codex',
+    'stdin': False,
+    'streaming': True,
+    'max_prompt_tokens': 30000,
+}
+
+def build_invocation(prompt):
+    # Return the argv for OpenAI Codex; the prompt is passed as one argument, no shell quoting needed.
+    # max_prompt_tokens is only an estimate, and non-ASCII text takes several bytes per character
+    size = len(prompt.encode('utf-8'))
+    if size > MAX_PROMPT_BYTES:
+        raise ValueError(f"prompt is {size} bytes, over the {MAX_PROMPT_BYTES}-byte limit for one codex argument")
+    return ['codex', '--approval-mode', 'full-auto', prompt], None
+
 def execute(template_path):
     # Return the CLI string for OpenAI Codex
     with open(template_path, 'r') as file:
         template = file.read()
     # Escape single quotes for shell: 'abc' -> 'a'"'"'b'"'"'c'
     escaped = template.replace("'", "'\"'\"'")
-    return f"codex --approval-mode full-auto '{escaped}'"
\ No newline at end of file
+    return f"codex --approval-mode full-auto '{escaped}'"
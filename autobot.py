@@ -4,30 +4,235 @@ import os
 import subprocess
 import json
 import glob
+import fnmatch
+import shlex
+import tempfile
+import threading
+import time
+import collections
+import gc
 import re
+import hashlib
+import math
+import ast
+import codecs
+import mmap
+import concurrent.futures
+import contextlib
+import io
+import socket
+import signal
 
 import importlib.util
+import shutil
+try:
+    import resource
+except ImportError:  # not available on Windows; peak memory is then left out of traces
+    resource = None
 
 SPECS_DIR = os.path.join(os.path.dirname(__file__), 'specs')
 AI_TOOLS_DIR = os.path.join(os.path.dirname(__file__), 'ai-tools')
 META_DIR = os.path.join(os.path.dirname(__file__), 'meta')
 CONFIG_FILE = os.path.join(os.path.dirname(__file__), '.autobot-config.json')
+CACHE_DIR = os.path.join(os.path.dirname(__file__), '.autobot-cache')
+SUMMARY_CACHE_VERSION = 1
+SPEC_INDEX_VERSION = 2
+SEARCH_INDEX_VERSION = 1
+AI_CACHE_VERSION = 1
+UPDATE_SNAPSHOT_VERSION = 1
+INCLUDE_CACHE_VERSION = 1
+PLUGIN_REGISTRY_VERSION = 1
+AGENT_RECORDING_VERSION = 1
+# Read-only commands a running daemon answers on the CLI's behalf
+DAEMON_COMMANDS = ('help', 'ls', 'show', 'search', 'dryrun', 'config')
+# Per-run flags any command accepts; main() removes them before dispatching
+GLOBAL_FLAGS = ('--trace', '--record', '--replay', '--replay-latency', '--timeout', '--retries', '--fallback',
+                '--hedge-after')
+INCLUDE_PATTERN = re.compile(r'^\s*<!--\s*@include\s+([^\s#]+)(?:#(.+?))?\s*-->\s*$')
+DEFAULT_AI_CACHE_MAX_MB = 200
+DEFAULT_AI_CACHE_MAX_AGE_DAYS = 30
+DEFAULT_AI_RETRY_BACKOFF = 2.0  # seconds before the first retry; doubled for each further retry
+MAX_AI_RETRY_BACKOFF = 60.0
+DEFAULT_SEARCH_LIMIT = 10
+SEARCH_SNIPPET_CHARS = 120
+SEARCH_TOKEN_PATTERN = re.compile(r'[a-z0-9_]+')
+# Parts of a prompt that change on every run and must not keep identical runs from matching
+VOLATILE_PROMPT_PATTERN = re.compile(r'(this update is being performed on )\d{4}-\d\d-\d\d \d\d:\d\d:\d\d')
 DEFAULT_AI_TOOL = 'claude'
+IGNORED_DIRS = ['node_modules', '__pycache__', 'venv', 'env', 'dist', 'build', 'target']
+CONFIG_FILE_NAMES = ['package.json', 'requirements.txt', 'cargo.toml', 'go.mod', 'pom.xml', 'composer.json', 'gemfile', 'setup.py']
+IGNORE_FILE_NAMES = ['.gitignore', '.ignore', '.autobotignore']
+PRIORITY_PATTERNS = ['main', 'app', 'index', 'server', 'route', 'model', 'controller', 'service']
+# Path fragments that suggest which spec section a changed file affects (incremental update)
+UPDATE_SECTION_HINTS = {
+    'Database Schema': ('model', 'schema', 'migration', 'entity', 'entities', 'database', '/db/', '.sql', 'prisma'),
+    'Services': ('service', 'worker', 'job', 'task', 'lib/', 'core/'),
+    'Endpoints': ('route', 'api', 'controller', 'handler', 'endpoint', 'server', 'urls', 'views.py'),
+    'UI Layout': ('component', 'layout', 'template', 'style', '.css', '.scss', '.html', '.vue', '.jsx', '.tsx', '.svelte'),
+    'Pages': ('page', 'screen', 'view', 'template', '.html', '.vue'),
+    'Technical Requirements': ('package.json', 'requirements.txt', 'cargo.toml', 'go.mod', 'pom.xml', 'composer.json',
+                               'gemfile', 'setup.py', 'pyproject.toml', 'dockerfile', 'docker-compose'),
+}
+CHARS_PER_TOKEN = 4
+DEFAULT_SUMMARY_BUDGET = 8000  # tokens
+DEFAULT_CONTEXT_TOKENS = 100000  # largest prompt sent to an AI tool in one piece
+CHUNK_NOTE_TOKENS = 100  # room left in each chunk for the part-of-N note
+MIN_SUMMARY_FILE_CHARS = 400
+SUMMARY_EXTRACT_CHARS = 20000
+DEFAULT_SUMMARY_WORKERS = 8
+STREAM_TAIL_LINES = 10
+DEFAULT_GENERATE_JOBS = 4
+BINARY_SNIFF_BYTES = 8192
+READ_BLOCK_BYTES = 1024 * 1024
+WRITE_BLOCK_CHARS = 64 * 1024  # prompts are encoded and written to children and files in slices of this size
+PROMPT_TRUNCATION_NOTE = "\n... (truncated to fit the prompt size limit)\n"
+SKELETON_MAX_BYTES = 1024 * 1024  # larger files are outlined via mmap or sent as a prefix
+SUMMARY_INSTRUCTIONS = "Based on the above codebase information, please generate a comprehensive application specification following the standardized Autobot format. Focus on understanding WHAT this application does functionally, rather than HOW it's implemented technically. Create a technology-agnostic specification that could be used to rebuild this application with completely different technologies while preserving all core functionality and user experience."
+SOURCE_EXTENSIONS = ('.py', '.js', '.ts', '.jsx', '.tsx', '.java', '.go', '.rs', '.php', '.rb')
+
+MIN_SKELETON_SOURCE_CHARS = 1500
+SKELETON_VERSION = 1
+
+def _skeleton_patterns(*patterns):
+    # Compiled on first use (re caches it), so commands that never outline files skip the cost at startup
+    return b'|'.join(b'(?:' + p + b')' for p in patterns)
+
+_JS_PATTERNS = _skeleton_patterns(
+    rb'^[ \t]*(?:export[ \t]+)?(?:default[ \t]+)?(?:async[ \t]+)?function\*?[ \t]*\w*[ \t]*\([^)\n]*\).*$',
+    rb'^[ \t]*(?:export[ \t]+)?(?:default[ \t]+)?(?:abstract[ \t]+)?class[ \t]+\w+.*$',
+    rb'^[ \t]*(?:export[ \t]+)?(?:declare[ \t]+)?(?:interface|type|enum)[ \t]+\w+.*$',
+    rb'^[ \t]*(?:export[ \t]+)?(?:const|let|var)[ \t]+\w+[ \t]*(?::[^=\n]+)?=[ \t]*(?:async[ \t]+)?(?:\([^)\n]*\)|\w+)[ \t]*(?::[^=\n]+)?=>.*$',
+    rb'^[ \t]+(?:(?:public|private|protected|static|async|get|set|readonly)[ \t]+)*(?!(?:if|for|while|switch|catch|return|function)\b)\w+[ \t]*\([^)\n]*\)[ \t]*(?::[^{\n]+)?\{[ \t]*$',
+    rb'^.*\b(?:app|router|server|api)\.(?:get|post|put|patch|delete|all|use|route)[ \t]*\([ \t]*[\'"`].*$',
+    rb'^.*(?:\bnew[ \t]+[\w.]*Schema[ \t]*\(|\.(?:model|define)[ \t]*\([ \t]*[\'"]).*$',
+)
+
+SKELETON_PATTERNS = {
+    '.js': _JS_PATTERNS,
+    '.jsx': _JS_PATTERNS,
+    '.ts': _JS_PATTERNS,
+    '.tsx': _JS_PATTERNS,
+    '.go': _skeleton_patterns(
+        rb'^func[ \t]+(?:\([^)\n]*\)[ \t]*)?\w+.*$',
+        rb'^type[ \t]+\w+.*$',
+        rb'^[ \t]+\w+[ \t]+[\w.*\[\]]+[ \t]+`[^`\n]*`.*$',
+        rb'^.*\.(?:GET|POST|PUT|PATCH|DELETE|Handle|HandleFunc|Group)[ \t]*\([ \t]*".*$',
+    ),
+    '.java': _skeleton_patterns(
+        rb'^[ \t]*(?:(?:public|protected|private|abstract|final|static|sealed)[ \t]+)*(?:class|interface|enum|record|@interface)[ \t]+\w+.*$',
+        rb'^[ \t]*@(?:\w*Mapping|Entity|Table|Column|Id|RestController|Controller|Service|Repository|Path|GET|POST|PUT|DELETE)\b.*$',
+        rb'^[ \t]+(?:(?:public|protected|private|abstract|final|static|synchronized)[ \t]+)+[\w<>\[\], ?.]+[ \t]+\w+[ \t]*\([^)\n]*\).*$',
+    ),
+    '.rs': _skeleton_patterns(
+        rb'^[ \t]*(?:pub(?:\([^)\n]*\))?[ \t]+)?(?:async[ \t]+)?(?:unsafe[ \t]+)?fn[ \t]+\w+.*$',
+        rb'^[ \t]*(?:pub(?:\([^)\n]*\))?[ \t]+)?(?:struct|enum|trait|type|mod)[ \t]+\w+.*$',
+        rb'^[ \t]*impl\b.*$',
+        rb'^[ \t]*#\[(?:derive|get|post|put|patch|delete|route|table_name)\b.*$',
+        rb'^.*\.route[ \t]*\([ \t]*".*$',
+    ),
+    '.rb': _skeleton_patterns(
+        rb'^[ \t]*(?:class|module)[ \t]+[\w:]+.*$',
+        rb'^[ \t]*def[ \t]+[\w.?!=]+.*$',
+        rb'^[ \t]*(?:get|post|put|patch|delete|resources?|root|namespace|scope|match)[ \t]+[\'":].*$',
+        rb'^[ \t]*(?:has_many|has_one|belongs_to|has_and_belongs_to_many|validates|attr_accessor|before_action|create_table)\b.*$',
+    ),
+    '.php': _skeleton_patterns(
+        rb'^[ \t]*(?:(?:abstract|final|readonly)[ \t]+)*(?:class|interface|trait|enum)[ \t]+\w+.*$',
+        rb'^[ \t]*(?:(?:public|protected|private|static|abstract|final)[ \t]+)*function[ \t]+\w+[ \t]*\(.*$',
+        rb'^.*\bRoute::(?:get|post|put|patch|delete|resource|apiResource|match|any|group)[ \t]*\(.*$',
+        rb'^[ \t]*#\[(?:Route|ORM\\\w+)\b.*$',
+    ),
+}
+
+_spec_index = None
+_spec_ast_memo = {}
+_search_index_memo = {}
+_config_memo = {'stamp': None, 'data': {}}
+_module_memo = {}
+_plugin_registry = None
+_daemon_mode = False
+_trace = None
+_agent_session = None
+_policy_overrides = {}
+
+def read_plugin_manifest(tool_file):
+    """Read a plugin's MANIFEST dict and entry points from its source without importing it"""
+    with open(tool_file, 'rb') as f:
+        tree = ast.parse(f.read(), tool_file)
+    manifest = {}
+    entry_points = []
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name in ('build_invocation', 'execute'):
+            entry_points.append(node.name)
+        elif isinstance(node, ast.Assign) and any(isinstance(t, ast.Name) and t.id == 'MANIFEST' for t in node.targets):
+            try:
+                value = ast.literal_eval(node.value)
+            except ValueError:
+                continue
+            if isinstance(value, dict):
+                manifest = value
+    manifest = dict(manifest)
+    manifest['entry_points'] = entry_points
+    return manifest
+
+def get_plugin_registry():
+    """Return {tool name: manifest} for every plugin in AI_TOOLS_DIR, re-reading only changed plugin files"""
+    global _plugin_registry
+    try:
+        names = sorted(f[:-3] for f in os.listdir(AI_TOOLS_DIR) if f.endswith('.py') and not f.startswith('_'))
+    except OSError:
+        return {}
+    stamps = {name: get_file_stamp(os.path.join(AI_TOOLS_DIR, f"{name}.py")) for name in names}
+    if _plugin_registry is None:
+        data = load_json_file(get_cache_path('plugin-registry.json'), {})
+        valid = data.get('version') == PLUGIN_REGISTRY_VERSION and data.get('dir') == os.path.abspath(AI_TOOLS_DIR)
+        _plugin_registry = data.get('plugins', {}) if valid else {}
+    plugins = {}
+    changed = len(_plugin_registry) != len(names)
+    for name in names:
+        cached = _plugin_registry.get(name)
+        if cached and cached['stamp'] == list(stamps[name] or ()):
+            plugins[name] = cached
+            continue
+        try:
+            manifest = read_plugin_manifest(os.path.join(AI_TOOLS_DIR, f"{name}.py"))
+        except (OSError, SyntaxError, ValueError):
+            manifest = {'entry_points': []}
+        plugins[name] = {'stamp': list(stamps[name] or ()), 'manifest': manifest}
+        changed = True
+    _plugin_registry = plugins
+    if changed:
+        save_json_file(get_cache_path('plugin-registry.json'), {'version': PLUGIN_REGISTRY_VERSION,
+                                                                'dir': os.path.abspath(AI_TOOLS_DIR), 'plugins': plugins})
+    return {name: entry['manifest'] for name, entry in plugins.items()}
 
 def get_ai_tools():
+    return list(get_plugin_registry())
+
+def get_ai_tool_manifest(ai_tool):
+    return get_plugin_registry().get(ai_tool, {})
+
+def get_file_stamp(file_path):
     try:
-        return [f[:-3] for f in os.listdir(AI_TOOLS_DIR) if f.endswith('.py')]
-    except Exception:
-        return []
+        st = os.stat(file_path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
 
 def load_config():
-    try:
-        if os.path.exists(CONFIG_FILE):
-            with open(CONFIG_FILE, 'r') as f:
-                return json.load(f)
-    except Exception:
-        pass
-    return {}
+    # Re-read the file only when it changed; callers get their own copy to modify
+    stamp = get_file_stamp(CONFIG_FILE)
+    if stamp != _config_memo['stamp']:
+        data = {}
+        try:
+            if stamp:
+                with open(CONFIG_FILE, 'r') as f:
+                    data = json.load(f)
+        except Exception:
+            pass
+        _config_memo['stamp'] = stamp
+        _config_memo['data'] = data
+    return dict(_config_memo['data'])
 
 def save_config(config):
     try:
@@ -53,19 +258,1208 @@ def set_default_ai_tool(ai_tool):
     else:
         raise Exception("Failed to save configuration")
 
+def get_summary_workers():
+    """Number of threads used to read files for codebase summaries"""
+    workers = load_config().get('summary_workers', DEFAULT_SUMMARY_WORKERS)
+    return workers if isinstance(workers, int) and workers > 0 else DEFAULT_SUMMARY_WORKERS
+
+def get_ai_cache_limits():
+    """Return (max bytes, max age in seconds) for the AI result cache"""
+    config = load_config()
+    max_mb = config.get('ai_cache_max_mb', DEFAULT_AI_CACHE_MAX_MB)
+    max_days = config.get('ai_cache_max_age_days', DEFAULT_AI_CACHE_MAX_AGE_DAYS)
+    if not isinstance(max_mb, (int, float)) or max_mb < 0:
+        max_mb = DEFAULT_AI_CACHE_MAX_MB
+    if not isinstance(max_days, (int, float)) or max_days < 0:
+        max_days = DEFAULT_AI_CACHE_MAX_AGE_DAYS
+    return int(max_mb * 1024 * 1024), max_days * 86400
+
+def get_execution_policy():
+    """Return the timeout, retry, fallback and hedging settings for AI tool runs, with command-line flags winning"""
+    config = dict(load_config())
+    config.update(_policy_overrides)
+    policy = {'timeout': None, 'retries': 0, 'backoff': DEFAULT_AI_RETRY_BACKOFF, 'fallback': [], 'hedge_after': None}
+    for key, name in (('timeout', 'ai_timeout'), ('hedge_after', 'hedge_after'), ('backoff', 'ai_retry_backoff')):
+        value = config.get(name)
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and value >= 0:
+            policy[key] = value
+    retries = config.get('ai_retries')
+    if isinstance(retries, int) and not isinstance(retries, bool) and retries >= 0:
+        policy['retries'] = retries
+    fallback = config.get('fallback_ai_tools', [])
+    if isinstance(fallback, str):
+        fallback = fallback.split(',')
+    if isinstance(fallback, list):
+        available = get_ai_tools()
+        policy['fallback'] = [tool for tool in fallback if tool in available]
+    return policy
+
+def get_context_tokens(ai_tool=None):
+    """Largest prompt, in estimated tokens, that is sent to an AI tool without chunking"""
+    tokens = load_config().get('context_tokens')
+    if not isinstance(tokens, int) or tokens <= 0:
+        tokens = DEFAULT_CONTEXT_TOKENS
+    # A plugin's manifest can only lower the limit, e.g. when the prompt travels as a single argv entry
+    tool_limit = get_ai_tool_manifest(ai_tool).get('max_prompt_tokens') if ai_tool else None
+    if isinstance(tool_limit, int) and tool_limit > 0:
+        tokens = min(tokens, tool_limit)
+    return tokens
+
 def get_ai_tool_module(ai_tool):
     tool_file = os.path.join(AI_TOOLS_DIR, f"{ai_tool}.py")
     if not os.path.isfile(tool_file):
         raise ValueError(f"AI tool '{ai_tool}' not found. Available: {', '.join(get_ai_tools())}")
-    spec = importlib.util.spec_from_file_location(f"ai_tools.{ai_tool}", tool_file)
-    module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(module)
+    # Plugins are executed once per process and again only after their file changes
+    stamp = get_file_stamp(tool_file)
+    cached = _module_memo.get(tool_file)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    with trace_span('plugin-load', tool=ai_tool):
+        spec = importlib.util.spec_from_file_location(f"ai_tools.{ai_tool}", tool_file)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    _module_memo[tool_file] = (stamp, module)
     return module
 
+def format_command(argv):
+    return ' '.join(shlex.quote(arg) for arg in argv)
+
+def kill_process(proc):
+    """Kill a child process, together with everything it started when it leads its own process group"""
+    if proc.poll() is not None:
+        return
+    try:
+        if getattr(proc, 'own_group', False):
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except OSError:
+        pass
+
+def get_prompt_pieces(prompt):
+    """Return a prompt, given as one string or as a list of pieces, as a sequence of pieces"""
+    return (prompt,) if isinstance(prompt, str) else prompt
+
+def get_prompt_chars(prompt):
+    return sum(len(piece) for piece in get_prompt_pieces(prompt))
+
+def join_prompt(prompt):
+    """Return a prompt as one string, for the consumers that cannot take it in pieces"""
+    return prompt if isinstance(prompt, str) else ''.join(prompt)
+
+def write_in_blocks(stream, text):
+    """Write text, or each piece of a prompt, in slices so a large prompt is never encoded into one second copy"""
+    for piece in get_prompt_pieces(text):
+        for offset in range(0, len(piece), WRITE_BLOCK_CHARS):
+            stream.write(piece[offset:offset + WRITE_BLOCK_CHARS])
+
+def stream_process(cmd, stdin_data=None, shell=False, on_line=None, log_path=None, echo=True, cwd=None, transcript=None,
+                   timeout=None, procs=None, tail_lines=STREAM_TAIL_LINES):
+    """Run a command, echoing its output line by line as it arrives, and return a CompletedProcess"""
+    # Only the last few lines are kept in memory; callers that need more parse
+    # the output incrementally through on_line
+    stdout_tail = collections.deque(maxlen=tail_lines)
+    stderr_tail = collections.deque(maxlen=tail_lines)
+    timing = {'start': time.monotonic(), 'first_output': None, 'timed_out': False}
+    log_file = open(log_path, 'a', encoding='utf-8') if log_path else None
+    log_lock = threading.Lock()
+    # A child that may be killed gets its own process group, so agents that spawn helpers are stopped with it
+    own_group = os.name == 'posix' and (timeout is not None or procs is not None)
+    timer = None
+
+    def pump(pipe, tail, terminal, callback, stream):
+        for line in iter(pipe.readline, ''):
+            if timing['first_output'] is None:
+                timing['first_output'] = time.monotonic() - timing['start']
+            tail.append(line)
+            if transcript is not None:
+                transcript.append([round(time.monotonic() - timing['start'], 4), stream, line])
+            if echo:
+                terminal.write(line)
+                terminal.flush()
+            if log_file:
+                with log_lock:
+                    log_file.write(line)
+                    log_file.flush()
+            if callback:
+                callback(line.rstrip('\n'))
+        pipe.close()
+
+    def expire():
+        timing['timed_out'] = True
+        kill_process(proc)
+
+    try:
+        proc = subprocess.Popen(cmd, shell=shell, cwd=cwd, stdin=subprocess.PIPE if stdin_data is not None else None,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                encoding='utf-8', errors='replace', start_new_session=own_group)
+        proc.own_group = own_group
+        if procs is not None:
+            procs.append(proc)
+        if timeout is not None:
+            timer = threading.Timer(timeout, expire)
+            timer.daemon = True
+            timer.start()
+        try:
+            readers = [threading.Thread(target=pump, args=(proc.stdout, stdout_tail, sys.stdout, on_line, 'out'), daemon=True),
+                       threading.Thread(target=pump, args=(proc.stderr, stderr_tail, sys.stderr, None, 'err'), daemon=True)]
+            for reader in readers:
+                reader.start()
+            # Readers are already draining the pipes, so a large prompt cannot deadlock against the child's output
+            if stdin_data is not None:
+                try:
+                    write_in_blocks(proc.stdin, stdin_data)
+                    proc.stdin.close()
+                except BrokenPipeError:
+                    pass
+            for reader in readers:
+                reader.join()
+            returncode = proc.wait()
+        except BaseException:
+            # Outside the terminal's process group the child would not see Ctrl-C on its own
+            kill_process(proc)
+            raise
+    finally:
+        if timer:
+            timer.cancel()
+        if log_file:
+            log_file.close()
+    result = subprocess.CompletedProcess(cmd, returncode, ''.join(stdout_tail), ''.join(stderr_tail))
+    result.elapsed = time.monotonic() - timing['start']
+    result.first_output = timing['first_output']
+    result.timed_out = timing['timed_out']
+    return result
+
+def capture_process(cmd, stdin_data=None, shell=False, cwd=None, timeout=None, procs=None):
+    """Run a command to completion with its whole output captured, killing it after timeout seconds"""
+    # The same reader threads as streaming, keeping every line instead of a tail; the
+    # prompt is written in blocks rather than encoded in one piece by communicate()
+    result = stream_process(cmd, stdin_data, shell, echo=False, cwd=cwd, timeout=timeout,
+                            procs=procs if procs is not None else [], tail_lines=None)
+    result.first_output = None
+    return result
+
+def report_latency(result):
+    if getattr(result, 'cached', False):
+        return
+    if getattr(result, 'first_output', None) is not None:
+        print(f"AI tool finished in {result.elapsed:.1f}s (first output after {result.first_output:.1f}s)")
+    elif getattr(result, 'elapsed', None) is not None:
+        print(f"AI tool finished in {result.elapsed:.1f}s (no output)")
+
+def describe_failure(result):
+    """Say why an AI tool run failed: it hit the timeout, could not be started, or its exit status"""
+    if getattr(result, 'timed_out', False):
+        return f"timed out after {get_execution_policy()['timeout']:g}s"
+    if result.returncode in (126, 127) and result.stderr:
+        # The agent never ran, so say why instead of giving a bare exit status
+        return result.stderr.strip().splitlines()[-1]
+    return f"exit status {result.returncode}"
+
+def start_trace():
+    """Begin recording spans and counters for --trace"""
+    global _trace
+    _trace = {'start': time.perf_counter(), 'events': [], 'counters': collections.Counter(), 'lock': threading.Lock()}
+
+def trace_count(name, amount=1):
+    """Advance a running counter such as bytes_read; does nothing unless --trace is active"""
+    if _trace is None:
+        return
+    with _trace['lock']:
+        _trace['counters'][name] += amount
+
+def trace_begin(name, **args):
+    """Open a span and return a handle for trace_end, or None when not tracing"""
+    if _trace is None:
+        return None
+    with _trace['lock']:
+        counters = dict(_trace['counters'])
+    return {'name': name, 'args': args, 'counters': counters, 'tid': threading.get_ident(), 'start': time.perf_counter()}
+
+def get_peak_memory_mb():
+    """Return (this process, largest waited-for child) peak resident memory in MB, or None where unsupported"""
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return (round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+            round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1))
+
+def trace_end(span, **args):
+    """Close a span, recording its duration, extra args and how far each counter advanced while it was open"""
+    if span is None or _trace is None:
+        return
+    end = time.perf_counter()
+    span['args'].update(args)
+    pid = os.getpid()
+    with _trace['lock']:
+        counters = dict(_trace['counters'])
+        for name, value in counters.items():
+            if value != span['counters'].get(name, 0):
+                span['args'].setdefault(name, value - span['counters'].get(name, 0))
+        _trace['events'].append({'name': span['name'], 'ph': 'X', 'pid': pid, 'tid': span['tid'],
+                                 'ts': round((span['start'] - _trace['start']) * 1e6),
+                                 'dur': round((end - span['start']) * 1e6), 'args': span['args']})
+        for name, value in counters.items():
+            _trace['events'].append({'name': name, 'ph': 'C', 'pid': pid, 'tid': span['tid'],
+                                     'ts': round((end - _trace['start']) * 1e6), 'args': {name: value}})
+        peak = get_peak_memory_mb()
+        if peak:
+            span['args']['peak_rss_mb'] = peak[0]
+            _trace['events'].append({'name': 'peak_rss_mb', 'ph': 'C', 'pid': pid, 'tid': span['tid'],
+                                     'ts': round((end - _trace['start']) * 1e6),
+                                     'args': {'autobot': peak[0], 'children': peak[1]}})
+
+@contextlib.contextmanager
+def trace_span(name, **args):
+    """Record the enclosed block as a span; values put in the yielded dict are added to its args"""
+    span = trace_begin(name, **args)
+    extra = {}
+    try:
+        yield extra
+    except Exception as e:
+        extra['error'] = type(e).__name__
+        raise
+    finally:
+        trace_end(span, **extra)
+
+def write_trace(trace_path):
+    """Write the recorded spans as a Chrome trace-event file and print the time spent in each phase"""
+    events = sorted(_trace['events'], key=lambda event: event['ts'])
+    peak = get_peak_memory_mb()
+    data = {'traceEvents': events, 'displayTimeUnit': 'ms',
+            'otherData': {'counters': dict(_trace['counters']), 'peak_rss_mb': peak and list(peak)}}
+    try:
+        with open(trace_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=1)
+    except OSError as e:
+        print(f"Could not write trace to {trace_path}: {e}", file=sys.stderr)
+        return
+    phases = collections.OrderedDict()
+    for event in events:
+        if event['ph'] == 'X':
+            count, total = phases.get(event['name'], (0, 0))
+            phases[event['name']] = (count + 1, total + event['dur'])
+    print(f"Trace written to {trace_path} (open in chrome://tracing or ui.perfetto.dev)", file=sys.stderr)
+    for name, (count, total) in phases.items():
+        print(f"  {name:<20} {total / 1e6:8.3f}s{f' ({count} spans)' if count > 1 else ''}", file=sys.stderr)
+    for name, value in _trace['counters'].items():
+        print(f"  {name:<20} {value}", file=sys.stderr)
+    if peak:
+        print(f"  {'peak memory':<20} {peak[0]:g} MB (largest child process: {peak[1]:g} MB)", file=sys.stderr)
+
+def start_agent_session(mode, path, latency='recorded'):
+    """Record every AI tool invocation to a JSON-lines file, or replay invocations from one instead of running them"""
+    global _agent_session
+    session = {'mode': mode, 'path': path, 'latency': latency, 'lock': threading.Lock(), 'entries': {}}
+    if mode == 'replay':
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    if entry.get('version') == AGENT_RECORDING_VERSION:
+                        session['entries'].setdefault(entry['key'], collections.deque()).append(entry)
+    _agent_session = session
+
+def get_agent_call_key(ai_tool, prompt):
+    # A recording made earlier has to match a run whose prompt names a later time
+    digest = hashlib.sha256(f"{ai_tool}\0".encode('utf-8'))
+    for piece in get_prompt_pieces(prompt):
+        digest.update(get_prompt_key_text(piece).encode('utf-8'))
+    return digest.hexdigest()
+
+def record_agent_call(ai_tool, prompt, result, transcript, elapsed, outputs=()):
+    """Append one invocation (command, stdin, output lines with timing, exit code, output files) to the recording"""
+    if not transcript:
+        # Captured runs only yield their output once the process has exited
+        transcript = [[round(elapsed, 4), stream, line] for stream, text in (('out', result.stdout), ('err', result.stderr))
+                      for line in (text or '').splitlines(True)]
+    stored = {}
+    for path in outputs:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                stored[os.path.abspath(path)] = f.read()
+        except (OSError, UnicodeDecodeError):
+            pass
+    entry = {'version': AGENT_RECORDING_VERSION, 'key': get_agent_call_key(ai_tool, prompt), 'tool': ai_tool,
+             'command': result.args, 'returncode': result.returncode, 'elapsed': round(elapsed, 4),
+             'first_output': getattr(result, 'first_output', None), 'lines': transcript, 'outputs': stored}
+    with _agent_session['lock']:
+        with open(_agent_session['path'], 'a', encoding='utf-8') as f:
+            # The prompt is escaped and written block by block rather than serialized with the rest of the entry
+            f.write(json.dumps(entry)[:-1] + ', "stdin": "')
+            for piece in get_prompt_pieces(prompt):
+                for offset in range(0, len(piece), WRITE_BLOCK_CHARS):
+                    f.write(json.dumps(piece[offset:offset + WRITE_BLOCK_CHARS])[1:-1])
+            f.write('"}\n')
+
+def replay_agent_call(ai_tool, prompt, capture_output=False, on_line=None, log_path=None, echo=True):
+    """Play back a recorded invocation of this tool and prompt, at its recorded pace or instantly"""
+    with _agent_session['lock']:
+        entries = _agent_session['entries'].get(get_agent_call_key(ai_tool, prompt))
+        # Identical prompts are replayed in the order they were recorded; the last one is reused after that
+        entry = entries.popleft() if entries and len(entries) > 1 else (entries[0] if entries else None)
+    if entry is None:
+        message = f"No recorded {ai_tool} call matches this prompt in {_agent_session['path']}"
+        if not capture_output and echo:
+            print(message, file=sys.stderr)
+        return subprocess.CompletedProcess(['replay'], 1, '', message)
+    paced = _agent_session['latency'] == 'recorded'
+    start = time.monotonic()
+    first_output = None
+    stdout, stderr = [], []
+    if not capture_output:
+        stdout = collections.deque(maxlen=STREAM_TAIL_LINES)
+        stderr = collections.deque(maxlen=STREAM_TAIL_LINES)
+    log_file = open(log_path, 'a', encoding='utf-8') if log_path and not capture_output else None
+    try:
+        for offset, stream, line in entry['lines']:
+            if paced and offset > time.monotonic() - start:
+                time.sleep(offset - (time.monotonic() - start))
+            if first_output is None:
+                first_output = time.monotonic() - start
+            (stdout if stream == 'out' else stderr).append(line)
+            if capture_output:
+                continue
+            if echo:
+                terminal = sys.stdout if stream == 'out' else sys.stderr
+                terminal.write(line)
+                terminal.flush()
+            if log_file:
+                log_file.write(line)
+            if on_line and stream == 'out':
+                on_line(line.rstrip('\n'))
+        if paced and entry['elapsed'] > time.monotonic() - start:
+            time.sleep(entry['elapsed'] - (time.monotonic() - start))
+    finally:
+        if log_file:
+            log_file.close()
+    for path, content in entry['outputs'].items():
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+    result = subprocess.CompletedProcess(entry['command'], entry['returncode'], ''.join(stdout), ''.join(stderr))
+    result.elapsed = time.monotonic() - start
+    result.first_output = first_output if not capture_output else None
+    return result
+
+def run_ai_tool(ai_tool, prompt, capture_output=False, on_line=None, log_path=None, echo=True, cwd=None, outputs=(),
+                on_attempt=None):
+    """Run an AI tool on a prompt under the execution policy: timeout, retries with backoff and fallback tools"""
+    policy = get_execution_policy()
+    tools = [ai_tool] + [tool for tool in policy['fallback'] if tool != ai_tool]
+    # Racing two agents is only safe when neither streams to the terminal; a run that writes
+    # files needs a working directory the second agent can copy
+    hedge = policy['hedge_after'] is not None and (capture_output or (not echo and cwd is not None))
+    result = None
+    tried = set()
+    for index, tool in enumerate(tools):
+        # The hedge may already have run a fallback tool once
+        if tool in tried:
+            continue
+        for attempt in range(policy['retries'] + 1):
+            if on_attempt:
+                on_attempt(tool)
+            if hedge and index == 0 and attempt == 0:
+                result = run_hedged_ai_tool(tool, tools[1] if len(tools) > 1 else tool, prompt, policy, capture_output,
+                                            on_line, log_path, cwd, outputs)
+                tried.update(result.hedged_tools)
+            else:
+                result = run_ai_tool_attempt(tool, prompt, capture_output, on_line, log_path, echo, cwd, outputs,
+                                             policy['timeout'])
+                result.ai_tool = tool
+            if result.returncode == 0:
+                return result
+            reason = describe_failure(result)
+            # A missing command, or one that cannot be started with this prompt, will not work by waiting for it
+            if result.returncode in (126, 127) or attempt == policy['retries']:
+                break
+            delay = min(policy['backoff'] * 2 ** attempt, MAX_AI_RETRY_BACKOFF)
+            print(f"{tool} failed ({reason}); retrying in {delay:g}s (attempt {attempt + 2} of {policy['retries'] + 1})",
+                  file=sys.stderr)
+            time.sleep(delay)
+        remaining = [other for other in tools[index + 1:] if other not in tried]
+        if remaining:
+            print(f"{tool} failed ({reason}); falling back to {remaining[0]}", file=sys.stderr)
+    return result
+
+def get_tree_stamps(root):
+    """Map each file the codebase walk visits under root to its (mtime, size) stamp"""
+    # Ignored paths (.git, node_modules, build output, Autobot's own logs and caches) are never copied or compared
+    return {os.path.relpath(entry.path, root): get_file_stamp(entry.path)
+            for _, _, files in scan_codebase(root) for entry in files}
+
+def copy_hedge_workspace(cwd, baseline, workspace):
+    """Copy the files in baseline from cwd into workspace; False if any of them no longer matches its stamp"""
+    for relpath, stamp in baseline.items():
+        source = os.path.join(cwd, relpath)
+        if get_file_stamp(source) != stamp:
+            return False
+        target = os.path.join(workspace, relpath)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copy2(source, target, follow_symlinks=False)
+        # The first agent is still running, so make sure it did not write the file while it was copied
+        if get_file_stamp(source) != stamp:
+            return False
+    return True
+
+def promote_hedge_workspace(workspace, cwd):
+    """Make cwd's files match a winning hedged run's scratch copy, undoing whatever the losing agent wrote"""
+    # Copies keep their mtime, so a file neither agent touched has the same stamp on both sides
+    current = get_tree_stamps(workspace)
+    existing = get_tree_stamps(cwd)
+    changed = [relpath for relpath, stamp in current.items() if existing.get(relpath) != stamp]
+    for relpath in changed:
+        target = os.path.join(cwd, relpath)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.islink(target):
+            os.unlink(target)
+        shutil.copy2(os.path.join(workspace, relpath), target, follow_symlinks=False)
+    removed = [relpath for relpath in existing if relpath not in current]
+    for relpath in removed:
+        try:
+            os.unlink(os.path.join(cwd, relpath))
+        except OSError:
+            pass
+    return len(changed) + len(removed)
+
+def run_hedged_ai_tool(primary, secondary, prompt, policy, capture_output=True, on_line=None, log_path=None, cwd=None,
+                       outputs=()):
+    """Run primary, also start secondary if primary is still running after the hedge delay, and keep the first success"""
+    procs = ([], [])
+    started = [primary]
+    scratch = workspace = baseline = hedge_log_path = None
+    if not capture_output:
+        # Only stamps are taken up front. The second agent gets a scratch copy of these files
+        # if it is started, and if it wins, cwd is made to match that copy
+        baseline = get_tree_stamps(cwd)
+        hedge_log_path = f"{log_path}.hedge" if log_path else None
+
+    def attempt(index, tool):
+        if index == 1 and workspace:
+            result = run_ai_tool_attempt(tool, prompt, capture_output, log_path=hedge_log_path, echo=False,
+                                         cwd=workspace, timeout=policy['timeout'], procs=procs[1])
+        else:
+            result = run_ai_tool_attempt(tool, prompt, capture_output, on_line, log_path, echo=False, cwd=cwd,
+                                         outputs=outputs, timeout=policy['timeout'], procs=procs[index])
+        result.ai_tool = tool
+        return result
+
+    def cancel(index, future):
+        # Keep killing until the attempt returns, in case its process was started after the first kill
+        while not future.done():
+            for proc in procs[index]:
+                kill_process(proc)
+            concurrent.futures.wait([future], timeout=0.1)
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as pool:
+            pending = {pool.submit(attempt, 0, primary): 0}
+            done, _ = concurrent.futures.wait(pending, timeout=policy['hedge_after'])
+            hedge = not done
+            if hedge and baseline is not None:
+                scratch = tempfile.mkdtemp(prefix='autobot-hedge-')
+                if copy_hedge_workspace(cwd, baseline, os.path.join(scratch, 'work')):
+                    workspace = os.path.join(scratch, 'work')
+                else:
+                    # Without an untouched copy the second agent could not start from the same files
+                    print(f"{primary} has already changed files in {cwd}; not starting {secondary} alongside it",
+                          file=sys.stderr)
+                    hedge = False
+            if hedge:
+                print(f"{primary} is still running after {policy['hedge_after']:g}s; also starting {secondary}",
+                      file=sys.stderr)
+                pending[pool.submit(attempt, 1, secondary)] = 1
+                started.append(secondary)
+            result = None
+            while pending:
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    winner = pending.pop(future)
+                    result = future.result()
+                    if result.returncode == 0:
+                        for other, index in pending.items():
+                            cancel(index, other)
+                        if winner == 1 and workspace:
+                            count = promote_hedge_workspace(workspace, cwd)
+                            print(f"{secondary} finished first; updated or removed {count} file(s) in {cwd} "
+                                  f"to match its copy", file=sys.stderr)
+                            if hedge_log_path:
+                                os.replace(hedge_log_path, log_path)
+                        result.hedged_tools = started
+                        return result
+        result.hedged_tools = started
+        return result
+    finally:
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+        if hedge_log_path and os.path.exists(hedge_log_path):
+            os.unlink(hedge_log_path)
+
+def run_ai_tool_attempt(ai_tool, prompt, capture_output=False, on_line=None, log_path=None, echo=True, cwd=None,
+                        outputs=(), timeout=None, procs=None):
+    """Run an AI tool once, or replay or record the run when a recording session is active"""
+    with trace_span('ai-tool', tool=ai_tool, prompt_chars=get_prompt_chars(prompt),
+                    streaming=not capture_output) as span:
+        if _agent_session and _agent_session['mode'] == 'replay':
+            span['replayed'] = True
+            result = replay_agent_call(ai_tool, prompt, capture_output, on_line, log_path, echo)
+        else:
+            transcript = [] if _agent_session else None
+            start = time.monotonic()
+            result = invoke_ai_tool(ai_tool, prompt, capture_output, on_line, log_path, echo, cwd, transcript, timeout, procs)
+            if transcript is not None:
+                record_agent_call(ai_tool, prompt, result, transcript, time.monotonic() - start, outputs)
+        span['exit_code'] = result.returncode
+        if getattr(result, 'timed_out', False):
+            span['timed_out'] = True
+        if getattr(result, 'first_output', None) is not None:
+            span['first_output_ms'] = round(result.first_output * 1000)
+    return result
+
+def invoke_ai_tool(ai_tool, prompt, capture_output=False, on_line=None, log_path=None, echo=True, cwd=None,
+                   transcript=None, timeout=None, procs=None):
+    module = get_ai_tool_module(ai_tool)
+    if hasattr(module, 'build_invocation'):
+        # Plugins that describe their argv get the prompt piped to them directly,
+        # with no shell, no quoting and no temporary prompt file. Only those whose
+        # manifest sets prompt_pieces take it in pieces; the rest get one string
+        if not get_ai_tool_manifest(ai_tool).get('prompt_pieces'):
+            prompt = join_prompt(prompt)
+        argv = [ai_tool]
+        try:
+            # A plugin raises ValueError for a prompt it cannot pass on, e.g. one too long for argv
+            argv, stdin_data = module.build_invocation(prompt)
+            if capture_output:
+                return capture_process(argv, stdin_data, cwd=cwd, timeout=timeout, procs=procs)
+            return stream_process(argv, stdin_data, on_line=on_line, log_path=log_path, echo=echo, cwd=cwd,
+                                  transcript=transcript, timeout=timeout, procs=procs)
+        except FileNotFoundError:
+            returncode, message = 127, f"{argv[0]}: command not found"
+        except (OSError, ValueError) as e:
+            returncode, message = 126, f"{argv[0]}: could not be started: {getattr(e, 'strerror', None) or e}"
+        if not capture_output and echo:
+            print(message, file=sys.stderr)
+        return subprocess.CompletedProcess(argv, returncode, '', message)
+    if not hasattr(module, 'execute'):
+        raise AttributeError(f"AI tool module '{ai_tool}' has neither a 'build_invocation' nor an 'execute' method.")
+    # Legacy plugins receive a prompt file and return a shell command
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.md', delete=False) as temp_file:
+        write_in_blocks(temp_file, prompt)
+        temp_file_path = temp_file.name
+    cmd = ai_tool
+    try:
+        cmd = module.execute(temp_file_path)
+        if capture_output:
+            return capture_process(cmd, shell=True, cwd=cwd, timeout=timeout, procs=procs)
+        return stream_process(cmd, shell=True, on_line=on_line, log_path=log_path, echo=echo, cwd=cwd,
+                              transcript=transcript, timeout=timeout, procs=procs)
+    except OSError as e:
+        # e.g. E2BIG when a plugin inlines the whole prompt into its command line
+        message = f"{ai_tool}: could not be started: {e.strerror or e}"
+        if not capture_output and echo:
+            print(message, file=sys.stderr)
+        return subprocess.CompletedProcess(cmd, 126, '', message)
+    finally:
+        try:
+            os.unlink(temp_file_path)
+        except OSError:
+            pass
+
+def get_prompt_key_text(prompt):
+    """Prompt text used to match identical runs, with the run's timestamp blanked out"""
+    return VOLATILE_PROMPT_PATTERN.sub(r'\1<date>', prompt)
+
+def get_ai_cache_key(ai_tool, prompt):
+    """Hash the assembled prompt together with the tool name and its plugin source"""
+    digest = hashlib.sha256()
+    digest.update(f"{AI_CACHE_VERSION}\0{ai_tool}\0".encode('utf-8'))
+    try:
+        with open(os.path.join(AI_TOOLS_DIR, f"{ai_tool}.py"), 'rb') as f:
+            digest.update(f.read())
+    except OSError:
+        pass
+    digest.update(b'\0')
+    for piece in get_prompt_pieces(prompt):
+        digest.update(get_prompt_key_text(piece).encode('utf-8'))
+    return digest.hexdigest()
+
+def evict_ai_cache():
+    """Drop cached AI results older than the age limit, then the least recently used beyond the size limit"""
+    max_bytes, max_age = get_ai_cache_limits()
+    cache_dir = os.path.join(CACHE_DIR, 'ai-results')
+    now = time.time()
+    entries = []
+    try:
+        with os.scandir(cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith('.json'):
+                    st = entry.stat()
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+    except OSError:
+        return
+    entries.sort(reverse=True)
+    total = 0
+    for mtime, size, path in entries:
+        total += size
+        if now - mtime > max_age or total > max_bytes:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+def run_ai_tool_cached(ai_tool, prompt, outputs=(), use_cache=True, capture_output=False, on_line=None,
+                       log_path=None, echo=True, cwd=None):
+    """Run an AI tool, replaying a stored result (stdout and output files) when tool and prompt are unchanged"""
+    # While recording or replaying, every invocation goes through run_ai_tool so none is skipped
+    use_cache = use_cache and _agent_session is None
+    cache_path = get_cache_path('ai-results', f"{get_ai_cache_key(ai_tool, prompt)}.json")
+    entry = load_json_file(cache_path) if use_cache else None
+    if entry and entry.get('version') == AI_CACHE_VERSION and time.time() - entry['created'] <= get_ai_cache_limits()[1]:
+        for path, content in entry['outputs'].items():
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(content)
+        os.utime(cache_path)
+        trace_count('ai_cache_hits')
+        if echo:
+            print(f"Reusing cached {ai_tool} result from {time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['created']))}"
+                  f" (use --no-cache to run again)")
+        if not capture_output:
+            for line in entry['stdout'].splitlines():
+                if echo:
+                    print(line)
+                if on_line:
+                    on_line(line)
+            if log_path:
+                with open(log_path, 'a', encoding='utf-8') as log_file:
+                    log_file.write(entry['stdout'])
+        result = subprocess.CompletedProcess(['cached'], 0, entry['stdout'], entry['stderr'])
+        result.elapsed = 0.0
+        result.first_output = None
+        result.cached = True
+        return result
+    
+    stdout_lines = []
+    def collect(line):
+        stdout_lines.append(line)
+        if on_line:
+            on_line(line)
+    # Only the output of the attempt that is kept counts; a failed try or a fallback tool starts over
+    result = run_ai_tool(ai_tool, prompt, capture_output=capture_output, on_line=None if capture_output else collect,
+                         log_path=log_path, echo=echo, cwd=cwd, outputs=outputs,
+                         on_attempt=lambda tool: stdout_lines.clear())
+    if not capture_output:
+        # The streamed result only keeps a tail; callers of the cached runner get the whole reply
+        result.stdout = ''.join(line + '\n' for line in stdout_lines)
+    if result.returncode == 0 and _agent_session is None:
+        stored = {}
+        for path in outputs:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    stored[os.path.abspath(path)] = f.read()
+            except (OSError, UnicodeDecodeError):
+                pass
+        save_json_file(cache_path, {'version': AI_CACHE_VERSION, 'tool': getattr(result, 'ai_tool', ai_tool),
+                                    'created': time.time(),
+                                    'stdout': result.stdout, 'stderr': result.stderr or '', 'outputs': stored})
+        evict_ai_cache()
+    return result
+
+def parse_spec_text(text):
+    """Parse spec markdown into a section tree with 1-based line spans and fenced code blocks"""
+    lines = text.splitlines()
+    root = {'heading': '', 'level': 0, 'line': 1, 'end': len(lines), 'children': [], 'code': []}
+    stack = [root]
+    fence = None
+    for number, line in enumerate(lines, 1):
+        stripped = line.strip()
+        if fence:
+            if stripped.startswith(fence[0]):
+                fence[2] = number
+                fence = None
+            continue
+        if stripped.startswith('```') or stripped.startswith('~~~'):
+            fence = [stripped[:3], stripped[3:].strip().lower(), len(lines), number]
+            stack[-1]['code'].append(fence)
+            continue
+        match = re.match(r'(#{1,6})\s+(.*?)\s*#*\s*$', stripped)
+        if not match:
+            continue
+        level = len(match.group(1))
+        while stack[-1]['level'] >= level:
+            stack.pop()['end'] = number - 1
+        node = {'heading': match.group(2), 'level': level, 'line': number, 'end': len(lines),
+                'children': [], 'code': []}
+        stack[-1]['children'].append(node)
+        stack.append(node)
+    # Store code blocks as [language, first line, last line]
+    pending = [root]
+    while pending:
+        node = pending.pop()
+        node['code'] = [[block[1], block[3], block[2]] for block in node['code']]
+        pending.extend(node['children'])
+    return root
+
+def iter_spec_sections(tree):
+    """Yield every section node of a parsed spec in document order"""
+    pending = list(reversed(tree['children']))
+    while pending:
+        node = pending.pop()
+        yield node
+        pending.extend(reversed(node['children']))
+
+def get_spec_title(tree, text):
+    for node in iter_spec_sections(tree):
+        if node['level'] == 1:
+            return node['heading']
+    for line in text.splitlines():
+        if line.strip():
+            return line.strip()[:80]
+    return ''
+
+def load_spec(file_path):
+    """Return (text, section tree) for a spec, reparsing only after the file changes"""
+    # Parsing is cheap next to reading the file, so the tree is kept per process only
+    # (which the daemon keeps warm) and nothing accumulates on disk
+    stamp = get_file_stamp(file_path)
+    cached = _spec_ast_memo.get(file_path)
+    if cached and stamp and cached[0] == stamp:
+        return cached[1], cached[2]
+    with open(file_path, 'rb') as f:
+        text = f.read().decode('utf-8', errors='replace')
+    tree = parse_spec_text(text)
+    _spec_ast_memo[file_path] = (stamp, text, tree)
+    return text, tree
+
+def find_spec_section(tree, heading):
+    """Return the section whose heading matches exactly (ignoring case and #), else the first containing it"""
+    wanted = heading.lstrip('#').strip().lower()
+    partial = None
+    for node in iter_spec_sections(tree):
+        name = node['heading'].lower()
+        if name == wanted:
+            return node
+        if partial is None and wanted in name:
+            partial = node
+    return partial
+
+def get_section_text(text, node):
+    """Return a section's heading and body, including its subsections"""
+    return "\n".join(text.splitlines()[node['line'] - 1:node['end']])
+
+def read_spec_outline(file_path):
+    """Return (title, ## section headings) for a spec file"""
+    text, tree = load_spec(file_path)
+    return get_spec_title(tree, text), [node['heading'] for node in iter_spec_sections(tree) if node['level'] == 2]
+
+def refresh_spec_index(index):
+    """Bring a spec index up to date, re-reading only specs whose size or mtime changed"""
+    # Each spec is a compact [mtime, size, title, sections] row keyed by its name (the path minus '.md'):
+    # a warm load of 10k specs is dominated by decoding the index and one stat per spec, so rows
+    # are reused as decoded and the loop below does as little as possible per entry
+    specs = {}
+    previous = index['specs']
+    changed = False
+    stack = ['']
+    while stack:
+        rel_dir = stack.pop()
+        try:
+            with os.scandir(os.path.join(SPECS_DIR, rel_dir)) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        for entry in entries:
+            entry_name = entry.name
+            if entry_name[0] == '.':
+                continue
+            if entry.is_dir():
+                stack.append(rel_dir + entry_name + '/')
+                continue
+            if not entry_name.endswith('.md'):
+                continue
+            name = rel_dir + entry_name[:-3]
+            st = entry.stat()
+            cached = previous.get(name)
+            if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+                specs[name] = cached
+                continue
+            try:
+                title, sections = read_spec_outline(entry.path)
+            except OSError:
+                continue
+            specs[name] = [st.st_mtime_ns, st.st_size, title, sections]
+            changed = True
+    if changed or len(specs) != len(previous):
+        index['specs'] = specs
+        index['dirty'] = True
+    return index
+
+def get_spec_index():
+    """Return the persistent index of every spec under SPECS_DIR, keyed by namespaced name"""
+    global _spec_index
+    if _spec_index is None:
+        cache_path = get_cache_path('spec-index.json')
+        # Decoding tens of thousands of rows would otherwise set off several full collections
+        # that find nothing to free; pausing the collector takes about a fifth off a warm load
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            data = load_json_file(cache_path, {})
+            if data.get('version') != SPEC_INDEX_VERSION or data.get('specs_dir') != os.path.abspath(SPECS_DIR):
+                data = {}
+            index = refresh_spec_index({'specs': data.get('specs', {}), 'dirty': False})
+        finally:
+            if gc_enabled:
+                gc.enable()
+        if index['dirty']:
+            save_json_file(cache_path, {'version': SPEC_INDEX_VERSION, 'specs_dir': os.path.abspath(SPECS_DIR),
+                                        'specs': index['specs']})
+        _spec_index = index['specs']
+    return _spec_index
+
+def find_spec_path(spec_name):
+    """Resolve a spec name to its file, accepting a unique namespace suffix such as 'frontend/alpine'"""
+    spec_name = spec_name[:-3] if spec_name.endswith('.md') else spec_name
+    file_path = os.path.join(SPECS_DIR, f"{spec_name}.md")
+    if os.path.isfile(file_path):
+        return file_path
+    matches = [name for name in get_spec_index() if name.endswith('/' + spec_name)]
+    if len(matches) > 1:
+        raise ValueError(f"Spec '{spec_name}' is ambiguous: {', '.join(sorted(matches))}")
+    if matches:
+        return os.path.join(SPECS_DIR, f"{matches[0]}.md")
+    return None
+
+def tokenize_search_text(text):
+    # Fold simple plurals so "users" finds "user" and "websocket" finds "WebSockets"
+    return [t[:-1] if len(t) > 3 and t.endswith('s') and not t.endswith('ss') else t
+            for t in SEARCH_TOKEN_PATTERN.findall(text.lower())]
+
+def split_spec_sections(text, tree):
+    """Split a spec's text into [heading, first line, lines] for the preamble and each ## section"""
+    lines = text.splitlines()
+    level2 = [node for node in iter_spec_sections(tree) if node['level'] == 2]
+    preamble_end = level2[0]['line'] - 1 if level2 else len(lines)
+    sections = [['', 1, lines[:preamble_end]]]
+    for node in level2:
+        sections.append([node['heading'], node['line'], lines[node['line'] - 1:node['end']]])
+    return sections
+
+def index_spec_for_search(file_path):
+    """Return (document entry, {term: [[section, term frequency], ...]}) for one spec"""
+    sections = split_spec_sections(*load_spec(file_path))
+    doc = {'sections': [], 'terms': []}
+    postings = {}
+    for section_number, (heading, first_line, lines) in enumerate(sections):
+        tokens = tokenize_search_text("\n".join(lines))
+        doc['sections'].append([heading, first_line, len(lines), len(tokens)])
+        for term, count in collections.Counter(tokens).items():
+            postings.setdefault(term, []).append([section_number, count])
+    doc['terms'] = sorted(postings)
+    return doc, postings
+
+def get_search_index():
+    """Return the on-disk inverted index over spec sections, re-indexing only specs that changed"""
+    cache_path = get_cache_path('search-index.json')
+    stamp = get_file_stamp(cache_path)
+    if _search_index_memo.get('stamp') == stamp and stamp:
+        data = _search_index_memo['data']
+    else:
+        data = load_json_file(cache_path, {})
+    if data.get('version') != SEARCH_INDEX_VERSION or data.get('specs_dir') != os.path.abspath(SPECS_DIR):
+        data = {'version': SEARCH_INDEX_VERSION, 'specs_dir': os.path.abspath(SPECS_DIR), 'docs': {}, 'postings': {}}
+    specs = get_spec_index()
+    docs = data['docs']
+    postings = data['postings']
+    changed = False
+    for name in list(docs):
+        spec = specs.get(name)
+        if spec and spec[0] == docs[name]['mtime'] and spec[1] == docs[name]['size']:
+            continue
+        # Drop the stale document from every posting list it appears in
+        for term in docs.pop(name)['terms']:
+            term_postings = postings.get(term, {})
+            term_postings.pop(name, None)
+            if not term_postings:
+                postings.pop(term, None)
+        changed = True
+    for name, spec in specs.items():
+        if name in docs:
+            continue
+        try:
+            doc, doc_postings = index_spec_for_search(os.path.join(SPECS_DIR, f"{name}.md"))
+        except OSError:
+            continue
+        doc['mtime'], doc['size'] = spec[0], spec[1]
+        docs[name] = doc
+        for term, entries in doc_postings.items():
+            postings.setdefault(term, {})[name] = entries
+        changed = True
+    if changed:
+        save_json_file(cache_path, data)
+    _search_index_memo['stamp'] = get_file_stamp(cache_path)
+    _search_index_memo['data'] = data
+    return data
+
+def get_search_snippet(file_path, first_line, line_count, terms):
+    """Return the section line that mentions the most query terms, trimmed for display"""
+    try:
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+            lines = f.read().splitlines()[first_line - 1:first_line - 1 + line_count]
+    except OSError:
+        return ''
+    best_line, best_hits = '', 0
+    for line in lines:
+        hits = len(terms.intersection(tokenize_search_text(line)))
+        if line.lstrip().startswith('#'):
+            hits -= 0.5  # prefer body text over the heading it sits under
+        if hits > best_hits:
+            best_line, best_hits = line.strip(), hits
+    if len(best_line) > SEARCH_SNIPPET_CHARS:
+        best_line = best_line[:SEARCH_SNIPPET_CHARS - 3] + '...'
+    return best_line
+
+def rank_spec_sections(data, terms, section=None):
+    """Score spec sections against the query terms with BM25, returning {(spec, section): score}"""
+    docs = data['docs']
+    units = sum(len(doc['sections']) for doc in docs.values())
+    if not units:
+        return {}
+    average_length = max(1.0, sum(s[3] for doc in docs.values() for s in doc['sections']) / units)
+    section_filter = section.lower().lstrip('#').strip() if section else None
+    k1, b = 1.2, 0.75
+    scores = collections.defaultdict(float)
+    for term in terms:
+        term_postings = data['postings'].get(term, {})
+        frequency = sum(len(entries) for entries in term_postings.values())
+        if not frequency:
+            continue
+        idf = math.log(1 + (units - frequency + 0.5) / (frequency + 0.5))
+        for name, entries in term_postings.items():
+            for section_number, count in entries:
+                heading, _, _, length = docs[name]['sections'][section_number]
+                if section_filter and section_filter not in heading.lower():
+                    continue
+                norm = k1 * (1 - b + b * length / average_length)
+                scores[(name, section_number)] += idf * count * (k1 + 1) / (count + norm)
+    return scores
+
+def search_specs(query, section=None, limit=None):
+    """Print the specs whose sections best match a free-text query"""
+    terms = set(tokenize_search_text(query))
+    if not terms:
+        print("Search query has no searchable words.")
+        return
+    data = get_search_index()
+    scores = rank_spec_sections(data, terms, section)
+    # Report each spec once, at its best-matching section
+    best = {}
+    for (name, section_number), score in scores.items():
+        if name not in best or score > best[name][0]:
+            best[name] = (score, section_number)
+    scope = f" in sections matching '{section}'" if section else ""
+    if not best:
+        print(f"No specs match '{query}'{scope}.")
+        return
+    results = sorted(best.items(), key=lambda item: (-item[1][0], item[0]))[:limit or DEFAULT_SEARCH_LIMIT]
+    print(f"Found {len(best)} spec(s) matching '{query}'{scope}:")
+    for name, (score, section_number) in results:
+        heading, first_line, line_count, _ = data['docs'][name]['sections'][section_number]
+        file_path = os.path.join(SPECS_DIR, f"{name}.md")
+        location = f"## {heading}" if heading else "(preamble)"
+        print(f"  {name}  {location}  (line {first_line}, score {score:.2f})")
+        snippet = get_search_snippet(file_path, first_line, line_count, terms)
+        if snippet:
+            print(f"      {snippet}")
+
+def expand_spec_includes(file_path, section=None, stack=(), deps=None):
+    """Return spec text with <!-- @include name --> and <!-- @include name#Section --> lines expanded"""
+    key = (os.path.abspath(file_path), (section or '').lower())
+    label = f"{os.path.relpath(file_path, SPECS_DIR)[:-3]}{'#' + section if section else ''}"
+    if key in [entry[:2] for entry in stack]:
+        raise ValueError(f"Include cycle: {' -> '.join([entry[2] for entry in stack] + [label])}")
+    text, tree = load_spec(file_path)
+    st = os.stat(file_path)
+    if deps is not None:
+        deps[key[0]] = [st.st_mtime_ns, st.st_size]
+    if section:
+        node = find_spec_section(tree, section)
+        if node is None:
+            raise ValueError(f"Section '{section}' not found in {os.path.relpath(file_path, SPECS_DIR)}")
+        text = get_section_text(text, node)
+    lines = []
+    in_fence = False
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith('```') or stripped.startswith('~~~'):
+            in_fence = not in_fence
+        match = None if in_fence else INCLUDE_PATTERN.match(line)
+        if not match:
+            lines.append(line)
+            continue
+        name, included_section = match.group(1), match.group(2)
+        included_path = find_spec_path(name)
+        if not included_path:
+            raise ValueError(f"{os.path.relpath(file_path, SPECS_DIR)} includes unknown spec '{name}'")
+        lines.append(expand_spec_includes(included_path, included_section, stack + (key + (label,),), deps).rstrip('\n'))
+    return "\n".join(lines) + ("\n" if text.endswith("\n") else "")
+
+def read_spec_prompt(file_path):
+    """Return a spec's text with its includes expanded, reusing the cached expansion while no dependency changed"""
+    cache_path = get_cache_path('includes', hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()[:16] + '.json')
+    entry = load_json_file(cache_path)
+    if entry and entry.get('version') == INCLUDE_CACHE_VERSION:
+        current = True
+        for dep_path, (mtime, size) in entry['deps'].items():
+            try:
+                st = os.stat(dep_path)
+            except OSError:
+                current = False
+                break
+            if st.st_mtime_ns != mtime or st.st_size != size:
+                current = False
+                break
+        if current:
+            return entry['text']
+    deps = {}
+    text = expand_spec_includes(file_path, deps=deps)
+    save_json_file(cache_path, {'version': INCLUDE_CACHE_VERSION, 'deps': deps, 'text': text})
+    return text
+
+def get_spec_includes(file_path):
+    """Return the dependency paths of a spec's last expansion, not counting the spec itself"""
+    read_spec_prompt(file_path)
+    cache_path = get_cache_path('includes', hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()[:16] + '.json')
+    deps = load_json_file(cache_path, {}).get('deps', {})
+    return [path for path in deps if path != os.path.abspath(file_path)]
+
+def split_into_blocks(lines):
+    """Group lines into paragraphs and headings, never splitting inside a code fence"""
+    blocks, current, in_fence = [], [], False
+    for line in lines:
+        stripped = line.strip()
+        if stripped.startswith('```') or stripped.startswith('~~~'):
+            in_fence = not in_fence
+        elif not in_fence and not stripped:
+            if current:
+                blocks.append(current)
+                current = []
+            continue
+        elif not in_fence and stripped.startswith('#') and current:
+            blocks.append(current)
+            current = []
+        current.append(line)
+    if current:
+        blocks.append(current)
+    return blocks
+
+def pack_spec_section(lines, budget):
+    """Split one section into pieces of at most budget tokens, repeating its heading on continuations"""
+    text = "\n".join(lines).strip()
+    if estimate_tokens(text) <= budget:
+        return [text]
+    heading = f"{lines[0].strip()} (continued)"
+    budget = max(1, budget - estimate_tokens(heading) - 1)
+    # Blocks too large on their own are cut by line, and very long lines by character;
+    # each part remembers the separator that joins it to the part before it
+    parts = []
+    for block in split_into_blocks(lines):
+        block_text = "\n".join(block)
+        if estimate_tokens(block_text) <= budget:
+            parts.append(("\n\n", block_text))
+            continue
+        for line_number, line in enumerate(block):
+            step = budget * CHARS_PER_TOKEN
+            for offset in range(0, max(len(line), 1), step):
+                separator = "" if offset else ("\n" if line_number else "\n\n")
+                parts.append((separator, line[offset:offset + step]))
+    pieces = []
+    for separator, part in parts:
+        if pieces and estimate_tokens(pieces[-1] + separator + part) <= budget:
+            pieces[-1] += separator + part
+        else:
+            pieces.append(part)
+    return [piece if index == 0 else f"{heading}\n\n{piece}" for index, piece in enumerate(pieces)]
+
+def chunk_spec(text, max_tokens):
+    """Split spec text on ## section boundaries into (preamble, [(headings, body), ...]) chunks"""
+    lines = text.splitlines()
+    starts = [node['line'] for node in iter_spec_sections(parse_spec_text(text)) if node['level'] == 2]
+    first = starts[0] if starts else len(lines) + 1
+    preamble = "\n".join(lines[:first - 1]).strip()
+    spans = [(start, (starts[idx + 1] if idx + 1 < len(starts) else len(lines) + 1) - 1)
+             for idx, start in enumerate(starts)]
+    if estimate_tokens(preamble) > max_tokens // 4:
+        # Share only the title line; the rest of a long preamble becomes a chunk of its own
+        title = next((i for i, line in enumerate(lines[:first - 1]) if line.strip()), 0)
+        preamble = lines[title].strip() if lines else ''
+        spans.insert(0, (title + 1, first - 1))
+    budget = max(1, max_tokens - estimate_tokens(preamble) - CHUNK_NOTE_TOKENS)
+    chunks = []
+    for start, end in spans:
+        heading = lines[start - 1].strip().lstrip('#').strip()
+        for piece in pack_spec_section(lines[start - 1:end], budget):
+            if chunks and estimate_tokens(chunks[-1][1] + "\n\n" + piece) <= budget:
+                if heading not in chunks[-1][0]:
+                    chunks[-1][0].append(heading)
+                chunks[-1][1] += "\n\n" + piece
+            else:
+                chunks.append([[heading], piece])
+    return preamble, [(headings, body) for headings, body in chunks]
+
+def build_chunk_prompts(text, max_tokens):
+    """Return the prompts for an oversized spec, one per chunk, each carrying the shared preamble"""
+    preamble, chunks = chunk_spec(text, max_tokens)
+    prompts = []
+    for index, (headings, body) in enumerate(chunks, 1):
+        note = (f"[Specification part {index} of {len(chunks)}, covering: {', '.join(headings)}. "
+                f"The other parts are delivered separately; implement only this part and build on any "
+                f"code already in the current directory.]")
+        prompts.append((headings, f"{preamble}\n\n{note}\n\n{body}\n"))
+    return prompts
+
+def run_generation(ai_tool, prompt, log_path=None, echo=True, cwd=None, chunk_mode=None, max_tokens=None):
+    """Run a generation prompt, splitting it into section chunks when it exceeds the context size"""
+    limit = max_tokens or get_context_tokens(ai_tool)
+    if estimate_tokens(prompt) <= limit:
+        return run_ai_tool(ai_tool, prompt, log_path=log_path, echo=echo, cwd=cwd)
+    prompts = build_chunk_prompts(prompt, limit)
+    parallel = chunk_mode == 'parallel'
+    if echo:
+        print(f"Spec is ~{estimate_tokens(prompt)} tokens, over the {limit}-token context; "
+              f"generating it in {len(prompts)} chunks ({'parallel' if parallel else 'sequential'})")
+    start = time.monotonic()
+    
+    def run_chunk(item):
+        index, (headings, chunk_prompt) = item
+        if echo:
+            print(f"Chunk {index}/{len(prompts)} (~{estimate_tokens(chunk_prompt)} tokens): {', '.join(headings)}")
+        result = run_ai_tool(ai_tool, chunk_prompt, log_path=log_path, echo=echo and not parallel, cwd=cwd)
+        if echo and parallel:
+            print(f"Chunk {index}/{len(prompts)} finished with exit code {result.returncode} "
+                  f"in {getattr(result, 'elapsed', 0.0):.1f}s")
+        return result
+    
+    if parallel:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(prompts), DEFAULT_GENERATE_JOBS)) as pool:
+            results = list(pool.map(run_chunk, enumerate(prompts, 1)))
+    else:
+        results = []
+        for item in enumerate(prompts, 1):
+            results.append(run_chunk(item))
+            # Later chunks build on earlier ones, so stop at the first failure
+            if results[-1].returncode != 0:
+                break
+    failed = [r for r in results if r.returncode != 0]
+    result = failed[0] if failed else results[-1]
+    result.elapsed = time.monotonic() - start
+    result.first_output = getattr(results[0], 'first_output', None)
+    if echo and failed:
+        print(f"{len(failed)} of {len(prompts)} chunks failed")
+    return result
+
 def get_specs():
     try:
-        return [f[:-3] for f in os.listdir(SPECS_DIR) 
-                if f.endswith('.md') and os.path.isfile(os.path.join(SPECS_DIR, f))]
+        return sorted(get_spec_index())
     except Exception:
         return []
 
@@ -83,15 +1477,44 @@ Usage:
   {script_name}                                           Show this help message
   {script_name} help                                      Show this help message
   {script_name} generate <spec_name> [--ai-tool <tool>]   Generate application from spec
-  {script_name} dryrun <spec_name> [--ai-tool <tool>]     Preview generation command
-  {script_name} show <spec_name>                          Display spec content
-  {script_name} ls                                        List available specs
+  {script_name} generate <spec>... | --all [--jobs <n>]   Generate several specs concurrently (names or globs)
+  {script_name} pipeline <manifest> [--jobs <n>] [--plan] [--restart]  Run a phased generation pipeline
+  {script_name} dryrun <spec_name> [--ai-tool <tool>]     Preview generation command, prompt size and chunks
+  {script_name} show <spec_name> [--section <heading>]    Display spec content, or one section of it
+  {script_name} ls [<namespace>]                          List available specs (e.g. ls _review/frontend)
+  {script_name} search <query> [--section <heading>]      Search spec content (e.g. --section Endpoints)
   {script_name} create <spec_name>                        Create new spec from template
   {script_name} refine <spec_name> [--ai-tool <tool>]     Refine existing spec with AI enhancement
+  {script_name} refine <spec_name> --section <heading>... Refine only the given sections, concurrently
   {script_name} update <spec_name> [--path <dir>] [--ai-tool <tool>]  Update spec from current codebase (CAUTION)
+  {script_name} update <spec_name> --since <git-ref|last> Update only the sections affected by changed files
   {script_name} infer <spec_name> [--path <dir>]          Infer spec from existing codebase
   {script_name} config default-ai-tool <tool>             Set default AI tool
   {script_name} config show                               Show current configuration
+  {script_name} daemon [start|stop|status]                Keep caches warm in a background server for faster ls/show/search
+
+Options:
+  --ai-tool <tool>     AI tool to use (generate, dryrun, refine, update, infer)
+  --path <dir>         Codebase to analyze (update, infer)
+  --budget <tokens>    Token budget for the codebase summary (update, infer)
+  --workers <n>        Threads used to read codebase files (update, infer)
+  --jobs <n>           Concurrent AI runs for batch generate, pipeline and section refine (default: {DEFAULT_GENERATE_JOBS})
+  --out-dir <dir>      Output directory for batch generate and pipeline
+  --section <heading>  Section to show or refine (repeatable for refine), or ## sections to search
+  --limit <n>          Maximum number of search results (default: {DEFAULT_SEARCH_LIMIT})
+  --max-tokens <n>     Context size in tokens; larger specs are split on section boundaries (default: {get_context_tokens(current_default)})
+  --chunk-mode <mode>  Run chunks of an oversized spec 'sequential' (default) or 'parallel' (generate)
+  --since <ref|last>   Send only files changed since a git ref or the previous update (update)
+  --no-cache           Run the AI tool even if an identical run is cached (refine, update, infer)
+  --log <file>         Also append the AI tool's output to a file (generate, refine, update, infer)
+  --timeout <seconds>  Stop an AI tool run that takes longer (generate, refine, update, infer)
+  --retries <n>        Retry a failed AI tool run n times, waiting longer before each retry
+  --fallback <tools>   Comma-separated AI tools to try in order when the chosen one keeps failing
+  --hedge-after <s>    Race a second AI tool against a run still going after s seconds (section refine, generate --all, pipeline)
+  --record <file>      Append every AI tool invocation (command, stdin, output with timing, exit code) to a file
+  --replay <file>      Play recorded invocations back instead of running AI tools (generate, refine, update, infer)
+  --replay-latency <l> Replay at the 'recorded' pace (default) or with 'zero' latency
+  --trace <file>       Write per-phase timings, bytes read and AI tool exit codes as a Chrome trace (any command)
 
 Available Specs: {', '.join(specs) if specs else 'None'}
 AI Tools: {', '.join(ai_tools)} (default: {current_default})
@@ -100,12 +1523,15 @@ AI Tools: {', '.join(ai_tools)} (default: {current_default})
 def show_help():
     print(get_help_text())
 
-def list_specs():
-    specs = get_specs()
+def list_specs(namespace=None):
+    index = get_spec_index()
+    specs = sorted(name for name in index if not namespace or name.startswith(namespace.rstrip('/') + '/'))
     if specs:
         print("Available specs:")
-        for spec in sorted(specs):
-            print(f"  {spec}")
+        width = max(len(spec) for spec in specs)
+        for spec in specs:
+            _, _, title, _ = index[spec]
+            print(f"  {spec.ljust(width)}  {title}")
     else:
         print("No specs found.")
 
@@ -121,54 +1547,339 @@ def parse_ai_tool(args):
     return get_default_ai_tool()
 
 def build_generation_command(spec_name, ai_tool=None):
+    """Return (command line, how the prompt reaches it) for generating a spec, with the prompt itself left out"""
     if ai_tool is None:
         ai_tool = get_default_ai_tool()
-    file_path = os.path.join(SPECS_DIR, f"{spec_name}.md")
-    if not os.path.isfile(file_path):
+    file_path = find_spec_path(spec_name)
+    if not file_path:
         raise FileNotFoundError(f"Spec '{spec_name}' not found.")
     module = get_ai_tool_module(ai_tool)
+    # The agent gets the include-expanded prompt, not the spec file, so the prompt is shown as a placeholder
+    prompt = read_spec_prompt(file_path)
+    if hasattr(module, 'build_invocation'):
+        argv, stdin_data = module.build_invocation(prompt)
+        if stdin_data is not None:
+            return format_command(argv), "on stdin"
+        return format_command(['<prompt>' if arg == prompt else arg for arg in argv]), "as an argument"
     if not hasattr(module, 'execute'):
         raise AttributeError(f"AI tool module '{ai_tool}' does not have an 'execute' method.")
-    cmd = module.execute(file_path)
-    return cmd
+    # Legacy plugins are handed a temporary file holding the prompt
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.md', delete=False) as temp_file:
+        write_in_blocks(temp_file, prompt)
+        temp_file_path = temp_file.name
+    try:
+        return module.execute(temp_file_path).replace(temp_file_path, '<prompt file>'), "in a temporary file"
+    finally:
+        os.unlink(temp_file_path)
 
-def generate_from_spec(spec_name, ai_tool=None):
+def generate_from_spec(spec_name, ai_tool=None, log_path=None, chunk_mode=None, max_tokens=None):
     if ai_tool is None:
         ai_tool = get_default_ai_tool()
     try:
-        cmd = build_generation_command(spec_name, ai_tool)
+        file_path = find_spec_path(spec_name)
+        if not file_path:
+            raise FileNotFoundError(f"Spec '{spec_name}' not found.")
+        with trace_span('prompt-assembly', spec=spec_name) as span:
+            spec_content = read_spec_prompt(file_path)
+            span['prompt_chars'] = len(spec_content)
+        result = run_generation(ai_tool, spec_content, log_path=log_path, chunk_mode=chunk_mode, max_tokens=max_tokens)
     except Exception as e:
         print(f"Error: {e}")
         return
+    report_latency(result)
+    if result.returncode != 0:
+        print(f"Error running generation command: {describe_failure(result)}")
+        policy = get_execution_policy()
+        if not policy['retries'] and not policy['fallback']:
+            print("Use --retries <n> or --fallback <tool> to retry or switch AI tools automatically.")
+
+def expand_spec_names(patterns, include_all=False):
+    """Expand spec names and glob patterns (or --all) into a sorted list of existing specs"""
+    specs = sorted(get_specs())
+    if include_all:
+        return specs
+    names = []
+    for pattern in patterns:
+        # Globs match full names or, like find_spec_path, any namespace suffix ('estimator*', 'frontend/*')
+        matches = ([name for name in specs if fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(name, '*/' + pattern)]
+                   if glob.has_magic(pattern) else [pattern])
+        if not matches:
+            print(f"No specs match '{pattern}'.")
+        for name in matches:
+            if name not in names:
+                names.append(name)
+    return names
+
+def generate_batch(spec_names, ai_tool=None, jobs=None, out_dir=".", chunk_mode=None, max_tokens=None):
+    """Generate several specs concurrently, each in its own output directory with its own log"""
+    if ai_tool is None:
+        ai_tool = get_default_ai_tool()
+    jobs = jobs or min(DEFAULT_GENERATE_JOBS, len(spec_names))
+    print(f"Generating {len(spec_names)} specs with {ai_tool} ({jobs} at a time) into: {os.path.abspath(out_dir)}")
+    print_lock = threading.Lock()
+
+    def generate_one(spec_name):
+        spec_dir = os.path.join(out_dir, spec_name)
+        log_path = os.path.join(out_dir, 'logs', f"{spec_name}.log")
+        start = time.monotonic()
+        try:
+            file_path = find_spec_path(spec_name)
+            if not file_path:
+                raise FileNotFoundError(f"Spec '{spec_name}' not found.")
+            spec_content = read_spec_prompt(file_path)
+            os.makedirs(spec_dir, exist_ok=True)
+            os.makedirs(os.path.dirname(log_path), exist_ok=True)
+            # Start each run with a fresh log
+            open(log_path, 'w').close()
+            with print_lock:
+                print(f"  started  {spec_name}")
+            result = run_generation(ai_tool, spec_content, log_path=log_path, echo=False, cwd=spec_dir,
+                                    chunk_mode=chunk_mode, max_tokens=max_tokens)
+            if result.returncode == 0:
+                status = 'ok'
+            elif getattr(result, 'timed_out', False):
+                status = 'timed out'
+            else:
+                status = f"exit {result.returncode}"
+            detail = status if getattr(result, 'ai_tool', ai_tool) == ai_tool else f"{status} via {result.ai_tool}"
+        except Exception as e:
+            status = 'error'
+            detail = f"error: {e}"
+            log_path = '-'
+        elapsed = time.monotonic() - start
+        with print_lock:
+            print(f"  finished {spec_name} ({detail}, {elapsed:.1f}s)")
+        return spec_name, status, elapsed, log_path
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        results = list(pool.map(generate_one, spec_names))
+
+    width = max(len('Spec'), *(len(name) for name in spec_names))
+    print("")
+    print(f"{'Spec'.ljust(width)}  {'Status':<10}  {'Time':>8}  Log")
+    for spec_name, status, elapsed, log_path in results:
+        print(f"{spec_name.ljust(width)}  {status:<10}  {elapsed:>7.1f}s  {log_path}")
+    failed = [r for r in results if r[1] != 'ok']
+    print(f"\n{len(results) - len(failed)} succeeded, {len(failed)} failed")
+    return not failed
+
+def find_pipeline_manifest(name):
+    """Resolve a pipeline manifest from a path, or a name relative to the specs directory"""
+    for candidate in [name, os.path.join(SPECS_DIR, name), os.path.join(SPECS_DIR, f"{name}.pipeline.json")]:
+        if os.path.isfile(candidate):
+            return candidate
+    raise FileNotFoundError(f"Pipeline manifest '{name}' not found.")
+
+def load_pipeline(manifest_path):
+    """Load and validate a pipeline manifest, returning it with phases in dependency order"""
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        pipeline = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    phases = pipeline.get('phases') or []
+    if not phases:
+        raise ValueError("Pipeline manifest has no phases.")
+    by_name = {}
+    for phase in phases:
+        if 'name' not in phase or 'spec' not in phase:
+            raise ValueError("Every pipeline phase needs a 'name' and a 'spec'.")
+        if phase['name'] in by_name:
+            raise ValueError(f"Duplicate pipeline phase '{phase['name']}'.")
+        phase['spec_path'] = os.path.join(base_dir, phase['spec'])
+        phase.setdefault('depends_on', [])
+        by_name[phase['name']] = phase
+    for phase in phases:
+        for dep in phase['depends_on']:
+            if dep not in by_name:
+                raise ValueError(f"Phase '{phase['name']}' depends on unknown phase '{dep}'.")
+    # Kahn's algorithm gives a dependency order and detects cycles
+    remaining = {p['name']: set(p['depends_on']) for p in phases}
+    ordered = []
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f"Pipeline has a dependency cycle between: {', '.join(sorted(remaining))}")
+        for name in ready:
+            ordered.append(by_name[name])
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    pipeline['name'] = pipeline.get('name') or os.path.basename(manifest_path).split('.')[0]
+    pipeline['phases'] = ordered
+    pipeline['context_paths'] = [os.path.join(base_dir, c) for c in pipeline.get('context', [])]
+    return pipeline
+
+def build_phase_prompt(pipeline, phase, context):
+    phase_spec = read_spec_prompt(phase['spec_path'])
+    done = ', '.join(phase['depends_on']) if phase['depends_on'] else 'none'
+    return f"""{context}
+
+===============================================================================
+
+PIPELINE: {pipeline['name']}
+CURRENT PHASE: {phase['name']}
+PHASES ALREADY IMPLEMENTED IN THIS DIRECTORY: {done}
+
+Build on the existing code in the current directory and implement only this phase:
+
+{phase_spec}
+"""
+
+def hash_pipeline_phases(pipeline, ai_tool, context):
+    """Content hash per phase, chained through dependencies so upstream edits invalidate downstream phases"""
+    hashes = {}
+    for phase in pipeline['phases']:
+        digest = hashlib.sha1()
+        digest.update(ai_tool.encode('utf-8'))
+        digest.update(context.encode('utf-8'))
+        digest.update(read_spec_prompt(phase['spec_path']).encode('utf-8'))
+        for dep in sorted(phase['depends_on']):
+            digest.update(hashes[dep].encode('utf-8'))
+        hashes[phase['name']] = digest.hexdigest()
+    return hashes
+
+def get_pipeline_checkpoint_path(manifest_path, out_dir):
+    key = hashlib.sha1(f"{os.path.abspath(manifest_path)}|{os.path.abspath(out_dir)}".encode('utf-8')).hexdigest()[:16]
+    return get_cache_path('pipelines', f"{key}.json")
+
+def run_pipeline(name, ai_tool=None, jobs=None, out_dir=".", restart=False, plan_only=False):
+    """Run a phased pipeline, executing independent phases in parallel and resuming from checkpoints"""
+    if ai_tool is None:
+        ai_tool = get_default_ai_tool()
     try:
-        subprocess.run(cmd, shell=True, check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"Error running generation command: {e}")
+        manifest_path = find_pipeline_manifest(name)
+        pipeline = load_pipeline(manifest_path)
+        context_parts = []
+        for context_path in pipeline['context_paths']:
+            context_parts.append(read_spec_prompt(context_path))
+        context = "\n\n".join(context_parts)
+        hashes = hash_pipeline_phases(pipeline, ai_tool, context)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return False
 
-def show_spec(spec_name):
-    file_path = os.path.join(SPECS_DIR, f"{spec_name}.md")
-    if not os.path.isfile(file_path):
+    checkpoint_path = get_pipeline_checkpoint_path(manifest_path, out_dir)
+    checkpoints = {} if restart else load_json_file(checkpoint_path, {})
+    done = {p['name'] for p in pipeline['phases'] if checkpoints.get(p['name'], {}).get('hash') == hashes[p['name']]}
+    phases = {p['name']: p for p in pipeline['phases']}
+
+    print(f"Pipeline: {pipeline['name']} ({len(phases)} phases, {len(done)} already complete)")
+    if plan_only:
+        for phase in pipeline['phases']:
+            state = 'done' if phase['name'] in done else 'pending'
+            deps = ', '.join(phase['depends_on']) or '-'
+            print(f"  {phase['name']:<20} {state:<8} after: {deps}")
+        return True
+
+    jobs = jobs or DEFAULT_GENERATE_JOBS
+    log_dir = os.path.join(out_dir, '.autobot-logs', pipeline['name'])
+    os.makedirs(log_dir, exist_ok=True)
+    print(f"Working directory: {os.path.abspath(out_dir)} (up to {jobs} phases at a time)")
+
+    def run_phase(phase):
+        prompt = build_phase_prompt(pipeline, phase, context)
+        log_path = os.path.join(log_dir, f"{phase['name']}.log")
+        open(log_path, 'w').close()
+        start = time.monotonic()
+        result = run_ai_tool(ai_tool, prompt, log_path=log_path, echo=False, cwd=out_dir)
+        return result.returncode, describe_failure(result), time.monotonic() - start, log_path
+
+    failed = {}
+    running = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        while True:
+            if not failed:
+                for phase in pipeline['phases']:
+                    name = phase['name']
+                    if name in done or name in running.values() or len(running) >= jobs:
+                        continue
+                    if all(dep in done for dep in phase['depends_on']):
+                        print(f"  started  {name}")
+                        running[pool.submit(run_phase, phase)] = name
+            if not running:
+                break
+            finished, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    returncode, reason, elapsed, log_path = future.result()
+                except Exception as e:
+                    returncode, reason, elapsed, log_path = None, 'error', 0.0, str(e)
+                if returncode == 0:
+                    done.add(name)
+                    # Checkpoint straight away so a later failure does not lose this phase
+                    checkpoints[name] = {'hash': hashes[name], 'completed_at': time.time(), 'elapsed': elapsed}
+                    save_json_file(checkpoint_path, checkpoints)
+                    print(f"  finished {name} ({elapsed:.1f}s)")
+                else:
+                    failed[name] = returncode
+                    print(f"  FAILED   {name} ({reason}, see {log_path})")
+
+    pending = [p['name'] for p in pipeline['phases'] if p['name'] not in done and p['name'] not in failed]
+    if failed:
+        print(f"\nPipeline stopped: {len(failed)} phase(s) failed, {len(pending)} not started.")
+        print("Re-run the same command to resume from the last completed phase.")
+        return False
+    print(f"\nPipeline complete: {len(done)} phases done.")
+    return True
+
+def show_spec(spec_name, section=None):
+    try:
+        file_path = find_spec_path(spec_name)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+    if not file_path:
         print(f"Spec '{spec_name}' not found.")
         return
-    with open(file_path, 'r') as f:
-        print(f.read())
+    if not section:
+        with open(file_path, 'r') as f:
+            print(f.read())
+        return
+    text, tree = load_spec(file_path)
+    node = find_spec_section(tree, section)
+    if node is None:
+        print(f"Section '{section}' not found in spec '{spec_name}'. Sections:")
+        for node in iter_spec_sections(tree):
+            print(f"  {'  ' * (node['level'] - 1)}{node['heading']}")
+        return
+    print(get_section_text(text, node))
 
-def dryrun_generation(spec_name, ai_tool=None):
+def dryrun_generation(spec_name, ai_tool=None, chunk_mode=None, max_tokens=None):
     if ai_tool is None:
         ai_tool = get_default_ai_tool()
     try:
-        cmd = build_generation_command(spec_name, ai_tool)
+        cmd, delivery = build_generation_command(spec_name, ai_tool)
     except Exception as e:
         print(f"Error: {e}")
         return
     print("[DRYRUN] Command that would be executed:")
     print(cmd)
+    file_path = find_spec_path(spec_name)
+    prompt = read_spec_prompt(file_path)
+    includes = get_spec_includes(file_path)
+    print(f"Prompt ({delivery}): {len(prompt)} chars, ~{estimate_tokens(prompt)} tokens", end='')
+    if includes:
+        print(f" after expanding {len(includes)} include(s): "
+              f"{', '.join(os.path.relpath(p, SPECS_DIR)[:-3] for p in includes)}")
+    else:
+        print()
+    limit = max_tokens or get_context_tokens(ai_tool)
+    if estimate_tokens(prompt) <= limit:
+        print(f"Fits the {limit}-token context in a single prompt.")
+        return
+    prompts = build_chunk_prompts(prompt, limit)
+    print(f"Over the {limit}-token context: would run {len(prompts)} chunks "
+          f"({'parallel' if chunk_mode == 'parallel' else 'sequential'}):")
+    for index, (headings, chunk_prompt) in enumerate(prompts, 1):
+        print(f"  chunk {index}: ~{estimate_tokens(chunk_prompt)} tokens  {', '.join(headings)}")
 
 def create_spec(spec_name):
     file_path = os.path.join(SPECS_DIR, f"{spec_name}.md")
     if os.path.isfile(file_path):
         print(f"Spec '{spec_name}' already exists.")
         return
+    # Namespaced names such as "frontend/vue" create their directories
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
     
     # Create a default spec template
     default_spec = f"""# {spec_name.title()} Specification
@@ -239,16 +1950,24 @@ Brief description of what this application does and why it exists.
     
     print(f"Created new spec: {file_path}")
 
-def refine_spec(spec_name, ai_tool=None):
+def refine_spec(spec_name, ai_tool=None, log_path=None, sections=None, jobs=None, use_cache=True, max_tokens=None):
     """Intelligently refine an existing spec using AI analysis and enhancement"""
-    file_path = os.path.join(SPECS_DIR, f"{spec_name}.md")
-    if not os.path.isfile(file_path):
+    try:
+        file_path = find_spec_path(spec_name)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+    if not file_path:
         print(f"Spec '{spec_name}' not found. Use 'create' to make a new spec.")
         return
     
     if ai_tool is None:
         ai_tool = get_default_ai_tool()
     
+    if sections:
+        refine_spec_sections(spec_name, file_path, sections, ai_tool, log_path, jobs, use_cache)
+        return
+    
     print(f"Refining spec using AI analysis: {spec_name}")
     print(f"Using AI tool: {ai_tool}")
     
@@ -258,23 +1977,17 @@ def refine_spec(spec_name, ai_tool=None):
         print("Error: Meta-spec for spec refinement not found")
         print("Falling back to manual editing...")
         # Fallback to manual editing
-        try:
-            subprocess.run(['nano', file_path], check=True)
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            try:
-                subprocess.run(['vim', file_path], check=True)
-            except (subprocess.CalledProcessError, FileNotFoundError):
-                print(f"Could not open editor. Please manually edit: {file_path}")
+        open_in_editor(file_path)
         return
     
     try:
+        span = trace_begin('prompt-assembly', spec=spec_name)
         # Read the meta-spec for refinement
         with open(meta_spec_path, 'r', encoding='utf-8') as f:
             meta_spec_content = f.read()
         
         # Read the current spec
-        with open(file_path, 'r', encoding='utf-8') as f:
-            current_spec_content = f.read()
+        current_spec_content, spec_tree = load_spec(file_path)
         
         # Create a refinement prompt combining meta-spec with current spec
         refinement_prompt = f"""{meta_spec_content}
@@ -301,80 +2014,486 @@ The application is named "{spec_name}". Please provide the complete refined spec
 
 Save the refined specification by overwriting the existing file at: {file_path}
 """
+        trace_end(span, prompt_chars=len(refinement_prompt), prompt_tokens=estimate_tokens(refinement_prompt))
         
-        # Create temporary file with refinement prompt
-        import tempfile
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.md', delete=False) as temp_file:
-            temp_file.write(refinement_prompt)
-            temp_file_path = temp_file.name
+        # A spec too large for one prompt is refined section by section, in parallel
+        limit = max_tokens or get_context_tokens(ai_tool)
+        headings = [node['heading'] for node in iter_spec_sections(spec_tree) if node['level'] == 2]
+        if estimate_tokens(refinement_prompt) > limit and headings:
+            print(f"Refinement prompt is ~{estimate_tokens(refinement_prompt)} tokens, over the {limit}-token context; "
+                  f"refining each section separately.")
+            refine_spec_sections(spec_name, file_path, headings, ai_tool, log_path, jobs, use_cache)
+            return
         
-        try:
-            # Use AI tool to refine the spec
-            print("Analyzing and refining specification...")
-            
-            module = get_ai_tool_module(ai_tool)
-            
-            # Create appropriate command for refinement
-            if ai_tool == 'claude':
-                # Use the temp file directly with claude
-                cmd = f"claude -p --allowedTools 'Bash,Edit,Write' < {temp_file_path}"
-            else:
-                # Fall back to the module's execute method for other tools
-                cmd = module.execute(temp_file_path)
-            
-            # Execute the AI tool command
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+        # Use AI tool to refine the spec
+        print("Analyzing and refining specification...")
+        
+        # Pipe the prompt straight into the AI tool
+        result = run_ai_tool_cached(ai_tool, refinement_prompt, [file_path], use_cache, log_path=log_path)
+        report_latency(result)
+        
+        if result.returncode == 0:
+            print("Specification refinement completed successfully")
+            print(f"Refined spec saved to: {file_path}")
+            print("Review the enhanced specification to ensure it meets your requirements.")
             
-            if result.returncode == 0:
-                print("Specification refinement completed successfully")
-                print(f"Refined spec saved to: {file_path}")
-                print("Review the enhanced specification to ensure it meets your requirements.")
-                
-                # Show a brief summary of what was changed if there's output
-                if result.stdout:
-                    print("\nRefinement Summary:")
-                    # Look for any summary or key changes mentioned in the output
-                    lines = result.stdout.split('\n')
-                    for line in lines[-10:]:  # Show last 10 lines for summary
-                        if line.strip() and not line.startswith('claude'):
-                            print(f"  {line}")
-            else:
-                print(f"Error during AI refinement: {result.stderr}")
-                print("Falling back to manual editing...")
-                # Fallback to manual editing on AI failure
-                try:
-                    subprocess.run(['nano', file_path], check=True)
-                except (subprocess.CalledProcessError, FileNotFoundError):
-                    try:
-                        subprocess.run(['vim', file_path], check=True)
-                    except (subprocess.CalledProcessError, FileNotFoundError):
-                        print(f"Could not open editor. Please manually edit: {file_path}")
-                return
-                
-        finally:
-            # Clean up temporary file
-            try:
-                os.unlink(temp_file_path)
-            except:
-                pass
+            # Show a brief summary of what was changed if there's output
+            if result.stdout:
+                print("\nRefinement Summary:")
+                # The cached runner returns the whole reply; its closing lines summarize the changes
+                lines = result.stdout.split('\n')
+                for line in lines[-10:]:  # Show last 10 lines for summary
+                    if line.strip() and not line.startswith('claude'):
+                        print(f"  {line}")
+        else:
+            print(f"Error during AI refinement: {result.stderr}")
+            print("Falling back to manual editing...")
+            # Fallback to manual editing on AI failure
+            open_in_editor(file_path)
+            return
                 
     except Exception as e:
         print(f"Error during spec refinement: {e}")
         print("Falling back to manual editing...")
         # Fallback to manual editing on any error
+        open_in_editor(file_path)
+        return
+
+def open_in_editor(file_path):
+    """Last resort for refine: open the spec in nano or vim, but only when a terminal is attached"""
+    if not sys.stdin.isatty():
+        print(f"No terminal to open an editor in. Please manually edit: {file_path}")
+        return
+    try:
+        subprocess.run(['nano', file_path], check=True)
+    except (subprocess.CalledProcessError, FileNotFoundError):
         try:
-            subprocess.run(['nano', file_path], check=True)
+            subprocess.run(['vim', file_path], check=True)
         except (subprocess.CalledProcessError, FileNotFoundError):
+            print(f"Could not open editor. Please manually edit: {file_path}")
+
+def get_refinement_guidelines(meta_text, meta_tree, heading):
+    """Return the refiner's general language rules plus its guidance for one section, if it has any"""
+    parts = []
+    language = find_spec_section(meta_tree, 'Language Enhancement')
+    if language:
+        parts.append(get_section_text(meta_text, language))
+    specific = find_spec_section(meta_tree, 'Section-Specific Guidelines')
+    if specific:
+        block = []
+        for line in get_section_text(meta_text, specific).splitlines():
+            match = re.match(r'\*\*(.+?) Section:\*\*', line.strip())
+            if match:
+                block = [line] if match.group(1).lower() in heading.lower() else []
+            elif block and line.strip():
+                block.append(line)
+            elif block:
+                break
+        if block:
+            parts.append("\n".join(block))
+    return "\n\n".join(parts)
+
+def build_section_refinement_prompt(spec_name, tree, text, node, guidelines):
+    outline = "\n".join(f"{'  ' * (other['level'] - 1)}- {other['heading']}" for other in iter_spec_sections(tree))
+    return f"""You are refining one section of the application specification "{spec_name}".
+
+REFINEMENT GUIDELINES:
+
+{guidelines}
+
+OUTLINE OF THE WHOLE SPECIFICATION (for context only):
+
+{outline}
+
+SECTION TO REFINE:
+
+{get_section_text(text, node).rstrip()}
+
+INSTRUCTIONS:
+
+Refine only this section, keeping every functional requirement it states while improving clarity, completeness and technology-agnostic language. Do not edit any files. Reply with the refined section only, as markdown that starts with the heading line "{'#' * node['level']} {node['heading']}" and includes any subsections, with no commentary before or after it.
+"""
+
+def extract_refined_section(output, node):
+    """Return the refined section's lines from an AI reply, or None if the reply has no matching heading"""
+    lines = output.strip().splitlines()
+    if len(lines) >= 2 and lines[0].startswith('```') and lines[-1].strip() == '```':
+        lines = lines[1:-1]
+    prefix = '#' * node['level'] + ' '
+    for idx, line in enumerate(lines):
+        # A reply headed by a different section must not be spliced in over this one
+        match = re.match(r'(#{1,6})\s+(.*?)\s*#*\s*$', line.strip())
+        if line.startswith(prefix) and match and match.group(2).lower() == node['heading'].lower():
+            block = lines[idx:]
+            while block and not block[-1].strip():
+                block.pop()
+            return block if len(block) > 1 or node['line'] == node['end'] else None
+    return None
+
+def refine_spec_sections(spec_name, file_path, section_names, ai_tool, log_path=None, jobs=None, use_cache=True):
+    """Refine selected sections concurrently with small per-section prompts and splice them back in"""
+    text, tree = load_spec(file_path)
+    nodes = []
+    for name in section_names:
+        node = find_spec_section(tree, name)
+        if node is None:
+            print(f"Section '{name}' not found in spec '{spec_name}'. Sections: "
+                  f"{', '.join(other['heading'] for other in iter_spec_sections(tree) if other['level'] == 2)}")
+            return
+        if any(other['line'] <= node['line'] <= other['end'] or node['line'] <= other['line'] <= node['end']
+               for other in nodes if other is not node):
+            print(f"Section '{node['heading']}' overlaps another selected section; pick one of them.")
+            return
+        if node not in nodes:
+            nodes.append(node)
+    try:
+        meta_text, meta_tree = load_spec(os.path.join(META_DIR, 'spec-refiner.md'))
+    except OSError:
+        meta_text, meta_tree = '', parse_spec_text('')
+    
+    print(f"Refining {len(nodes)} section(s) of {spec_name} using {ai_tool}: {', '.join(n['heading'] for n in nodes)}")
+    log_lock = threading.Lock()
+    
+    def refine_one(node):
+        prompt = build_section_refinement_prompt(spec_name, tree, text, node,
+                                                 get_refinement_guidelines(meta_text, meta_tree, node['heading']))
+        start = time.monotonic()
+        result = run_ai_tool_cached(ai_tool, prompt, use_cache=use_cache, capture_output=True, echo=False)
+        elapsed = time.monotonic() - start
+        if log_path:
+            with log_lock, open(log_path, 'a', encoding='utf-8') as log_file:
+                log_file.write(f"=== {node['heading']} ===\n{result.stdout}{result.stderr}\n")
+        if result.returncode != 0:
+            errors = (result.stderr or '').strip().splitlines()
+            if getattr(result, 'timed_out', False) or not errors:
+                return node, None, elapsed, describe_failure(result)
+            return node, None, elapsed, errors[-1]
+        block = extract_refined_section(result.stdout, node)
+        if block is None:
+            return node, None, elapsed, "reply did not contain the section heading"
+        cached = ", cached" if getattr(result, 'cached', False) else ""
+        return node, block, elapsed, f"prompt ~{estimate_tokens(prompt)} tokens{cached}"
+    
+    workers = min(len(nodes), jobs or DEFAULT_GENERATE_JOBS)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(refine_one, nodes))
+    
+    replacements = []
+    for node, block, elapsed, detail in results:
+        if block is None:
+            print(f"  {node['heading']}: failed after {elapsed:.1f}s ({detail}); left unchanged")
+            continue
+        replacements.append((node, block))
+        print(f"  {node['heading']}: refined in {elapsed:.1f}s ({detail})")
+    if not replacements:
+        print("No sections were refined.")
+        return
+    if write_spliced_spec(file_path, text, replacements):
+        print(f"Refined {len(replacements)} section(s) in: {file_path}")
+
+def write_spliced_spec(file_path, text, replacements, appended=()):
+    """Replace section line spans with new blocks and append new sections, unless the file changed meanwhile"""
+    lines = text.splitlines()
+    for node, block in sorted(replacements, key=lambda r: -r[0]['line']):
+        # Keep the blank lines that separated the section from the next heading
+        original = lines[node['line'] - 1:node['end']]
+        trailing = len(original) - len("\n".join(original).rstrip().splitlines())
+        lines[node['line'] - 1:node['end']] = block + [''] * trailing
+    for block in appended:
+        while lines and not lines[-1].strip():
+            lines.pop()
+        lines.extend([''] + block)
+    
+    # Do not clobber edits made to the spec while the AI tool was running
+    with open(file_path, 'rb') as f:
+        if f.read().decode('utf-8', errors='replace') != text:
+            print(f"Error: {file_path} changed while the AI tool was running; the new sections were not written.")
+            return False
+    newline = "\r\n" if "\r\n" in text else "\n"
+    with open(file_path, 'w', encoding='utf-8', newline='') as f:
+        f.write(newline.join(lines) + (newline if text.endswith("\n") or appended else ""))
+    return True
+
+def get_update_snapshot_path(spec_name, path):
+    key = hashlib.sha1(f"{spec_name}\0{os.path.abspath(path)}".encode('utf-8')).hexdigest()[:16]
+    return get_cache_path('update-snapshots', f"{key}.json")
+
+def snapshot_codebase(path, previous=None, workers=None):
+    """Return {relative path: [mtime, size, sha1]} for every file the codebase walk visits"""
+    previous = previous or {}
+    files = {}
+    stale = []
+    for root, level, entries in scan_codebase(path):
+        for entry in entries:
             try:
-                subprocess.run(['vim', file_path], check=True)
-            except (subprocess.CalledProcessError, FileNotFoundError):
-                print(f"Could not open editor. Please manually edit: {file_path}")
+                st = entry.stat()
+            except OSError:
+                continue
+            rel_path = os.path.relpath(entry.path, path)
+            known = previous.get(rel_path)
+            if known and known[0] == st.st_mtime_ns and known[1] == st.st_size:
+                files[rel_path] = known
+            else:
+                files[rel_path] = [st.st_mtime_ns, st.st_size, None]
+                stale.append((rel_path, entry.path))
+    
+    def hash_one(item):
+        try:
+            return hash_file(item[1])
+        except OSError:
+            return None
+    
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers or get_summary_workers()) as pool:
+        for (rel_path, _), digest in zip(stale, pool.map(hash_one, stale)):
+            if digest is None:
+                del files[rel_path]
+            else:
+                files[rel_path][2] = digest
+    return files
+
+def list_codebase_files(path):
+    """Return the relative paths of every file the codebase walk visits, without reading them"""
+    return {os.path.relpath(entry.path, path) for root, level, entries in scan_codebase(path) for entry in entries}
+
+def diff_snapshots(old, new):
+    """Return (added, changed, removed) relative paths between two codebase snapshots"""
+    added = sorted(p for p in new if p not in old)
+    changed = sorted(p for p in new if p in old and new[p][2] != old[p][2])
+    removed = sorted(p for p in old if p not in new)
+    return added, changed, removed
+
+def git_changed_files(path, ref, current):
+    """Return (added, changed, removed) relative to path between a git ref and the working tree"""
+    added, changed, removed = [], [], []
+    diff = subprocess.run(['git', 'diff', '--name-status', '--no-renames', '--relative', ref, '--'],
+                          cwd=path, capture_output=True, text=True)
+    if diff.returncode != 0:
+        raise ValueError(diff.stderr.strip() or f"git diff against '{ref}' failed")
+    for line in diff.stdout.splitlines():
+        status, _, rel_path = line.partition('\t')
+        rel_path = os.path.normpath(rel_path)
+        if status.startswith('D'):
+            removed.append(rel_path)
+        elif rel_path in current:
+            (added if status.startswith('A') else changed).append(rel_path)
+    untracked = subprocess.run(['git', 'ls-files', '--others', '--exclude-standard'],
+                               cwd=path, capture_output=True, text=True)
+    added.extend(os.path.normpath(p) for p in untracked.stdout.splitlines() if os.path.normpath(p) in current)
+    return sorted(set(added)), sorted(changed), sorted(removed)
+
+def select_update_sections(tree, text, changed_paths):
+    """Pick the ## sections a set of changed files is likely to affect"""
+    sections = [node for node in iter_spec_sections(tree) if node['level'] == 2]
+    selected = []
+    for heading, hints in UPDATE_SECTION_HINTS.items():
+        if any(hint in '/' + rel_path.lower().replace(os.sep, '/') for rel_path in changed_paths for hint in hints):
+            for node in sections:
+                if heading.lower() in node['heading'].lower() and node not in selected:
+                    selected.append(node)
+                    break
+    # Sections that mention a changed file by name are affected too
+    stems = {os.path.splitext(os.path.basename(p))[0].lower() for p in changed_paths}
+    stems = {stem for stem in stems if len(stem) >= 4 and stem not in ('index', 'main', 'init', '__init__')}
+    for node in sections:
+        if node not in selected and stems.intersection(tokenize_search_text(get_section_text(text, node))):
+            selected.append(node)
+    if not selected:
+        selected = [node for node in sections if node['heading'].lower() not in ('purpose', 'goals', 'use cases')]
+    return sorted(selected, key=lambda node: node['line'])
+
+def build_codebase_delta(path, added, changed, removed, budget=None, workers=None):
+    """Summarize only the files that changed, packed into the token budget like a full summary"""
+    budget = budget or DEFAULT_SUMMARY_BUDGET
+    remaining = budget * CHARS_PER_TOKEN
+    cache = load_summary_cache(path)
+    report = {'budget': budget, 'included': [], 'dropped': [], 'used': 0}
+    parts = [f"=== CODEBASE CHANGES ({len(added)} added, {len(changed)} changed, {len(removed)} removed) ==="]
+    if removed:
+        parts.append("Removed files:")
+        parts.extend(f"  - {rel_path}" for rel_path in removed)
+        parts.append("")
+    jobs = []
+    for status, rel_paths in (('added', added), ('changed', changed)):
+        for rel_path in rel_paths:
+            file_path = os.path.join(path, rel_path)
+            try:
+                jobs.append((status, rel_path, file_path, os.stat(file_path)))
+            except OSError:
+                continue
+    prefetch_cached_files(cache, [(j[2], j[1], j[3], j[1].endswith(SOURCE_EXTENSIONS)) for j in jobs], workers)
+    for index, (status, rel_path, file_path, st) in enumerate(jobs):
+        header = f"--- {rel_path} ({status}) ---"
+        if remaining < MIN_SUMMARY_FILE_CHARS + len(header):
+            report['dropped'].extend(j[1] for j in jobs[index:])
+            break
+        limit = max(MIN_SUMMARY_FILE_CHARS, remaining // min(len(jobs) - index, 4)) - len(header) - 2
+        content = read_cached_file(cache, file_path, rel_path, limit, st, skeleton=rel_path.endswith(SOURCE_EXTENSIONS))
+        if content is None:
+            parts.append(f"{header}\n(binary or unreadable)")
+            continue
+        parts.extend([header, content, ""])
+        remaining -= len(header) + len(content) + 2
+        report['included'].append((rel_path, estimate_tokens(content)))
+    # Only changed files were read, so the entries for everything else must survive for the next full summary
+    save_summary_cache(cache, prune=False)
+    if report['dropped']:
+        parts.append(f"({len(report['dropped'])} more changed files omitted to fit the budget: "
+                     f"{', '.join(report['dropped'][:20])})")
+    delta = "\n".join(parts)
+    report['used'] = estimate_tokens(delta)
+    return delta, report
+
+def extract_updated_sections(output, nodes):
+    """Split an AI reply into replacements for the selected sections and any new ## sections"""
+    lines = output.strip().splitlines()
+    if len(lines) >= 2 and lines[0].startswith('```') and lines[-1].strip() == '```':
+        lines = lines[1:-1]
+    reply = "\n".join(lines)
+    by_heading = {node['heading'].lower(): node for node in nodes}
+    replacements, appended = [], []
+    seen = set()
+    for reply_node in iter_spec_sections(parse_spec_text(reply)):
+        heading = reply_node['heading'].lower()
+        if reply_node['level'] != 2 or 'update summary' in heading or 'update notes' in heading:
+            continue
+        block = get_section_text(reply, reply_node).rstrip().splitlines()
+        # The agent's closing summary is not part of the spec
+        for idx, line in enumerate(block):
+            if line.strip().lower().startswith('update summary'):
+                block = "\n".join(block[:idx]).rstrip().splitlines()
+                break
+        if heading in by_heading:
+            replacements.append((by_heading.pop(heading), block))
+        elif heading not in seen:
+            appended.append(block)
+        seen.add(heading)
+    return replacements, appended
+
+def update_spec_incremental(spec_name, file_path, analysis_path, since, ai_tool, budget=None, workers=None,
+                            log_path=None, use_cache=True):
+    """Update only the spec sections affected by files changed since a git ref or the previous update"""
+    snapshot_path = get_update_snapshot_path(spec_name, analysis_path)
+    snapshot = load_json_file(snapshot_path, {})
+    if snapshot.get('version') != UPDATE_SNAPSHOT_VERSION:
+        snapshot = {}
+    if since == 'last':
+        with trace_span('snapshot-codebase'):
+            current = snapshot_codebase(analysis_path, snapshot.get('files'), workers)
+        if not snapshot:
+            print(f"No previous update of '{spec_name}' from {os.path.abspath(analysis_path)} was recorded; "
+                  f"run a full update first.")
+            return
+        added, changed, removed = diff_snapshots(snapshot['files'], current)
+        label = f"the last update ({time.strftime('%Y-%m-%d %H:%M', time.localtime(snapshot['created']))})"
+    else:
+        # git knows what changed, so only the set of paths is needed and no file is read
+        current = list_codebase_files(analysis_path)
+        try:
+            added, changed, removed = git_changed_files(analysis_path, since, current)
+        except (ValueError, FileNotFoundError) as e:
+            print(f"Error: {e}")
+            return
+        label = since
+    if not (added or changed or removed):
+        print(f"No codebase changes since {label}; '{spec_name}' is up to date.")
         return
+    
+    span = trace_begin('prompt-assembly', spec=spec_name, since=since)
+    text, tree = load_spec(file_path)
+    nodes = select_update_sections(tree, text, added + changed + removed)
+    delta, report = build_codebase_delta(analysis_path, added, changed, removed, budget, workers)
+    print(f"Incremental update of {spec_name} since {label}: {len(added)} added, {len(changed)} changed, "
+          f"{len(removed)} removed")
+    print_summary_report(report)
+    print(f"Sections to update: {', '.join(node['heading'] for node in nodes)}")
+    trace_end(span, sections=len(nodes))
+    response = input("Continue? (y/N): ").strip().lower()
+    if response not in ['y', 'yes']:
+        print("Update cancelled.")
+        return
+    
+    span = trace_begin('prompt-assembly', spec=spec_name, since=since)
+    try:
+        meta_text, meta_tree = load_spec(os.path.join(META_DIR, 'spec-updater.md'))
+    except OSError:
+        meta_text, meta_tree = '', parse_spec_text('')
+    guidelines = "\n\n".join(get_section_text(meta_text, node) for node in
+                              (find_spec_section(meta_tree, name) for name in
+                               ('Usage Rules', 'Update Strategy by Section', 'Conflict Resolution')) if node)
+    outline = "\n".join(f"- {node['heading']}" for node in iter_spec_sections(tree) if node['level'] == 2)
+    sections_text = "\n\n".join(get_section_text(text, node).rstrip() for node in nodes)
+    update_prompt = f"""{guidelines}
+
+===============================================================================
+
+SPECIFICATION "{spec_name}" - ALL SECTIONS (for context):
+
+{outline}
+
+SECTIONS TO UPDATE:
+
+{sections_text}
 
-def update_spec(spec_name, source_path=None, ai_tool=None):
+===============================================================================
+
+{delta}
+
+===============================================================================
+
+UPDATE INSTRUCTIONS:
+
+The codebase changed since {label}; only the changes are shown above. Update the sections above so they reflect these changes, following the update guidelines. Preserve human intent, keep technology-agnostic language, and flag conflicts between the spec and the code inline.
+
+Do not edit any files. Reply with each section above in full, in the same order, each starting with its original "## " heading line. If the changes introduce functionality that belongs in a section not listed in the outline, add it as a new "## " section after them. Finally, write a line "Update Summary:" followed by bullet points describing what changed.
+"""
+    trace_end(span, prompt_chars=len(update_prompt), prompt_tokens=estimate_tokens(update_prompt))
+    print(f"Update prompt: ~{estimate_tokens(update_prompt)} tokens")
+    on_line, update_summary = make_update_summary_parser()
+    result = run_ai_tool_cached(ai_tool, update_prompt, use_cache=use_cache, on_line=on_line, log_path=log_path)
+    report_latency(result)
+    if result.returncode != 0:
+        if getattr(result, 'timed_out', False):
+            print(f"❌ Error during spec update: {describe_failure(result)}")
+        else:
+            print(f"❌ Error during spec update: {result.stderr}")
+        print("The original specification remains unchanged.")
+        return
+    # Match reply sections against every ## section so a re-sent existing section is never duplicated
+    replacements, appended = extract_updated_sections(
+        result.stdout, [node for node in iter_spec_sections(tree) if node['level'] == 2])
+    if not replacements and not appended:
+        print("❌ The AI reply did not contain any of the sections to update; the specification remains unchanged.")
+        return
+    if not write_spliced_spec(file_path, text, replacements, appended):
+        return
+    if since == 'last':
+        save_json_file(snapshot_path, {'version': UPDATE_SNAPSHOT_VERSION, 'created': time.time(), 'files': current})
+    elif snapshot:
+        # Keep an existing --since last baseline current; only files that changed since it are hashed
+        record_update_snapshot(spec_name, analysis_path, workers)
+    print(f"✅ Updated {len(replacements)} section(s){f' and added {len(appended)}' if appended else ''} in: {file_path}")
+    if update_summary:
+        print("Update Summary:")
+        for line in update_summary:
+            print(f"  {line}")
+
+def record_update_snapshot(spec_name, analysis_path, workers=None):
+    """Remember the codebase state a spec was last updated from, for update --since last"""
+    snapshot_path = get_update_snapshot_path(spec_name, analysis_path)
+    previous = load_json_file(snapshot_path, {})
+    files = snapshot_codebase(analysis_path, previous.get('files') if previous.get('version') == UPDATE_SNAPSHOT_VERSION else None,
+                              workers)
+    save_json_file(snapshot_path, {'version': UPDATE_SNAPSHOT_VERSION, 'created': time.time(), 'files': files})
+
+def update_spec(spec_name, source_path=None, ai_tool=None, budget=None, workers=None, log_path=None, use_cache=True,
+                since=None):
     """Update an existing spec by analyzing current codebase and merging with existing content"""
-    file_path = os.path.join(SPECS_DIR, f"{spec_name}.md")
-    if not os.path.isfile(file_path):
+    try:
+        file_path = find_spec_path(spec_name)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+    if not file_path:
         print(f"Spec '{spec_name}' not found. Use 'create' to make a new spec.")
         return
     
@@ -388,6 +2507,10 @@ def update_spec(spec_name, source_path=None, ai_tool=None):
     if ai_tool is None:
         ai_tool = get_default_ai_tool()
     
+    if since:
+        update_spec_incremental(spec_name, file_path, analysis_path, since, ai_tool, budget, workers, log_path, use_cache)
+        return
+    
     # Display prominent warning
     print("⚠️  CAUTION: WHOLESALE SPEC UPDATE ⚠️")
     print("")
@@ -426,6 +2549,7 @@ def update_spec(spec_name, source_path=None, ai_tool=None):
     print(f"Using AI tool: {ai_tool}")
     
     try:
+        span = trace_begin('prompt-assembly', spec=spec_name)
         # Read the meta-spec for updating
         with open(meta_spec_path, 'r', encoding='utf-8') as f:
             meta_spec_content = f.read()
@@ -434,14 +2558,12 @@ def update_spec(spec_name, source_path=None, ai_tool=None):
         with open(file_path, 'r', encoding='utf-8') as f:
             existing_spec_content = f.read()
         
-        # Create codebase summary
-        codebase_summary = create_codebase_summary(analysis_path)
-        
-        # Create update prompt combining all three elements
         from datetime import datetime
         current_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        update_prompt = f"""{meta_spec_content}
+        # Create update prompt combining all three elements, streaming the codebase summary into it
+        summary_report = {}
+        update_prompt = assemble_prompt([f"""{meta_spec_content}
 
 ===============================================================================
 
@@ -453,7 +2575,7 @@ EXISTING SPECIFICATION TO UPDATE:
 
 CURRENT CODEBASE ANALYSIS:
 
-{codebase_summary}
+""", iter_codebase_summary(analysis_path, budget, workers, summary_report), f"""
 
 ===============================================================================
 
@@ -478,73 +2600,67 @@ Include clear update notes documenting:
 - New functionality that was added
 - Any conflicts that need human review
 - Content that was intentionally preserved
-"""
+"""], get_context_tokens(ai_tool) * CHARS_PER_TOKEN)
+        print_summary_report(summary_report)
+        trace_end(span, prompt_chars=get_prompt_chars(update_prompt), prompt_tokens=estimate_tokens(update_prompt))
         
-        # Create temporary file with update prompt
-        import tempfile
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.md', delete=False) as temp_file:
-            temp_file.write(update_prompt)
-            temp_file_path = temp_file.name
+        # Use AI tool to update the spec
+        print("Performing intelligent spec update...")
+        print("This may take a moment as we analyze the codebase and merge with existing spec...")
         
-        try:
-            # Use AI tool to update the spec
-            print("Performing intelligent spec update...")
-            print("This may take a moment as we analyze the codebase and merge with existing spec...")
-            
-            module = get_ai_tool_module(ai_tool)
-            
-            # Create appropriate command for updating
-            if ai_tool == 'claude':
-                # Use the temp file directly with claude
-                cmd = f"claude -p --allowedTools 'Bash,Edit,Write' < {temp_file_path}"
-            else:
-                # Fall back to the module's execute method for other tools
-                cmd = module.execute(temp_file_path)
-            
-            # Execute the AI tool command
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+        # Pipe the prompt straight into the AI tool
+        on_line, update_summary = make_update_summary_parser()
+        result = run_ai_tool_cached(ai_tool, update_prompt, [file_path], use_cache, on_line=on_line, log_path=log_path)
+        report_latency(result)
+        
+        if result.returncode == 0:
+            record_update_snapshot(spec_name, analysis_path, workers)
+            print("✅ Specification update completed successfully")
+            print(f"Updated spec saved to: {file_path}")
+            print("")
+            print("🔍 IMPORTANT: Please review the updated specification carefully!")
+            print("   - Check that business intent was preserved")
+            print("   - Verify new functionality is accurate")
+            print("   - Look for any flagged conflicts")
+            print("   - Ensure technical details match current codebase")
+            print("")
+            print("Consider running 'autobot show {spec_name}' to review the updated content.")
             
-            if result.returncode == 0:
-                print("✅ Specification update completed successfully")
-                print(f"Updated spec saved to: {file_path}")
-                print("")
-                print("🔍 IMPORTANT: Please review the updated specification carefully!")
-                print("   - Check that business intent was preserved")
-                print("   - Verify new functionality is accurate")
-                print("   - Look for any flagged conflicts")
-                print("   - Ensure technical details match current codebase")
-                print("")
-                print("Consider running 'autobot show {spec_name}' to review the updated content.")
-                
-                # Show a brief summary if available
-                if result.stdout:
-                    # Look for update summary in the output
-                    lines = result.stdout.split('\n')
-                    summary_started = False
-                    for line in lines:
-                        if 'update' in line.lower() and ('summary' in line.lower() or 'changes' in line.lower()):
-                            summary_started = True
-                        elif summary_started and line.strip():
-                            print(f"  {line}")
-                        elif summary_started and not line.strip():
-                            break
+            # Show the update summary picked out of the streamed output
+            if update_summary:
+                print("Update Summary:")
+                for line in update_summary:
+                    print(f"  {line}")
+        else:
+            if getattr(result, 'timed_out', False):
+                print(f"❌ Error during spec update: {describe_failure(result)}")
             else:
                 print(f"❌ Error during spec update: {result.stderr}")
-                print("The original specification remains unchanged.")
-                return
-                
-        finally:
-            # Clean up temporary file
-            try:
-                os.unlink(temp_file_path)
-            except:
-                pass
+            print("The original specification remains unchanged.")
+            return
                 
     except Exception as e:
         print(f"Error during spec update: {e}")
         print("The original specification remains unchanged.")
         return
 
+def make_update_summary_parser():
+    """Return (on_line, lines): a streaming parser that collects the agent's update summary block"""
+    state = {'started': False, 'done': False}
+    lines = []
+
+    def on_line(line):
+        if state['done']:
+            return
+        if 'update' in line.lower() and ('summary' in line.lower() or 'changes' in line.lower()):
+            state['started'] = True
+        elif state['started'] and line.strip():
+            lines.append(line)
+        elif state['started']:
+            state['done'] = True
+
+    return on_line, lines
+
 def show_config():
     config = load_config()
     current_default = get_default_ai_tool()
@@ -553,8 +2669,37 @@ def show_config():
     print("Current Configuration:")
     print(f"  Default AI Tool: {current_default}")
     print(f"  Available AI Tools: {', '.join(available_tools)}")
+    width = max([len(tool) for tool in available_tools] or [0])
+    for tool in available_tools:
+        print(f"    {tool.ljust(width)}  {describe_ai_tool(tool)}")
+    max_bytes, max_age = get_ai_cache_limits()
+    policy = get_execution_policy()
+    timeout = 'none' if policy['timeout'] is None else f"{policy['timeout']:g}s"
+    hedge_after = 'off' if policy['hedge_after'] is None else f"{policy['hedge_after']:g}s"
+    print(f"  AI Tool Timeout: {timeout} (ai_timeout)")
+    print(f"  Retries: {policy['retries']}, first after {policy['backoff']:g}s (ai_retries, ai_retry_backoff)")
+    print(f"  Fallback AI Tools: {', '.join(policy['fallback']) or 'none'} (fallback_ai_tools)")
+    print(f"  Hedge After: {hedge_after} (hedge_after)")
+    print(f"  AI Result Cache: {max_bytes // (1024 * 1024)} MB, {max_age // 86400:g} days (ai_cache_max_mb, ai_cache_max_age_days)")
     print(f"  Config File: {CONFIG_FILE}")
 
+def describe_ai_tool(ai_tool):
+    """One-line summary of a plugin's manifest, read without importing the plugin"""
+    manifest = get_ai_tool_manifest(ai_tool)
+    details = []
+    if 'stdin' in manifest:
+        details.append('prompt on stdin' if manifest['stdin'] else 'prompt as an argument')
+    if 'streaming' in manifest:
+        details.append('streams output' if manifest['streaming'] else 'output at exit')
+    if manifest.get('prompt_pieces'):
+        details.append('prompt streamed in pieces')
+    if manifest.get('max_prompt_tokens'):
+        details.append(f"prompts up to ~{manifest['max_prompt_tokens']} tokens")
+    if 'build_invocation' not in manifest.get('entry_points', []):
+        details.append('legacy execute() plugin' if 'execute' in manifest.get('entry_points', []) else 'no entry point')
+    name = manifest.get('name', ai_tool)
+    return f"{name} ({', '.join(details)})" if details else name
+
 def set_config_default_ai_tool(ai_tool):
     try:
         set_default_ai_tool(ai_tool)
@@ -564,113 +2709,569 @@ def set_config_default_ai_tool(ai_tool):
     except Exception as e:
         print(f"Error saving configuration: {e}")
 
-def create_codebase_summary(path="."):
-    """Create a comprehensive summary of the codebase for AI analysis"""
-    summary_parts = []
-    
-    # Add project overview
-    summary_parts.append("=== CODEBASE ANALYSIS REQUEST ===")
-    summary_parts.append(f"Please analyze the following codebase located at: {os.path.abspath(path)}")
-    summary_parts.append("")
-    
-    # Read README if available
-    readme_files = ['README.md', 'README.txt', 'README.rst', 'readme.md']
-    for readme in readme_files:
-        readme_path = os.path.join(path, readme)
-        if os.path.exists(readme_path):
+def compile_ignore_pattern(line):
+    """Translate one .gitignore line into a (regex, negate, dir_only) rule, or None"""
+    line = line.rstrip('\r\n')
+    if not line.endswith('\\ '):
+        line = line.rstrip(' ')
+    if not line or line.startswith('#'):
+        return None
+    negate = line.startswith('!')
+    if negate or line.startswith('\\!') or line.startswith('\\#'):
+        line = line[1:]
+    dir_only = line.endswith('/')
+    line = line.rstrip('/')
+    if not line:
+        return None
+    # A slash anywhere but the end anchors the pattern to the ignore file's directory
+    anchored = '/' in line
+    line = line.lstrip('/')
+    regex = ''
+    i = 0
+    while i < len(line):
+        if line.startswith('**/', i):
+            regex += '(?:.*/)?'
+            i += 3
+        elif line.startswith('/**', i) and i + 3 == len(line):
+            regex += '/.*'
+            i += 3
+        elif line.startswith('**', i):
+            regex += '.*'
+            i += 2
+        elif line[i] == '*':
+            regex += '[^/]*'
+            i += 1
+        elif line[i] == '?':
+            regex += '[^/]'
+            i += 1
+        elif line[i] == '[' and line.find(']', i + 2) != -1:
+            close = line.find(']', i + 2)
+            body = line[i + 1:close].replace('\\', '\\\\')
+            if body.startswith('!'):
+                body = '^' + body[1:]
+            regex += f'[{body}]'
+            i = close + 1
+        elif line[i] == '\\' and i + 1 < len(line):
+            regex += re.escape(line[i + 1])
+            i += 2
+        else:
+            regex += re.escape(line[i])
+            i += 1
+    if not anchored:
+        regex = '(?:.*/)?' + regex
+    return re.compile(regex + r'\Z'), negate, dir_only
+
+def load_ignore_rules(directory, names):
+    """Compile the rules from any ignore files present in a directory"""
+    rules = []
+    for ignore_file in IGNORE_FILE_NAMES:
+        if ignore_file not in names:
+            continue
+        try:
+            with open(os.path.join(directory, ignore_file), 'r', encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    rule = compile_ignore_pattern(line)
+                    if rule:
+                        rules.append(rule)
+        except OSError:
+            pass
+    return rules
+
+def is_ignored(rel_path, is_dir, rule_sets):
+    """Apply ignore rules from the outermost directory inwards; the last match wins"""
+    ignored = False
+    for base_len, rules in rule_sets:
+        sub_path = rel_path[base_len:]
+        for regex, negate, dir_only in rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(sub_path):
+                ignored = not negate
+    return ignored
+
+def scan_codebase(path="."):
+    """Walk the tree once with os.scandir, yielding (root, level, files) records in os.walk order"""
+    # Files stay as os.DirEntry objects so their cached stat() can be reused
+    # by later stages; entries are sorted so summaries are stable between runs.
+    # Ignore files are honoured at every level and whole subtrees are pruned
+    # before descending into them. Only the directories still to visit are held.
+    stack = [(path, '', 0, [])]
+    while stack:
+        root, rel_root, level, rule_sets = stack.pop()
+        try:
+            with os.scandir(root) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+        rules = load_ignore_rules(root, {e.name for e in entries if e.name in IGNORE_FILE_NAMES})
+        if rules:
+            rule_sets = rule_sets + [(len(rel_root), rules)]
+        files = []
+        subdirs = []
+        for entry in entries:
             try:
-                with open(readme_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    summary_parts.append("=== README CONTENT ===")
-                    summary_parts.append(content[:3000])  # First 3000 chars
-                    summary_parts.append("")
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            if is_dir and (entry.name.startswith('.') or entry.name in IGNORED_DIRS or entry.is_symlink()):
+                continue
+            rel_path = rel_root + entry.name
+            if rule_sets and is_ignored(rel_path, is_dir, rule_sets):
+                continue
+            if is_dir:
+                subdirs.append((entry.path, rel_path + '/'))
+            else:
+                files.append(entry)
+        trace_count('files_scanned', len(files))
+        # Push in reverse so the first subdirectory is visited next
+        for subdir, rel_subdir in reversed(subdirs):
+            stack.append((subdir, rel_subdir, level + 1, rule_sets))
+        yield root, level, files
+
+def get_cache_path(*parts):
+    """Return a path inside the .autobot-cache directory, creating parent directories"""
+    cache_path = os.path.join(CACHE_DIR, *parts)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    return cache_path
+
+def load_json_file(file_path, default=None):
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception:
+        return default
+
+def save_json_file(file_path, data):
+    # Write to a sibling temp file and rename so readers never see a partial file
+    temp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(temp_path, file_path)
+        return True
+    except Exception:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        return False
+
+def load_summary_cache(path):
+    """Load the per-file content cache for the codebase at path"""
+    key = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:16]
+    cache_path = get_cache_path('summaries', f"{key}.json")
+    data = load_json_file(cache_path, {})
+    files = data.get('files', {}) if data.get('version') == SUMMARY_CACHE_VERSION else {}
+    return {'path': cache_path, 'files': files, 'used': set(), 'dirty': False}
+
+def save_summary_cache(cache, prune=True):
+    """Persist the cache, dropping entries for files that were not used this run unless prune is off"""
+    if not cache['dirty'] and (not prune or len(cache['used']) == len(cache['files'])):
+        return
+    files = {k: v for k, v in cache['files'].items() if k in cache['used'] or not prune}
+    save_json_file(cache['path'], {'version': SUMMARY_CACHE_VERSION, 'files': files})
+
+def decode_text(data, final=True):
+    # An incremental decoder tolerates a multi-byte character cut off by a bounded read
+    text = codecs.getincrementaldecoder('utf-8')().decode(data, final=final)
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+def hash_file(file_path):
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(READ_BLOCK_BYTES), b''):
+            digest.update(block)
+            trace_count('bytes_read', len(block))
+    return digest.hexdigest()
+
+def extract_file_content(file_path, size, skeleton):
+    """Read only as much of a file as extraction needs, returning (content, sha1 or None)"""
+    try:
+        with open(file_path, 'rb') as f:
+            head = f.read(BINARY_SNIFF_BYTES)
+            trace_count('bytes_read', len(head))
+            if b'\0' in head:
+                return None, None
+            ext = os.path.splitext(file_path)[1]
+            if skeleton and size <= SKELETON_MAX_BYTES:
+                data = head + f.read()
+                trace_count('bytes_read', len(data) - len(head))
+                return extract_skeleton(os.path.basename(file_path), data, decode_text(data)), hashlib.sha1(data).hexdigest()
+            if skeleton and ext in SKELETON_PATTERNS:
+                # Scan huge files through mmap so they are never loaded into memory
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    outline = regex_skeleton(mapped, SKELETON_PATTERNS[ext], SUMMARY_EXTRACT_CHARS)
+                trace_count('bytes_read', size - len(head))
+                if outline:
+                    return "[outline: declarations only]\n" + outline, None
+            max_bytes = SUMMARY_EXTRACT_CHARS * 4
+            data = head + f.read(max(0, max_bytes - len(head)))
+            trace_count('bytes_read', len(data) - len(head))
+            complete = len(data) >= size
+            digest = hashlib.sha1(data).hexdigest() if complete else None
+            return decode_text(data, final=complete)[:SUMMARY_EXTRACT_CHARS], digest
+    except (UnicodeDecodeError, ValueError):
+        return None, None
+
+def build_cache_entry(file_path, st, extract, skeleton, previous):
+    """Extract a file into a fresh cache entry; safe to call from worker threads"""
+    if previous and previous['extract'] == extract and previous['size'] == st.st_size and previous.get('sha1'):
+        # Touched but unchanged (e.g. after a checkout) - keep the extracted content
+        if hash_file(file_path) == previous['sha1']:
+            return dict(previous, mtime=st.st_mtime_ns)
+    content, digest = extract_file_content(file_path, st.st_size, skeleton)
+    if content is not None:
+        content = content[:SUMMARY_EXTRACT_CHARS]
+    return {'mtime': st.st_mtime_ns, 'size': st.st_size, 'sha1': digest,
+            'extract': extract, 'content': content}
+
+def get_extract_key(skeleton):
+    # Always extract the same amount so budget changes between runs still hit the cache
+    return f"skeleton:{SKELETON_VERSION}" if skeleton else f"prefix:{SUMMARY_EXTRACT_CHARS}"
+
+def is_cache_entry_current(entry, st, extract):
+    return bool(entry) and entry['extract'] == extract and entry['mtime'] == st.st_mtime_ns and entry['size'] == st.st_size
+
+def prefetch_cached_files(cache, jobs, workers=None):
+    """Extract stale files in parallel; jobs are (file_path, key, stat_result, skeleton) tuples"""
+    stale = [job for job in jobs
+             if not is_cache_entry_current(cache['files'].get(job[1]), job[2], get_extract_key(job[3]))]
+    if not stale:
+        return
+
+    def extract(job):
+        file_path, key, st, skeleton = job
+        try:
+            return build_cache_entry(file_path, st, get_extract_key(skeleton), skeleton, cache['files'].get(key))
+        except OSError:
+            return None
+
+    if len(stale) == 1 or (workers or 1) <= 1:
+        entries = [extract(job) for job in stale]
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            entries = list(pool.map(extract, stale))
+    for job, entry in zip(stale, entries):
+        if entry is not None:
+            cache['files'][job[1]] = entry
+            cache['used'].add(job[1])
+            cache['dirty'] = True
+
+def read_cached_file(cache, file_path, key, limit, stat_result=None, skeleton=False):
+    """Return the first limit characters of a file (or its skeleton), skipping the read when the cache is current"""
+    try:
+        st = stat_result or os.stat(file_path)
+    except OSError:
+        return None
+    extract = get_extract_key(skeleton)
+    entry = cache['files'].get(key)
+    if not is_cache_entry_current(entry, st, extract):
+        try:
+            entry = build_cache_entry(file_path, st, extract, skeleton, entry)
+        except OSError:
+            return None
+        cache['files'][key] = entry
+        cache['dirty'] = True
+    cache['used'].add(key)
+    content = entry['content']
+    return content[:limit] if content is not None else None
+
+def python_skeleton(text):
+    """Outline a Python module with ast: classes, signatures, decorators and model fields"""
+    tree = ast.parse(text)
+    lines = text.split('\n')
+    out = []
+
+    def source_line(lineno, indent):
+        line = ' '.join(lines[lineno - 1].split())
+        return indent + (line[:157] + '...' if len(line) > 160 else line)
+
+    def signature(node, indent):
+        if node.body[0].lineno == node.lineno:
+            # One-liner such as "def f(): return 1" - drop the body
+            line = source_line(node.lineno, '')
+            return indent + (line.split('):', 1)[0] + '):' if '):' in line else line)
+        # Signatures can span several lines; join them up to the closing colon
+        parts = []
+        for i in range(node.lineno - 1, node.body[0].lineno - 1):
+            parts.append(re.sub(r'\s+#.*$', '', ' '.join(lines[i].split())))
+            joined = ' '.join(parts)
+            if joined.endswith(':') and joined.count('(') <= joined.count(')'):
+                break
+        return indent + ' '.join(parts).replace('( ', '(').replace(' )', ')')
+
+    def docstring(node, indent):
+        doc = ast.get_docstring(node)
+        if doc:
+            out.append(f'{indent}"""{doc.strip().splitlines()[0][:120]}"""')
+
+    def visit(body, indent):
+        for node in body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                for decorator in node.decorator_list:
+                    out.append(source_line(decorator.lineno, indent))
+                out.append(signature(node, indent))
+                docstring(node, indent + '    ')
+                if isinstance(node, ast.ClassDef):
+                    visit(node.body, indent + '    ')
+            elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+                # Module constants, app/router objects and model fields
+                out.append(source_line(node.lineno, indent))
+
+    doc = ast.get_docstring(tree)
+    if doc:
+        out.append(f'"""{doc.strip().splitlines()[0][:120]}"""')
+    visit(tree.body, '')
+    return '\n'.join(out)
+
+def regex_skeleton(data, patterns, max_chars=None):
+    """Outline a source file by keeping only the lines that match declaration patterns"""
+    out = []
+    total = 0
+    for match in re.compile(patterns, re.M).finditer(data):
+        line = match.group(0).decode('utf-8', errors='replace').rstrip()
+        line = line.rstrip('{').rstrip()
+        out.append(line[:157] + '...' if len(line) > 160 else line)
+        total += len(out[-1]) + 1
+        if max_chars and total >= max_chars:
+            break
+    return '\n'.join(out)
+
+def extract_skeleton(file_name, data, text):
+    """Return a declarations-only outline of a source file, or the raw text when that says more"""
+    ext = os.path.splitext(file_name)[1]
+    try:
+        if ext == '.py':
+            outline = python_skeleton(text)
+        elif ext in SKELETON_PATTERNS:
+            outline = regex_skeleton(data, SKELETON_PATTERNS[ext])
+        else:
+            return text
+    except (SyntaxError, ValueError, RecursionError):
+        return text
+    # Small files, or files that are mostly declarations anyway, are sent as-is
+    if not outline or len(text) <= MIN_SKELETON_SOURCE_CHARS or len(outline) * 2 >= len(text):
+        return text
+    return "[outline: declarations only]\n" + outline
+
+def estimate_tokens(text):
+    """Rough token count used for budgeting prompts (about four characters per token)"""
+    return (get_prompt_chars(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def score_summary_candidate(entry, rel_path, kind, newest_mtime):
+    """Score a config or source file by how much it is likely to tell the AI about the app"""
+    name = entry.name.lower()
+    st = entry.stat()
+    score = 3.0 if kind == 'config' else 0.0
+    # Entry points, routes, models and services describe the application best
+    if any(pattern in name for pattern in PRIORITY_PATTERNS):
+        score += 2.0
+    # Centrality: files near the project root tend to be the ones everything hangs off
+    score += 2.0 / (1 + rel_path.count(os.sep))
+    # Size: near-empty files say little, very large ones are usually generated
+    if st.st_size < 200:
+        score -= 1.0
+    elif st.st_size > 200000:
+        score -= 2.0
+    # Recency: recently edited files reflect the current state of the app
+    age_days = max(0.0, (newest_mtime - st.st_mtime) / 86400.0)
+    score += 1.0 / (1 + age_days)
+    return score
+
+def assemble_prompt(parts, max_chars=None):
+    """Build a prompt from strings and generators of strings, cutting the generated parts off at a hard size cap"""
+    # Literal parts (meta-specs, instructions) are always kept whole; generated parts share what is left.
+    # The prompt is returned as its list of pieces, which every consumer takes without joining them
+    room = None if max_chars is None else max_chars - sum(len(part) for part in parts if isinstance(part, str))
+    if room is not None and room < 0:
+        # Cutting a meta-spec or an existing spec short would have the agent rewrite it from half a copy
+        for part in parts:
+            if not isinstance(part, str):
+                part.close()
+        raise ValueError(f"the meta-spec, spec and instructions alone are ~{(max_chars - room) // CHARS_PER_TOKEN} "
+                         f"tokens, over the {max_chars // CHARS_PER_TOKEN}-token limit for this AI tool")
+    pieces = []
+    for part in parts:
+        if isinstance(part, str):
+            pieces.append(part)
+            continue
+        for piece in part:
+            if room is not None and len(piece) > room:
+                # The note itself is cut short when there is no room for it either, so the cap always holds
+                pieces.append((piece[:max(0, room - len(PROMPT_TRUNCATION_NOTE))] + PROMPT_TRUNCATION_NOTE)[:room])
+                room = 0
+                part.close()
+                break
+            pieces.append(piece)
+            if room is not None:
+                room -= len(piece)
+    return pieces
+
+def iter_codebase_summary(path=".", budget=None, workers=None, report=None):
+    """Yield a codebase summary packed into a token budget piece by piece, filling in report as it goes"""
+    # Files are packed by length and their content is taken from the summary cache only
+    # as each piece is handed on, so the caller decides whether the summary is ever
+    # materialized as one string
+    budget = budget or DEFAULT_SUMMARY_BUDGET
+    workers = workers or get_summary_workers()
+    budget_chars = budget * CHARS_PER_TOKEN
+    report = {} if report is None else report
+    report.update({'budget': budget, 'included': [], 'dropped': [], 'used': 0})
+    with trace_span('codebase-summary', path=os.path.abspath(path), budget=budget) as span:
+        cache = load_summary_cache(path)
+        used = 0
+        
+        # Add project overview
+        piece = (f"=== CODEBASE ANALYSIS REQUEST ===\n"
+                 f"Please analyze the following codebase located at: {os.path.abspath(path)}\n\n")
+        used += len(piece)
+        yield piece
+        
+        # Read README if available (up to 15% of the budget)
+        readme_files = ['README.md', 'README.txt', 'README.rst', 'readme.md']
+        for readme in readme_files:
+            readme_path = os.path.join(path, readme)
+            if os.path.exists(readme_path):
+                content = read_cached_file(cache, readme_path, readme, int(budget_chars * 0.15))
+                if content is not None:
+                    piece = f"=== README CONTENT ===\n{content}\n\n"
+                    used += len(piece)
+                    yield piece
+                    report['included'].append((readme, estimate_tokens(content)))
                     break
-            except:
-                pass
-    
-    # Directory structure
-    summary_parts.append("=== PROJECT STRUCTURE ===")
-    for root, dirs, files in os.walk(path):
-        # Skip hidden and common ignore directories
-        dirs[:] = [d for d in dirs if not d.startswith('.') and d not in ['node_modules', '__pycache__', 'venv', 'env', 'dist', 'build', 'target']]
         
-        level = root.replace(path, '').count(os.sep)
-        indent = ' ' * 2 * level
-        summary_parts.append(f"{indent}{os.path.basename(root)}/")
+        # Walk the tree once: the directory structure (up to 20% of the budget) is handed on one
+        # directory at a time while the config and source files are collected for scoring
+        piece = "=== PROJECT STRUCTURE ===\n"
+        used += len(piece)
+        yield piece
+        structure_chars = int(budget_chars * 0.2)
+        candidates = []
+        newest_mtime = 0.0
+        scan_span = trace_begin('scan-codebase')
+        for root, level, files in scan_codebase(path):
+            if structure_chars is not None:
+                indent = ' ' * 2 * level
+                lines = [f"{indent}{os.path.basename(root)}/"]
+                
+                # Limit depth to avoid overwhelming output
+                if level < 3:
+                    subindent = ' ' * 2 * (level + 1)
+                    for entry in files[:10]:  # Limit files per directory
+                        if not entry.name.startswith('.'):
+                            lines.append(f"{subindent}{entry.name}")
+                    if len(files) > 10:
+                        lines.append(f"{subindent}... and {len(files) - 10} more files")
+                
+                piece = "\n".join(lines) + "\n"
+                if len(piece) > structure_chars:
+                    piece = "... (structure truncated to fit the summary budget)\n"
+                    structure_chars = None
+                else:
+                    structure_chars -= len(piece)
+                used += len(piece)
+                yield piece
+            
+            for entry in files:
+                if entry.name.lower() in CONFIG_FILE_NAMES:
+                    kind = 'config'
+                elif entry.name.endswith(SOURCE_EXTENSIONS):
+                    kind = 'source'
+                else:
+                    continue
+                try:
+                    newest_mtime = max(newest_mtime, entry.stat().st_mtime)
+                except OSError:
+                    continue
+                candidates.append((entry, os.path.relpath(entry.path, path), kind))
+        trace_end(scan_span)
         
-        # Limit depth to avoid overwhelming output
-        if level < 3:
-            subindent = ' ' * 2 * (level + 1)
-            for file in files[:10]:  # Limit files per directory
-                if not file.startswith('.'):
-                    summary_parts.append(f"{subindent}{file}")
-            if len(files) > 10:
-                summary_parts.append(f"{subindent}... and {len(files) - 10} more files")
-    
-    summary_parts.append("")
-    
-    # Configuration files content
-    config_files = []
-    for root, dirs, files in os.walk(path):
-        dirs[:] = [d for d in dirs if not d.startswith('.') and d not in ['node_modules', '__pycache__', 'venv', 'env']]
-        for file in files:
-            if file.lower() in ['package.json', 'requirements.txt', 'cargo.toml', 'go.mod', 'pom.xml', 'composer.json', 'gemfile', 'setup.py']:
-                config_files.append(os.path.join(root, file))
-    
-    if config_files:
-        summary_parts.append("=== CONFIGURATION FILES ===")
-        for config_file in config_files[:5]:  # Limit to 5 config files
-            try:
-                with open(config_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    summary_parts.append(f"--- {os.path.relpath(config_file, path)} ---")
-                    summary_parts.append(content[:1000])  # First 1000 chars
-                    summary_parts.append("")
-            except:
-                pass
-    
-    # Sample source files
-    source_extensions = ['.py', '.js', '.ts', '.jsx', '.tsx', '.java', '.go', '.rs', '.php', '.rb']
-    source_files = []
-    
-    for root, dirs, files in os.walk(path):
-        dirs[:] = [d for d in dirs if not d.startswith('.') and d not in ['node_modules', '__pycache__', 'venv', 'env']]
-        for file in files:
-            if any(file.endswith(ext) for ext in source_extensions):
-                source_files.append(os.path.join(root, file))
-    
-    if source_files:
-        summary_parts.append("=== KEY SOURCE FILES (SAMPLES) ===")
-        # Prioritize main files, routes, models
-        priority_patterns = ['main', 'app', 'index', 'server', 'route', 'model', 'controller', 'service']
+        used += 1
+        yield "\n"
         
-        priority_files = []
-        other_files = []
+        # Score every config and source file, then pack the best into the remaining budget
+        scored = sorted(((score_summary_candidate(entry, rel_path, kind, newest_mtime), rel_path, entry, kind)
+                         for entry, rel_path, kind in candidates), key=lambda c: (-c[0], c[1]))
         
-        for file_path in source_files:
-            file_name = os.path.basename(file_path).lower()
-            if any(pattern in file_name for pattern in priority_patterns):
-                priority_files.append(file_path)
-            else:
-                other_files.append(file_path)
+        read_span = trace_begin('read-files', candidates=len(scored))
+        remaining = budget_chars - used - len(SUMMARY_INSTRUCTIONS)
+        packed = {'config': [], 'source': []}
+        batch_size = workers * 2
+        for index, (score, rel_path, entry, kind) in enumerate(scored):
+            if index % batch_size == 0:
+                # Read the next batch of likely candidates concurrently before packing them in order
+                batch = scored[index:index + batch_size]
+                prefetch_cached_files(cache, [(c[2].path, c[1], c[2].stat(), c[3] == 'source') for c in batch], workers)
+            header = f"--- {rel_path} ---"
+            if remaining < MIN_SUMMARY_FILE_CHARS + len(header):
+                report['dropped'].extend(c[1] for c in scored[index:])
+                break
+            # Share the budget so one large file cannot crowd out the rest
+            share = remaining // min(len(scored) - index, 4)
+            limit = min(remaining - len(header) - 2, max(MIN_SUMMARY_FILE_CHARS, share))
+            content = read_cached_file(cache, entry.path, rel_path, limit, entry.stat(), skeleton=(kind == 'source'))
+            if content is None:
+                continue
+            # Only the length is kept; the content is taken from the summary cache again as it is handed on
+            packed[kind].append([header, len(content), entry, rel_path, limit])
+            remaining -= len(header) + len(content) + 2
         
-        # Show priority files first, then others
-        sample_files = priority_files[:3] + other_files[:2]  # Max 5 files
+        # Give budget left over by small files back to the files that were cut short
+        for kind in ('config', 'source'):
+            for item in packed[kind]:
+                header, length, entry, rel_path, limit = item
+                if length == limit and remaining > 0:
+                    content = read_cached_file(cache, entry.path, rel_path, limit + remaining, entry.stat(),
+                                               skeleton=(kind == 'source'))
+                    if content is not None:
+                        item[1], item[4] = len(content), limit + remaining
+                        remaining -= len(content) - length
+                report['included'].append((rel_path, (item[1] + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN))
         
-        for file_path in sample_files:
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    summary_parts.append(f"--- {os.path.relpath(file_path, path)} ---")
-                    summary_parts.append(content[:2000])  # First 2000 chars
-                    summary_parts.append("")
-            except:
-                pass
-    
-    summary_parts.append("=== ANALYSIS INSTRUCTIONS ===")
-    summary_parts.append("Based on the above codebase information, please generate a comprehensive application specification following the standardized Autobot format. Focus on understanding WHAT this application does functionally, rather than HOW it's implemented technically. Create a technology-agnostic specification that could be used to rebuild this application with completely different technologies while preserving all core functionality and user experience.")
-    
-    return "\n".join(summary_parts)
+        save_summary_cache(cache)
+        trace_end(read_span)
+        
+        for kind, title in (('config', "CONFIGURATION FILES"), ('source', "KEY SOURCE FILES (SAMPLES)")):
+            if packed[kind]:
+                piece = f"=== {title} ===\n"
+                used += len(piece)
+                yield piece
+            for header, length, entry, rel_path, limit in packed[kind]:
+                content = read_cached_file(cache, entry.path, rel_path, limit, entry.stat(), skeleton=(kind == 'source'))
+                piece = f"{header}\n{content}\n\n"
+                used += len(piece)
+                yield piece
+        
+        if report['dropped']:
+            piece = f"({len(report['dropped'])} lower-priority files omitted to fit the summary budget)\n\n"
+            used += len(piece)
+            yield piece
+        
+        piece = f"=== ANALYSIS INSTRUCTIONS ===\n{SUMMARY_INSTRUCTIONS}"
+        used += len(piece)
+        yield piece
+        report['used'] = (used + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+        span.update(tokens=report['used'], included=len(report['included']), dropped=len(report['dropped']))
+
+def build_codebase_summary(path=".", budget=None, workers=None):
+    """Create a codebase summary packed into a token budget, returning (summary, report)"""
+    report = {}
+    summary = ''.join(iter_codebase_summary(path, budget, workers, report))
+    return summary, report
+
+def create_codebase_summary(path=".", budget=None, workers=None):
+    """Create a comprehensive summary of the codebase for AI analysis"""
+    return build_codebase_summary(path, budget, workers)[0]
+
+def print_summary_report(report):
+    print(f"Codebase summary: ~{report['used']} of {report['budget']} tokens, "
+          f"{len(report['included'])} files included, {len(report['dropped'])} dropped")
+    for rel_path, tokens in report['included']:
+        print(f"  + {rel_path} (~{tokens} tokens)")
+    for rel_path in report['dropped'][:10]:
+        print(f"  - {rel_path}")
+    if len(report['dropped']) > 10:
+        print(f"  - ... and {len(report['dropped']) - 10} more")
 
 def parse_path_argument(args):
     """Parse --path argument from command line args"""
@@ -682,7 +3283,193 @@ def parse_path_argument(args):
             print("Missing value for --path. Using current directory.")
     return "."
 
-def infer_spec(spec_name, source_path=None, ai_tool=None):
+def parse_budget_argument(args):
+    """Parse --budget argument (summary token budget) from command line args"""
+    if '--budget' in args:
+        idx = args.index('--budget')
+        if idx + 1 < len(args) and args[idx + 1].isdigit() and int(args[idx + 1]) > 0:
+            return int(args[idx + 1])
+        else:
+            print(f"Invalid value for --budget. Using default of {DEFAULT_SUMMARY_BUDGET} tokens.")
+    return None
+
+def parse_positional_arguments(args, value_flags=('--ai-tool', '--path', '--budget', '--workers', '--log', '--jobs', '--out-dir',
+                                                     '--section', '--limit', '--since', '--max-tokens', '--chunk-mode')):
+    """Return the arguments that are neither flags nor flag values"""
+    positional = []
+    skip = False
+    for arg in args:
+        if skip:
+            skip = False
+        elif arg in value_flags:
+            skip = True
+        elif not arg.startswith('--'):
+            positional.append(arg)
+    return positional
+
+def parse_jobs_argument(args):
+    """Parse --jobs argument (concurrent generations) from command line args"""
+    if '--jobs' in args:
+        idx = args.index('--jobs')
+        if idx + 1 < len(args) and args[idx + 1].isdigit() and int(args[idx + 1]) > 0:
+            return int(args[idx + 1])
+        else:
+            print(f"Invalid value for --jobs. Using default of {DEFAULT_GENERATE_JOBS}.")
+    return None
+
+def parse_out_dir_argument(args):
+    """Parse --out-dir argument (parent of per-spec output directories) from command line args"""
+    if '--out-dir' in args:
+        idx = args.index('--out-dir')
+        if idx + 1 < len(args):
+            return args[idx + 1]
+        else:
+            print("Missing value for --out-dir. Using current directory.")
+    return "."
+
+def parse_section_argument(args):
+    """Parse --section argument (restrict a search to matching ## headings) from command line args"""
+    if '--section' in args:
+        idx = args.index('--section')
+        if idx + 1 < len(args):
+            return args[idx + 1]
+        else:
+            print("Missing value for --section. Searching all sections.")
+    return None
+
+def parse_section_arguments(args):
+    """Parse every --section argument (repeatable) from command line args"""
+    return [args[idx + 1] for idx, arg in enumerate(args[:-1]) if arg == '--section']
+
+def parse_since_argument(args):
+    """Parse --since argument (git ref or 'last' for an incremental update) from command line args"""
+    if '--since' in args:
+        idx = args.index('--since')
+        if idx + 1 < len(args):
+            return args[idx + 1]
+        else:
+            print("Missing value for --since. Performing a full update.")
+    return None
+
+def parse_max_tokens_argument(args):
+    """Parse --max-tokens argument (context size before a spec is chunked) from command line args"""
+    if '--max-tokens' in args:
+        idx = args.index('--max-tokens')
+        if idx + 1 < len(args) and args[idx + 1].isdigit() and int(args[idx + 1]) > 0:
+            return int(args[idx + 1])
+        else:
+            print("Invalid value for --max-tokens. Using configured context size.")
+    return None
+
+def parse_chunk_mode_argument(args):
+    """Parse --chunk-mode argument (sequential or parallel) from command line args"""
+    if '--chunk-mode' in args:
+        idx = args.index('--chunk-mode')
+        if idx + 1 < len(args) and args[idx + 1] in ('sequential', 'parallel'):
+            return args[idx + 1]
+        else:
+            print("Invalid value for --chunk-mode. Running chunks sequentially.")
+    return None
+
+def parse_limit_argument(args):
+    """Parse --limit argument (maximum search results) from command line args"""
+    if '--limit' in args:
+        idx = args.index('--limit')
+        if idx + 1 < len(args) and args[idx + 1].isdigit() and int(args[idx + 1]) > 0:
+            return int(args[idx + 1])
+        else:
+            print(f"Invalid value for --limit. Using default of {DEFAULT_SEARCH_LIMIT}.")
+    return None
+
+def parse_log_argument(args):
+    """Parse --log argument (file that also receives the AI tool's output) from command line args"""
+    if '--log' in args:
+        idx = args.index('--log')
+        if idx + 1 < len(args):
+            return args[idx + 1]
+        else:
+            print("Missing value for --log. Output will only be shown in the terminal.")
+    return None
+
+def parse_trace_argument(args):
+    """Parse --trace argument (file that receives a Chrome trace-event JSON of the run) from command line args"""
+    if '--trace' in args:
+        idx = args.index('--trace')
+        if idx + 1 < len(args):
+            return args[idx + 1]
+        else:
+            print("Missing value for --trace. No trace will be written.")
+    return None
+
+def parse_record_argument(args):
+    """Parse --record argument (file that receives every AI tool invocation) from command line args"""
+    if '--record' in args:
+        idx = args.index('--record')
+        if idx + 1 < len(args):
+            return args[idx + 1]
+        else:
+            print("Missing value for --record. Nothing will be recorded.")
+    return None
+
+def parse_replay_argument(args):
+    """Parse --replay argument (recording to play back instead of running AI tools) from command line args"""
+    if '--replay' in args:
+        idx = args.index('--replay')
+        if idx + 1 < len(args):
+            return args[idx + 1]
+        else:
+            print("Missing value for --replay. AI tools will run normally.")
+    return None
+
+def parse_replay_latency_argument(args):
+    """Parse --replay-latency argument ('recorded' or 'zero') from command line args"""
+    if '--replay-latency' in args:
+        idx = args.index('--replay-latency')
+        if idx + 1 < len(args) and args[idx + 1] in ('recorded', 'zero'):
+            return args[idx + 1]
+        else:
+            print("Invalid value for --replay-latency. Use 'recorded' or 'zero'. Using recorded latency.")
+    return 'recorded'
+
+def parse_policy_arguments(args):
+    """Parse --timeout, --retries, --fallback and --hedge-after into execution policy config overrides"""
+    overrides = {}
+    for flag, key in (('--timeout', 'ai_timeout'), ('--hedge-after', 'hedge_after')):
+        if flag in args:
+            idx = args.index(flag)
+            try:
+                value = float(args[idx + 1])
+                if value < 0:
+                    raise ValueError
+                overrides[key] = value
+            except (IndexError, ValueError):
+                print(f"Invalid value for {flag}. Expected a number of seconds.")
+    if '--retries' in args:
+        idx = args.index('--retries')
+        if idx + 1 < len(args) and args[idx + 1].isdigit():
+            overrides['ai_retries'] = int(args[idx + 1])
+        else:
+            print("Invalid value for --retries. Expected a whole number.")
+    if '--fallback' in args:
+        idx = args.index('--fallback')
+        tools = args[idx + 1].split(',') if idx + 1 < len(args) else []
+        unknown = [tool for tool in tools if tool not in get_ai_tools()]
+        if not tools or unknown:
+            print(f"Invalid value for --fallback. Available AI tools: {', '.join(get_ai_tools())}")
+        overrides['fallback_ai_tools'] = [tool for tool in tools if tool not in unknown]
+    return overrides
+
+def parse_workers_argument(args):
+    """Parse --workers argument (file reader threads) from command line args"""
+    if '--workers' in args:
+        idx = args.index('--workers')
+        if idx + 1 < len(args) and args[idx + 1].isdigit() and int(args[idx + 1]) > 0:
+            return int(args[idx + 1])
+        else:
+            print("Invalid value for --workers. Using configured default.")
+    return None
+
+def infer_spec(spec_name, source_path=None, ai_tool=None, budget=None, workers=None, log_path=None, use_cache=True):
     """Infer a spec from an existing codebase using AI analysis"""
     
     # Use provided path or current directory
@@ -705,121 +3492,308 @@ def infer_spec(spec_name, source_path=None, ai_tool=None):
         return
     
     try:
+        span = trace_begin('prompt-assembly', spec=spec_name)
         # Read the meta-spec
         with open(meta_spec_path, 'r', encoding='utf-8') as f:
             meta_spec_content = f.read()
         
-        # Create codebase summary
-        codebase_summary = create_codebase_summary(analysis_path)
-        
-        # Combine meta-spec with codebase summary
-        combined_prompt = f"""{meta_spec_content}
+        # Stream the codebase summary straight into the prompt, capped at what the AI tool accepts
+        summary_report = {}
+        combined_prompt = assemble_prompt([f"""{meta_spec_content}
 
 ===============================================================================
 
-{codebase_summary}
+""", iter_codebase_summary(analysis_path, budget, workers, summary_report), f"""
 
 ===============================================================================
 
 Please analyze the codebase information provided above and generate a complete application specification following the exact format outlined in the meta-specification. The specification should be for an application named "{spec_name}" and should be technology-agnostic while capturing all functional requirements.
 
 Save the generated specification as "{spec_name}.md" in the Autobot specs system.
-"""
+"""], get_context_tokens(ai_tool) * CHARS_PER_TOKEN)
+        print_summary_report(summary_report)
+        trace_end(span, prompt_chars=get_prompt_chars(combined_prompt), prompt_tokens=estimate_tokens(combined_prompt))
         
-        # Create temporary file with combined prompt
-        import tempfile
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.md', delete=False) as temp_file:
-            temp_file.write(combined_prompt)
-            temp_file_path = temp_file.name
+        # Use AI tool to generate the spec
+        print("Generating specification using AI analysis...")
         
-        try:
-            # Use AI tool to generate the spec
-            print("Generating specification using AI analysis...")
-            
-            module = get_ai_tool_module(ai_tool)
-            
-            # For infer command, we need to handle the content differently
-            # Instead of using the execute function directly, we'll construct a safer command
-            if ai_tool == 'claude':
-                # Use the temp file directly with claude
-                cmd = f"claude -p --allowedTools 'Bash,Edit,Write' < {temp_file_path}"
-            else:
-                # Fall back to the module's execute method for other tools
-                cmd = module.execute(temp_file_path)
-            
-            # Execute the AI tool command
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+        # Pipe the prompt straight into the AI tool
+        spec_file_path = os.path.join(SPECS_DIR, f"{spec_name}.md")
+        result = run_ai_tool_cached(ai_tool, combined_prompt, [spec_file_path], use_cache, log_path=log_path)
+        report_latency(result)
+        
+        if result.returncode == 0:
+            print("AI analysis completed successfully")
             
-            if result.returncode == 0:
-                print("AI analysis completed successfully")
-                
-                # Check if the spec was created by the AI tool
-                spec_file_path = os.path.join(SPECS_DIR, f"{spec_name}.md")
-                
-                if os.path.exists(spec_file_path):
-                    print(f"Generated spec: {spec_file_path}")
-                    print("Review and refine the generated spec to match your specific requirements.")
-                else:
-                    print("Note: The AI tool completed but the spec file was not found in the expected location.")
-                    print("The AI may have provided the specification in its output. Check the generated content.")
-                    if result.stdout:
-                        print("\nAI Tool Output:")
-                        print(result.stdout)
+            # Check if the spec was created by the AI tool
+            if os.path.exists(spec_file_path):
+                print(f"Generated spec: {spec_file_path}")
+                print("Review and refine the generated spec to match your specific requirements.")
             else:
-                print(f"Error running AI tool: {result.stderr}")
-                return
-                
-        finally:
-            # Clean up temporary file
-            try:
-                os.unlink(temp_file_path)
-            except:
-                pass
+                print("Note: The AI tool completed but the spec file was not found in the expected location.")
+                print("The AI may have provided the specification in its output. Check the output above.")
+                if log_path:
+                    print(f"The full output was also written to: {log_path}")
+        else:
+            print(f"Error running AI tool: {result.stderr}")
+            return
                 
     except Exception as e:
         print(f"Error during spec inference: {e}")
         return
 
-def main():
-    args = sys.argv[1:]
+def get_daemon_socket_path():
+    return os.path.join(CACHE_DIR, 'daemon.sock')
+
+def send_daemon_request(request, timeout=None):
+    """Send one JSON request to the daemon and return its JSON reply, or None if no daemon is listening"""
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(get_daemon_socket_path()):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(timeout)
+            client.connect(get_daemon_socket_path())
+            client.sendall(json.dumps(request).encode('utf-8') + b'\n')
+            client.shutdown(socket.SHUT_WR)
+            data = b''.join(iter(lambda: client.recv(65536), b''))
+        return json.loads(data.decode('utf-8'))
+    except (OSError, ValueError):
+        return None
+
+def is_daemon_command(args):
+    """Whether argv is a read-only command the daemon may run; checked by both the client and the server"""
+    if not isinstance(args, list) or not args or not all(isinstance(arg, str) for arg in args):
+        return False
+    # Global flags are stripped before forwarding, so a request carrying one (e.g. --trace <path>) is not from autobot
+    if args[0] not in DAEMON_COMMANDS or any(arg in GLOBAL_FLAGS for arg in args):
+        return False
+    return args[0] != 'config' or args[1:] == ['show']
+
+def forward_to_daemon(args):
+    """Run a read-only command in a running daemon; returns False if it has to run locally"""
+    if _daemon_mode or not is_daemon_command(args) or os.environ.get('AUTOBOT_NO_DAEMON'):
+        return False
+    # Per-run flags only take effect in this process
+    if _trace or _policy_overrides:
+        return False
+    reply = send_daemon_request({'args': args}, timeout=30)
+    if reply is None:
+        return False
+    sys.stdout.write(reply['stdout'])
+    sys.stderr.write(reply['stderr'])
+    return True
+
+def refresh_daemon_caches():
+    """Bring the in-memory spec index up to date before serving a request"""
+    global _spec_index
+    if _spec_index is not None:
+        index = refresh_spec_index({'specs': _spec_index, 'dirty': False})
+        if index['dirty']:
+            save_json_file(get_cache_path('spec-index.json'), {'version': SPEC_INDEX_VERSION,
+                                                               'specs_dir': os.path.abspath(SPECS_DIR),
+                                                               'specs': index['specs']})
+        _spec_index = index['specs']
+
+def run_daemon():
+    """Serve read-only commands over a Unix socket, keeping config, plugins, spec index and search index warm"""
+    global _daemon_mode
+    if not hasattr(socket, 'AF_UNIX'):
+        print("The daemon needs Unix domain sockets, which this platform does not support.")
+        return
+    socket_path = get_daemon_socket_path()
+    if send_daemon_request({'ping': True}, timeout=2):
+        print(f"A daemon is already running on {socket_path}")
+        return
+    get_cache_path('daemon.sock')
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    _daemon_mode = True
+    started = time.time()
+    served = 0
+    # Warm everything the forwarded commands touch
+    get_spec_index()
+    get_search_index()
+    for ai_tool in get_ai_tools():
+        try:
+            get_ai_tool_module(ai_tool)
+        except Exception:
+            pass
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # Create the socket owner-only; a chmod after bind would leave a window in which anyone could connect
+    old_umask = os.umask(0o077)
+    try:
+        server.bind(socket_path)
+    finally:
+        os.umask(old_umask)
+    server.listen(16)
+    print(f"Autobot daemon (pid {os.getpid()}) listening on {socket_path}; stop it with 'autobot daemon stop'")
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                conn.settimeout(10)
+                try:
+                    data = b''.join(iter(lambda: conn.recv(65536), b''))
+                    request = json.loads(data.decode('utf-8'))
+                except (OSError, ValueError):
+                    continue
+                if request.get('ping'):
+                    reply = {'pid': os.getpid(), 'uptime': time.time() - started, 'served': served}
+                elif request.get('stop'):
+                    conn.sendall(json.dumps({'stopped': True}).encode('utf-8'))
+                    break
+                else:
+                    # Commands run one at a time, so redirecting the process-wide streams is safe
+                    stdout, stderr = io.StringIO(), io.StringIO()
+                    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                        try:
+                            # Anything on the socket can send a request, so the allowlist is enforced here too
+                            if not is_daemon_command(request.get('args')):
+                                raise ValueError(f"the daemon only runs {', '.join(DAEMON_COMMANDS)} (config show only)")
+                            refresh_daemon_caches()
+                            main(request['args'])
+                        except Exception as e:
+                            print(f"Error: {e}")
+                    served += 1
+                    reply = {'stdout': stdout.getvalue(), 'stderr': stderr.getvalue()}
+                try:
+                    conn.sendall(json.dumps(reply).encode('utf-8'))
+                except OSError:
+                    pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        try:
+            os.unlink(socket_path)
+        except OSError:
+            pass
+    print("Autobot daemon stopped")
+
+def daemon_command(action):
+    if action in (None, 'start'):
+        run_daemon()
+    elif action == 'stop':
+        reply = send_daemon_request({'stop': True}, timeout=5)
+        print("Daemon stopped." if reply else "No daemon is running.")
+    elif action == 'status':
+        reply = send_daemon_request({'ping': True}, timeout=5)
+        if reply:
+            print(f"Daemon running: pid {reply['pid']}, up {reply['uptime']:.0f}s, {reply['served']} requests served, "
+                  f"socket {get_daemon_socket_path()}")
+        else:
+            print("No daemon is running.")
+    else:
+        print("Invalid daemon command. Use 'daemon [start]', 'daemon stop' or 'daemon status'")
+
+def main(argv=None):
+    args = sys.argv[1:] if argv is None else argv
+    trace_path = parse_trace_argument(args)
+    record_path = parse_record_argument(args)
+    replay_path = parse_replay_argument(args)
+    latency = parse_replay_latency_argument(args)
+    _policy_overrides.clear()
+    _policy_overrides.update(parse_policy_arguments(args))
+    for flag in GLOBAL_FLAGS:
+        if flag in args:
+            # Drop global flags so commands that check their argument count are unaffected
+            idx = args.index(flag)
+            args = args[:idx] + args[idx + 2:]
+    if record_path and replay_path:
+        print("Use either --record or --replay, not both.")
+        return
+    if record_path:
+        start_agent_session('record', record_path)
+    elif replay_path:
+        try:
+            start_agent_session('replay', replay_path, latency)
+        except (OSError, ValueError) as e:
+            print(f"Could not load recording {replay_path}: {e}")
+            return
+    if trace_path is None:
+        run_command(args)
+        return
+    start_trace()
+    try:
+        with trace_span('command', argv=args):
+            run_command(args)
+    finally:
+        write_trace(trace_path)
+
+def run_command(args):
+    if forward_to_daemon(args or ['help']):
+        return
     if len(args) == 0 or (len(args) == 1 and args[0] == 'help'):
         show_help()
         return
-    if args[0] == 'ls' and len(args) == 1:
-        list_specs()
+    if args[0] == 'ls' and len(args) <= 2:
+        list_specs(args[1] if len(args) == 2 else None)
         return
     if args[0] == 'generate' and len(args) >= 2:
         ai_tool = parse_ai_tool(args)
-        spec_name = args[1]
-        generate_from_spec(spec_name, ai_tool)
+        log_path = parse_log_argument(args)
+        spec_names = parse_positional_arguments(args[1:])
+        include_all = '--all' in args
+        chunk_mode = parse_chunk_mode_argument(args)
+        max_tokens = parse_max_tokens_argument(args)
+        if len(spec_names) == 1 and not include_all and not glob.has_magic(spec_names[0]):
+            generate_from_spec(spec_names[0], ai_tool, log_path, chunk_mode, max_tokens)
+            return
+        spec_names = expand_spec_names(spec_names, include_all)
+        if spec_names:
+            generate_batch(spec_names, ai_tool, parse_jobs_argument(args), parse_out_dir_argument(args),
+                           chunk_mode, max_tokens)
+        else:
+            print("No specs to generate.")
+        return
+    if args[0] == 'pipeline' and len(args) >= 2:
+        ai_tool = parse_ai_tool(args)
+        run_pipeline(args[1], ai_tool, parse_jobs_argument(args), parse_out_dir_argument(args),
+                     restart='--restart' in args, plan_only='--plan' in args)
         return
     if args[0] == 'dryrun' and len(args) >= 2:
         ai_tool = parse_ai_tool(args)
         spec_name = args[1]
-        dryrun_generation(spec_name, ai_tool)
+        dryrun_generation(spec_name, ai_tool, parse_chunk_mode_argument(args), parse_max_tokens_argument(args))
         return
-    if args[0] == 'show' and len(args) == 2:
-        show_spec(args[1])
+    if args[0] == 'show' and len(args) >= 2:
+        show_spec(args[1], parse_section_argument(args))
+        return
+    if args[0] == 'search' and len(args) >= 2:
+        query = ' '.join(parse_positional_arguments(args[1:]))
+        search_specs(query, parse_section_argument(args), parse_limit_argument(args))
         return
     if args[0] == 'create' and len(args) == 2:
         create_spec(args[1])
         return
     if args[0] == 'refine' and len(args) >= 2:
         ai_tool = parse_ai_tool(args)
+        log_path = parse_log_argument(args)
         spec_name = args[1]
-        refine_spec(spec_name, ai_tool)
+        refine_spec(spec_name, ai_tool, log_path, parse_section_arguments(args), parse_jobs_argument(args),
+                    use_cache='--no-cache' not in args, max_tokens=parse_max_tokens_argument(args))
         return
     if args[0] == 'update' and len(args) >= 2:
         ai_tool = parse_ai_tool(args)
         source_path = parse_path_argument(args)
+        budget = parse_budget_argument(args)
+        workers = parse_workers_argument(args)
+        log_path = parse_log_argument(args)
         spec_name = args[1]
-        update_spec(spec_name, source_path, ai_tool)
+        update_spec(spec_name, source_path, ai_tool, budget, workers, log_path, use_cache='--no-cache' not in args,
+                    since=parse_since_argument(args))
         return
     if args[0] == 'infer' and len(args) >= 2:
         ai_tool = parse_ai_tool(args)
         source_path = parse_path_argument(args)
+        budget = parse_budget_argument(args)
+        workers = parse_workers_argument(args)
+        log_path = parse_log_argument(args)
         spec_name = args[1]
-        infer_spec(spec_name, source_path, ai_tool)
+        infer_spec(spec_name, source_path, ai_tool, budget, workers, log_path, use_cache='--no-cache' not in args)
+        return
+    if args[0] == 'daemon':
+        daemon_command(args[1] if len(args) >= 2 else None)
         return
     if args[0] == 'config' and len(args) >= 2:
         if args[1] == 'show':
@@ -3,4 +3,7 @@
 # Pass-through script to run autobot.py with all arguments
 
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
-python3 "$SCRIPT_DIR/autobot.py" "$@"
+# Import autobot as a module so Python reuses its cached bytecode instead of recompiling it on every run.
+# The script directory replaces the current one on sys.path, as when running autobot.py directly,
+# so a module in the tree being analysed (e.g. a local shlex.py) is never imported instead of the stdlib
+exec python3 -c 'import sys; sys.path[0] = sys.argv.pop(1); import autobot; autobot.main()' "$SCRIPT_DIR" "$@"
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# bench_spec_index.py - Time cold and warm spec index loads over a synthetic specs tree.
+# Usage: python3 benchmarks/bench_spec_index.py [--specs N] [--repeat N]
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import autobot
+
+def parse_int_argument(args, name, default):
+    if name in args:
+        idx = args.index(name)
+        if idx + 1 < len(args):
+            return int(args[idx + 1])
+    return default
+
+def build_specs(root, total_specs, namespaces=50, subdirs=7):
+    """Create total_specs small markdown specs spread over nested namespaces"""
+    for i in range(total_specs):
+        spec_dir = os.path.join(root, f"ns{i % namespaces}", f"sub{i % subdirs}")
+        os.makedirs(spec_dir, exist_ok=True)
+        with open(os.path.join(spec_dir, f"spec{i}.md"), 'w') as f:
+            f.write(f"# Spec {i}\n\n## Overview\ntext\n\n## Requirements\n- item\n")
+
+def load_index():
+    autobot._spec_index = None
+    start = time.perf_counter()
+    autobot.get_spec_index()
+    return time.perf_counter() - start
+
+def main():
+    args = sys.argv[1:]
+    total_specs = parse_int_argument(args, '--specs', 10000)
+    repeat = parse_int_argument(args, '--repeat', 5)
+    root = tempfile.mkdtemp(prefix='autobot-bench-')
+    cwd = os.getcwd()
+    try:
+        specs_dir = os.path.join(root, 'specs')
+        build_specs(specs_dir, total_specs)
+        autobot.SPECS_DIR = specs_dir
+        os.chdir(root)
+        print(f"Synthetic specs: {total_specs} at {specs_dir}")
+        cold = load_index()
+        warm = min(load_index() for _ in range(repeat))
+        print(f"  cold index build:  {cold * 1000:8.1f} ms")
+        print(f"  warm index load:   {warm * 1000:8.1f} ms")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
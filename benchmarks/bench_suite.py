@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# bench_suite.py - Time Autobot's own overhead on synthetic repositories with an instant stub agent.
+# Usage: python3 benchmarks/bench_suite.py [--files N] [--shape wide|deep] [--specs N] [--binaries N]
+#                                          [--binary-mb N] [--repeat N] [--only name,...]
+#                                          [--out results.json] [--compare baseline.json]
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import contextlib
+import io
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import autobot
+
+RESULTS_VERSION = 1
+STUB_PLUGIN = '''import sys
+
+MANIFEST = {'name': 'Benchmark stub', 'stdin': True, 'streaming': True, 'prompt_pieces': True}
+
+def build_invocation(prompt):
+    # Drain the prompt and reply at once, so only Autobot's overhead (and interpreter start-up) is measured
+    return [sys.executable, '-S', '-c', 'import sys; sys.stdin.read(); print("ok")'], prompt
+'''
+SPEC_TEMPLATE = '''# Spec {i}
+
+## Purpose
+Benchmark spec number {i} used to measure indexing and listing.
+
+## Database Schema
+- users: id, name, email
+- orders: id, user_id, total
+
+## Endpoints
+- GET /api/items/{i}
+- POST /api/items
+
+## UI Layout
+A list page and a detail page.
+'''
+
+def parse_int_argument(args, name, default):
+    if name in args:
+        idx = args.index(name)
+        if idx + 1 < len(args):
+            return int(args[idx + 1])
+    return default
+
+def parse_value_argument(args, name, default=None):
+    if name in args:
+        idx = args.index(name)
+        if idx + 1 < len(args):
+            return args[idx + 1]
+    return default
+
+def write_source_file(path, j):
+    ext = ['.py', '.js', '.go', '.txt', '.json'][j % 5]
+    with open(path + ext, 'w') as f:
+        if ext == '.py':
+            f.write(f"class Model{j}:\n    def save(self, value):\n        return value * {j}\n" * 20)
+        elif ext == '.js':
+            f.write(f"export function handler{j}(req, res) {{\n  return res.send({j});\n}}\n" * 20)
+        else:
+            f.write(f"value = {j}\n")
+
+def build_wide_tree(root, total_files, files_per_dir=50, dirs_per_level=10):
+    """Create a shallow tree with many directories and many files per directory"""
+    created = 0
+    queue = [root]
+    while created < total_files:
+        current = queue.pop(0)
+        for i in range(dirs_per_level):
+            sub = os.path.join(current, f"pkg{i}")
+            os.makedirs(sub, exist_ok=True)
+            queue.append(sub)
+            for j in range(files_per_dir):
+                write_source_file(os.path.join(sub, f"module{j}"), created)
+                created += 1
+                if created >= total_files:
+                    return created
+    return created
+
+def build_deep_tree(root, total_files, depth=60, files_per_dir=5):
+    """Create narrow chains of nested directories, depth levels each"""
+    created = 0
+    chain = 0
+    while created < total_files:
+        current = os.path.join(root, f"chain{chain}")
+        for level in range(depth):
+            current = os.path.join(current, f"level{level}")
+            os.makedirs(current, exist_ok=True)
+            for j in range(files_per_dir):
+                write_source_file(os.path.join(current, f"file{j}"), created)
+                created += 1
+                if created >= total_files:
+                    return created
+        chain += 1
+    return created
+
+def build_binaries(root, count, size_mb):
+    """Add large binary files, some with source extensions so binary detection is exercised"""
+    block = os.urandom(1024 * 1024)
+    for i in range(count):
+        name = ['asset{}.bin', 'bundle{}.min.js', 'model{}.py'][i % 3].format(i)
+        with open(os.path.join(root, name), 'wb') as f:
+            for _ in range(size_mb):
+                f.write(block)
+
+def build_specs(root, total_specs, namespaces=20, subdirs=5):
+    """Create total_specs markdown specs spread over nested namespaces"""
+    for i in range(total_specs):
+        spec_dir = os.path.join(root, f"ns{i % namespaces}", f"sub{i % subdirs}")
+        os.makedirs(spec_dir, exist_ok=True)
+        with open(os.path.join(spec_dir, f"spec{i}.md"), 'w') as f:
+            f.write(SPEC_TEMPLATE.format(i=i))
+
+def measure(func, repeat, setup=None):
+    """Run func repeat times, calling setup before each run, with Autobot's terminal output discarded"""
+    runs = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        sink = io.StringIO()
+        with contextlib.redirect_stdout(sink), contextlib.redirect_stderr(sink):
+            start = time.perf_counter()
+            func()
+            runs.append((time.perf_counter() - start) * 1000)
+    runs.sort()
+    return {'best_ms': round(runs[0], 3), 'median_ms': round(runs[len(runs) // 2], 3),
+            'runs_ms': [round(run, 3) for run in runs]}
+
+def reset_caches(*names):
+    """Forget in-memory and on-disk caches so the next run starts cold"""
+    autobot._spec_index = None
+    autobot._spec_ast_memo.clear()
+    autobot._search_index_memo.clear()
+    autobot._plugin_registry = None
+    for name in names:
+        path = os.path.join(autobot.CACHE_DIR, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            os.unlink(path)
+
+def get_autobot_revision():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(autobot.__file__)))
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+def define_benchmarks(codebase, spec_name):
+    """Return (name, func, setup) triples; setup runs before every timed run"""
+    return [
+        ('summary_cold', lambda: autobot.create_codebase_summary(codebase), lambda: reset_caches('summaries')),
+        ('summary_warm', lambda: autobot.create_codebase_summary(codebase), None),
+        ('get_specs_cold', autobot.get_specs, lambda: reset_caches('spec-index.json')),
+        ('get_specs_warm', autobot.get_specs, lambda: reset_caches()),
+        ('list_specs', autobot.list_specs, None),
+        ('help_text', autobot.get_help_text, lambda: reset_caches()),
+        ('infer', lambda: autobot.infer_spec('bench-inferred', codebase, 'bench', use_cache=False), None),
+        ('refine', lambda: autobot.refine_spec(spec_name, 'bench', use_cache=False), None),
+    ]
+
+def print_comparison(results, baseline):
+    print(f"\nCompared with {baseline.get('revision') or 'baseline'} ({baseline.get('created')}):")
+    for name, result in results.items():
+        old = baseline.get('results', {}).get(name)
+        if not old:
+            print(f"  {name:<16} {result['best_ms']:10.1f} ms   (new)")
+            continue
+        ratio = result['best_ms'] / old['best_ms'] if old['best_ms'] else float('inf')
+        print(f"  {name:<16} {result['best_ms']:10.1f} ms   was {old['best_ms']:10.1f} ms   x{ratio:.2f}")
+
+def main():
+    args = sys.argv[1:]
+    params = {
+        'files': parse_int_argument(args, '--files', 10000),
+        'shape': parse_value_argument(args, '--shape', 'wide'),
+        'specs': parse_int_argument(args, '--specs', 1000),
+        'binaries': parse_int_argument(args, '--binaries', 3),
+        'binary_mb': parse_int_argument(args, '--binary-mb', 20),
+        'repeat': parse_int_argument(args, '--repeat', 3),
+    }
+    if params['shape'] not in ('wide', 'deep'):
+        print("Invalid value for --shape. Use 'wide' or 'deep'.")
+        return
+    only = parse_value_argument(args, '--only')
+    out_path = parse_value_argument(args, '--out')
+    compare_path = parse_value_argument(args, '--compare')
+    root = tempfile.mkdtemp(prefix='autobot-bench-')
+    saved = (autobot.SPECS_DIR, autobot.AI_TOOLS_DIR, autobot.CACHE_DIR, autobot.CONFIG_FILE)
+    try:
+        codebase = os.path.join(root, 'codebase')
+        os.makedirs(codebase)
+        start = time.perf_counter()
+        builder = build_wide_tree if params['shape'] == 'wide' else build_deep_tree
+        created = builder(codebase, params['files'])
+        build_binaries(codebase, params['binaries'], params['binary_mb'])
+        build_specs(os.path.join(root, 'specs'), params['specs'])
+        os.makedirs(os.path.join(root, 'ai-tools'))
+        with open(os.path.join(root, 'ai-tools', 'bench.py'), 'w') as f:
+            f.write(STUB_PLUGIN)
+        print(f"Synthetic {params['shape']} tree: {created} files, {params['binaries']} x {params['binary_mb']} MB "
+              f"binaries, {params['specs']} specs at {root} ({time.perf_counter() - start:.1f}s to build)")
+        # Point Autobot at the synthetic tree; caches and config stay inside it
+        autobot.SPECS_DIR = os.path.join(root, 'specs')
+        autobot.AI_TOOLS_DIR = os.path.join(root, 'ai-tools')
+        autobot.CACHE_DIR = os.path.join(root, '.autobot-cache')
+        autobot.CONFIG_FILE = os.path.join(root, '.autobot-config.json')
+        results = {}
+        for name, func, setup in define_benchmarks(codebase, 'ns0/sub0/spec0'):
+            if only and name not in only.split(','):
+                continue
+            results[name] = measure(func, params['repeat'], setup)
+            print(f"  {name:<16} best {results[name]['best_ms']:10.1f} ms   median {results[name]['median_ms']:10.1f} ms")
+    finally:
+        autobot.SPECS_DIR, autobot.AI_TOOLS_DIR, autobot.CACHE_DIR, autobot.CONFIG_FILE = saved
+        shutil.rmtree(root, ignore_errors=True)
+    report = {'version': RESULTS_VERSION, 'revision': get_autobot_revision(),
+              'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+              'platform': platform.platform(), 'params': params, 'results': results}
+    if out_path:
+        with open(out_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {out_path}")
+    if compare_path:
+        with open(compare_path) as f:
+            print_comparison(results, json.load(f))
+
+if __name__ == '__main__':
+    main()
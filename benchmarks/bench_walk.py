@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# bench_walk.py - Compare the old triple os.walk against the single scandir pass.
+# Usage: python3 benchmarks/bench_walk.py [--files N] [--repeat N]
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import autobot
+
+def parse_int_argument(args, name, default):
+    if name in args:
+        idx = args.index(name)
+        if idx + 1 < len(args):
+            return int(args[idx + 1])
+    return default
+
+def build_tree(root, total_files, files_per_dir=20, dirs_per_level=6):
+    """Create a synthetic source tree with roughly total_files files"""
+    created = 0
+    queue = [root]
+    while created < total_files:
+        current = queue.pop(0)
+        for i in range(dirs_per_level):
+            sub = os.path.join(current, f"pkg{i}")
+            os.makedirs(sub, exist_ok=True)
+            queue.append(sub)
+            for j in range(files_per_dir):
+                ext = ['.py', '.js', '.go', '.txt', '.json'][j % 5]
+                with open(os.path.join(sub, f"module{j}{ext}"), 'w') as f:
+                    f.write("x = 1\n")
+                created += 1
+                if created >= total_files:
+                    return created
+    return created
+
+def legacy_walk(path):
+    """The three os.walk passes create_codebase_summary used to make"""
+    structure = 0
+    for root, dirs, files in os.walk(path):
+        dirs[:] = [d for d in dirs if not d.startswith('.') and d not in ['node_modules', '__pycache__', 'venv', 'env', 'dist', 'build', 'target']]
+        structure += 1
+    config_files = []
+    for root, dirs, files in os.walk(path):
+        dirs[:] = [d for d in dirs if not d.startswith('.') and d not in ['node_modules', '__pycache__', 'venv', 'env']]
+        for file in files:
+            if file.lower() in autobot.CONFIG_FILE_NAMES:
+                config_files.append(os.path.join(root, file))
+    source_files = []
+    for root, dirs, files in os.walk(path):
+        dirs[:] = [d for d in dirs if not d.startswith('.') and d not in ['node_modules', '__pycache__', 'venv', 'env']]
+        for file in files:
+            if any(file.endswith(ext) for ext in autobot.SOURCE_EXTENSIONS):
+                source_files.append(os.path.join(root, file))
+    return structure, len(config_files), len(source_files)
+
+def single_walk(path):
+    """One scandir pass feeding all three sections"""
+    scan = list(autobot.scan_codebase(path))
+    config_files = [e.path for _, _, files in scan for e in files if e.name.lower() in autobot.CONFIG_FILE_NAMES]
+    source_files = [e.path for _, _, files in scan for e in files if e.name.endswith(autobot.SOURCE_EXTENSIONS)]
+    return len(scan), len(config_files), len(source_files)
+
+def best_of(func, path, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    args = sys.argv[1:]
+    total_files = parse_int_argument(args, '--files', 50000)
+    repeat = parse_int_argument(args, '--repeat', 3)
+    root = tempfile.mkdtemp(prefix='autobot-bench-')
+    try:
+        created = build_tree(root, total_files)
+        print(f"Synthetic tree: {created} files at {root}")
+        legacy = best_of(legacy_walk, root, repeat)
+        single = best_of(single_walk, root, repeat)
+        print(f"  legacy 3x os.walk:   {legacy * 1000:8.1f} ms")
+        print(f"  single scandir pass: {single * 1000:8.1f} ms")
+        print(f"  speedup:             {legacy / single:8.2f}x")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
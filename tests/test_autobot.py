@@ -0,0 +1,691 @@
+# test_autobot.py - Unit tests for autobot.py.
+# Usage: python3 -m pytest -q tests
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import autobot
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """Keep Autobot's cache inside a fresh directory"""
+    monkeypatch.setattr(autobot, 'CACHE_DIR', str(tmp_path / '.autobot-cache'))
+    monkeypatch.setattr(autobot, 'CONFIG_FILE', str(tmp_path / '.autobot-config.json'))
+    monkeypatch.setattr(autobot, 'AI_TOOLS_DIR', str(tmp_path / 'ai-tools'))
+    monkeypatch.setattr(autobot, 'SPECS_DIR', str(tmp_path / 'specs'))
+    monkeypatch.setattr(autobot, '_spec_index', None)
+    monkeypatch.setattr(autobot, '_spec_ast_memo', {})
+    monkeypatch.setattr(autobot, '_search_index_memo', {})
+    monkeypatch.setattr(autobot, '_config_memo', {'stamp': None, 'data': {}})
+    monkeypatch.setattr(autobot, '_module_memo', {})
+    monkeypatch.setattr(autobot, '_plugin_registry', None)
+    monkeypatch.setattr(autobot, '_agent_session', None)
+    monkeypatch.setattr(autobot, '_policy_overrides', {})
+    return tmp_path
+
+def compile_rules(*lines):
+    return [rule for rule in (autobot.compile_ignore_pattern(line) for line in lines) if rule]
+
+def ignored(lines, rel_path, is_dir=False):
+    return autobot.is_ignored(rel_path, is_dir, [(0, compile_rules(*lines))])
+
+# Ignore rules
+
+def test_blank_lines_and_comments_are_not_rules():
+    for line in ['', '   ', '\n', '# build', '/', '!']:
+        assert autobot.compile_ignore_pattern(line) is None
+
+def test_unanchored_pattern_matches_at_any_depth():
+    assert ignored(['build'], 'build', is_dir=True)
+    assert ignored(['build'], 'src/build', is_dir=True)
+    assert ignored(['*.log'], 'a/b/debug.log')
+    assert not ignored(['build'], 'builder')
+
+def test_slash_anchors_pattern_to_ignore_file_directory():
+    assert ignored(['/build'], 'build')
+    assert not ignored(['/build'], 'src/build')
+    assert ignored(['doc/*.txt'], 'doc/notes.txt')
+    assert not ignored(['doc/*.txt'], 'doc/sub/notes.txt')
+    assert not ignored(['doc/*.txt'], 'other/doc/notes.txt')
+
+def test_single_star_and_question_mark_stay_within_one_segment():
+    assert ignored(['src/*.py'], 'src/app.py')
+    assert not ignored(['src/*.py'], 'src/pkg/app.py')
+    assert ignored(['file?.txt'], 'file1.txt')
+    assert not ignored(['file?.txt'], 'file/.txt')
+
+def test_double_star_patterns():
+    assert ignored(['**/cache'], 'cache', is_dir=True)
+    assert ignored(['**/cache'], 'a/b/cache', is_dir=True)
+    assert ignored(['a/**/b'], 'a/b')
+    assert ignored(['a/**/b'], 'a/x/y/b')
+    assert not ignored(['a/**/b'], 'x/a/b')
+    assert ignored(['out/**'], 'out/x/y.js')
+    assert not ignored(['out/**'], 'out', is_dir=True)
+
+def test_negation_reincludes_and_last_match_wins():
+    rules = ['*.log', '!keep.log']
+    assert ignored(rules, 'debug.log')
+    assert not ignored(rules, 'keep.log')
+    assert ignored(['!keep.log', '*.log'], 'keep.log')
+
+def test_trailing_slash_matches_directories_only():
+    assert ignored(['logs/'], 'logs', is_dir=True)
+    assert not ignored(['logs/'], 'logs')
+    assert ignored(['logs/'], 'app/logs', is_dir=True)
+
+def test_escapes_and_character_classes():
+    assert ignored(['\\#notes'], '#notes')
+    assert ignored(['\\!important'], '!important')
+    assert ignored(['[ab]c.txt'], 'bc.txt')
+    assert not ignored(['[!ab]c.txt'], 'ac.txt')
+    assert ignored(['[!ab]c.txt'], 'zc.txt')
+
+def test_nested_ignore_files_apply_relative_to_their_directory():
+    rule_sets = [(0, compile_rules('*.tmp')), (len('sub/'), compile_rules('!keep.tmp', '/local'))]
+    assert autobot.is_ignored('sub/other.tmp', False, rule_sets)
+    assert not autobot.is_ignored('sub/keep.tmp', False, rule_sets)
+    assert autobot.is_ignored('sub/local', False, rule_sets)
+    assert not autobot.is_ignored('sub/deeper/local', False, rule_sets)
+
+def write_files(root, files):
+    for rel_path, content in files.items():
+        path = os.path.join(str(root), rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+def write_tool(root, name, script):
+    """Install an AI tool plugin that runs a Python script with the prompt on stdin"""
+    write_files(root / 'ai-tools', {f"{name}.py": (
+        "import sys\n"
+        f"SCRIPT = {script!r}\n"
+        "def build_invocation(prompt):\n"
+        "    return [sys.executable, '-c', SCRIPT], prompt\n")})
+
+def scanned_paths(root):
+    return sorted(os.path.relpath(entry.path, str(root)).replace(os.sep, '/')
+                  for _, _, files in autobot.scan_codebase(str(root)) for entry in files)
+
+def test_codebase_walk_prunes_ignored_paths_and_honours_nested_ignore_files(tmp_path):
+    write_files(tmp_path, {
+        '.gitignore': 'build/\n*.log\n',
+        'app.py': '', 'debug.log': '', 'build/out.js': '', 'node_modules/lib.js': '', '.hidden/x.py': '',
+        'src/.autobotignore': 'generated/\n!keep.log\n',
+        'src/main.py': '', 'src/keep.log': '', 'src/other.log': '', 'src/generated/api.py': '',
+    })
+    assert scanned_paths(tmp_path) == ['.gitignore', 'app.py', 'src/.autobotignore', 'src/keep.log', 'src/main.py']
+
+# Summary cache
+
+def test_summary_cache_skips_unchanged_files_and_rereads_changed_ones(workspace):
+    project = workspace / 'project'
+    write_files(project, {'README.md': 'first version\n'})
+    readme = str(project / 'README.md')
+    assert 'first version' in autobot.create_codebase_summary(str(project))
+    # Same size and mtime: the cached extract is used and the file is not read again
+    st = os.stat(readme)
+    write_files(project, {'README.md': 'other version\n'})
+    os.utime(readme, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert 'first version' in autobot.create_codebase_summary(str(project))
+    os.utime(readme, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert 'other version' in autobot.create_codebase_summary(str(project))
+
+# Spec index
+
+def test_spec_index_finds_nested_specs_under_namespaced_names(workspace):
+    write_files(workspace / 'specs', {
+        'api.md': '# API\n\n## Endpoints\n```\n## not a section\n```\n',
+        'frontend/alpine.md': '# Alpine\n', 'backend/python.md': '# Python\n', 'notes.txt': '',
+    })
+    assert autobot.get_specs() == ['api', 'backend/python', 'frontend/alpine']
+    _, _, title, sections = autobot.get_spec_index()['api']
+    assert (title, sections) == ('API', ['Endpoints'])
+
+def test_find_spec_path_accepts_a_unique_namespace_suffix(workspace):
+    write_files(workspace / 'specs', {'frontend/alpine.md': '', 'a/util.md': '', 'b/util.md': ''})
+    assert autobot.find_spec_path('alpine') == os.path.join(autobot.SPECS_DIR, 'frontend/alpine.md')
+    assert autobot.find_spec_path('frontend/alpine.md') == os.path.join(autobot.SPECS_DIR, 'frontend/alpine.md')
+    assert autobot.find_spec_path('missing') is None
+    with pytest.raises(ValueError):
+        autobot.find_spec_path('util')
+
+def test_spec_index_rereads_only_changed_specs(workspace, monkeypatch):
+    write_files(workspace / 'specs', {'one.md': '# One\n', 'two.md': '# Two\n'})
+    autobot.get_spec_index()
+    write_files(workspace / 'specs', {'two.md': '# Second\n'})
+    os.utime(str(workspace / 'specs' / 'two.md'), ns=(0, 10 ** 18))
+    read = []
+    outline = autobot.read_spec_outline
+    monkeypatch.setattr(autobot, 'read_spec_outline', lambda path: read.append(path) or outline(path))
+    monkeypatch.setattr(autobot, '_spec_index', None)
+    monkeypatch.setattr(autobot, '_spec_ast_memo', {})
+    monkeypatch.setattr(autobot, '_search_index_memo', {})
+    monkeypatch.setattr(autobot, '_config_memo', {'stamp': None, 'data': {}})
+    monkeypatch.setattr(autobot, '_module_memo', {})
+    monkeypatch.setattr(autobot, '_plugin_registry', None)
+    monkeypatch.setattr(autobot, '_agent_session', None)
+    monkeypatch.setattr(autobot, '_policy_overrides', {})
+    index = autobot.get_spec_index()
+    assert [os.path.basename(path) for path in read] == ['two.md']
+    assert (index['one'][2], index['two'][2]) == ('One', 'Second')
+
+# Search
+
+def test_search_ranks_the_best_matching_section_and_honours_the_section_filter(workspace, capsys):
+    write_files(workspace / 'specs', {
+        'chat.md': '# Chat\n\n## Transport\nMessages travel over WebSockets.\n\n## Storage\nKept in Postgres.\n',
+        'blog.md': '# Blog\n\n## Storage\nPosts are stored in SQLite.\n',
+    })
+    autobot.search_specs('websocket')
+    out = capsys.readouterr().out
+    assert 'Found 1 spec(s)' in out
+    assert 'chat  ## Transport  (line 3' in out
+    assert 'Messages travel over WebSockets.' in out
+    autobot.search_specs('postgres sqlite', section='storage')
+    assert 'Found 2 spec(s)' in capsys.readouterr().out
+    autobot.search_specs('websocket', section='storage')
+    assert 'No specs match' in capsys.readouterr().out
+
+def test_search_index_drops_stale_postings_when_a_spec_changes(workspace):
+    write_files(workspace / 'specs', {'app.md': '# App\n\n## Cache\nUses kafka.\n'})
+    assert 'app' in autobot.get_search_index()['postings']['kafka']
+    write_files(workspace / 'specs', {'app.md': '# App\n\n## Cache\nUses memcached now.\n'})
+    os.utime(str(workspace / 'specs' / 'app.md'), ns=(0, 10 ** 18))
+    autobot._spec_index = None
+    postings = autobot.get_search_index()['postings']
+    assert 'kafka' not in postings
+    assert 'app' in postings['memcached']
+
+# Spec parsing
+
+SPEC = """# Shop
+
+Intro text.
+
+## Purpose
+Sell things.
+
+### Goals
+- Be fast
+
+## Endpoints ##
+```http
+## Not A Heading
+GET /items
+```
+
+## UI Layout
+Two pages.
+"""
+
+def test_parse_spec_text_builds_section_tree_with_line_spans():
+    tree = autobot.parse_spec_text(SPEC)
+    (title,) = tree['children']
+    assert (title['heading'], title['level'], title['line'], title['end']) == ('Shop', 1, 1, 18)
+    headings = [(n['heading'], n['level'], n['line'], n['end']) for n in autobot.iter_spec_sections(tree)]
+    # A section runs up to the line before the next heading of the same or a higher level
+    assert headings == [('Shop', 1, 1, 18), ('Purpose', 2, 5, 10), ('Goals', 3, 8, 10),
+                        ('Endpoints', 2, 11, 16), ('UI Layout', 2, 17, 18)]
+    assert [child['heading'] for child in title['children'][0]['children']] == ['Goals']
+
+def test_parse_spec_text_skips_headings_inside_fences_and_records_code_blocks():
+    tree = autobot.parse_spec_text(SPEC)
+    endpoints = autobot.find_spec_section(tree, 'endpoints')
+    assert endpoints['code'] == [['http', 12, 15]]
+    assert autobot.find_spec_section(tree, 'Not A Heading') is None
+
+def test_parse_spec_text_unclosed_fence_runs_to_end():
+    tree = autobot.parse_spec_text("## A\n~~~\n## Hidden\n")
+    (section,) = tree['children']
+    assert section['code'] == [['', 2, 3]]
+    assert [n['heading'] for n in autobot.iter_spec_sections(tree)] == ['A']
+
+def test_parse_spec_text_without_headings():
+    tree = autobot.parse_spec_text("just text\nmore\n")
+    assert tree['children'] == [] and tree['end'] == 2
+
+def test_load_spec_reparses_only_after_the_file_changes(workspace, monkeypatch):
+    write_files(workspace / 'specs', {'shop.md': SPEC})
+    file_path = str(workspace / 'specs' / 'shop.md')
+    text, tree = autobot.load_spec(file_path)
+    assert text == SPEC and tree == autobot.parse_spec_text(SPEC)
+    parse = autobot.parse_spec_text
+    monkeypatch.setattr(autobot, 'parse_spec_text', lambda text: pytest.fail("spec was parsed again"))
+    assert autobot.load_spec(file_path)[1] is tree
+    write_files(workspace / 'specs', {'shop.md': "## Changed\n"})
+    os.utime(file_path, ns=(0, 10 ** 18))
+    monkeypatch.setattr(autobot, 'parse_spec_text', parse)
+    assert [node['heading'] for node in autobot.iter_spec_sections(autobot.load_spec(file_path)[1])] == ['Changed']
+    assert not os.path.exists(str(workspace / '.autobot-cache' / 'spec-ast'))
+
+def test_index_search_and_show_share_one_parse_per_spec(workspace, monkeypatch, capsys):
+    write_files(workspace / 'specs', {'shop.md': SPEC, 'blog.md': '# Blog\n\n## Posts\nMarkdown posts.\n'})
+    parsed = []
+    parse = autobot.parse_spec_text
+    monkeypatch.setattr(autobot, 'parse_spec_text', lambda text: parsed.append(text) or parse(text))
+    autobot.search_specs('posts')
+    autobot.main(['show', 'shop', '--section', 'Goals'])
+    assert '- Be fast' in capsys.readouterr().out
+    assert sorted(parsed) == sorted([SPEC, '# Blog\n\n## Posts\nMarkdown posts.\n'])
+
+# Section refine
+
+SECTION_REPLY = """import re, sys
+heading = re.search(r'starts with the heading line "([^"]+)"', sys.stdin.read()).group(1)
+print("```markdown")
+print(heading)
+print("Refined " + heading.lstrip('# ') + ".")
+print("```")
+"""
+
+def test_refine_sections_splices_replies_in_place_and_keeps_crlf_line_endings(workspace, capsys):
+    write_tool(workspace, 'stub', SECTION_REPLY)
+    spec = "# Shop\r\n\r\n## Purpose\r\nSell things.\r\n\r\n## Goals\r\n- Be fast\r\n\r\n## Scope\r\nSmall.\r\n"
+    (workspace / 'specs').mkdir()
+    (workspace / 'specs' / 'shop.md').write_bytes(spec.encode('utf-8'))
+    autobot.refine_spec('shop', 'stub', sections=['purpose', 'Scope'])
+    assert 'Refined 2 section(s)' in capsys.readouterr().out
+    assert (workspace / 'specs' / 'shop.md').read_bytes().decode('utf-8') == (
+        "# Shop\r\n\r\n## Purpose\r\nRefined Purpose.\r\n\r\n## Goals\r\n- Be fast\r\n\r\n"
+        "## Scope\r\nRefined Scope.\r\n")
+
+def test_refine_sections_rejects_overlapping_selections(workspace, capsys):
+    write_files(workspace / 'specs', {'shop.md': SPEC})
+    autobot.refine_spec('shop', 'stub', sections=['Purpose', 'Goals'])
+    assert 'overlaps another selected section' in capsys.readouterr().out
+
+# AI result cache
+
+def test_cached_run_replays_stdout_and_restores_output_files(workspace, capsys):
+    runs = workspace / 'runs.txt'
+    output = workspace / 'out.md'
+    write_tool(workspace, 'stub', (
+        "import sys\n"
+        f"open({str(runs)!r}, 'a').write('run\\n')\n"
+        f"open({str(output)!r}, 'w').write('written by the agent: ' + sys.stdin.read())\n"
+        "print('summary line')\n"))
+    result = autobot.run_ai_tool_cached('stub', 'prompt', [str(output)], echo=False)
+    assert result.returncode == 0 and not getattr(result, 'cached', False)
+    output.write_text('edited since')
+    lines = []
+    result = autobot.run_ai_tool_cached('stub', 'prompt', [str(output)], on_line=lines.append, echo=False)
+    assert result.cached and lines == ['summary line']
+    assert output.read_text() == 'written by the agent: prompt'
+    assert runs.read_text() == 'run\n'
+    # A different prompt misses, and use_cache=False runs the agent again
+    autobot.run_ai_tool_cached('stub', 'other prompt', [str(output)], echo=False)
+    autobot.run_ai_tool_cached('stub', 'prompt', [str(output)], use_cache=False, echo=False)
+    assert runs.read_text() == 'run\n' * 3
+
+def test_ai_cache_eviction_drops_least_recently_used_entries_beyond_the_size_limit(workspace):
+    cache_dir = workspace / '.autobot-cache' / 'ai-results'
+    cache_dir.mkdir(parents=True)
+    for age, name in enumerate(['new', 'old', 'oldest']):
+        entry = cache_dir / f"{name}.json"
+        entry.write_bytes(b'x' * 600 * 1024)
+        os.utime(str(entry), (os.path.getmtime(str(entry)) - age * 60,) * 2)
+    autobot.save_config({'ai_cache_max_mb': 1})
+    autobot.evict_ai_cache()
+    assert sorted(os.listdir(str(cache_dir))) == ['new.json']
+
+# Update replies
+
+def nodes_for(text, *headings):
+    tree = autobot.parse_spec_text(text)
+    return [autobot.find_spec_section(tree, heading) for heading in headings]
+
+def test_extract_updated_sections_matches_headings_and_appends_new_ones():
+    nodes = nodes_for(SPEC, 'Purpose', 'UI Layout')
+    reply = ("Here you go.\n\n## purpose\nSell more things.\n\n## Billing\nInvoices monthly.\n\n"
+             "## UI Layout\nThree pages.\n\n## Update Summary\n- changed purpose\n")
+    replacements, appended = autobot.extract_updated_sections(reply, nodes)
+    assert [(node['heading'], block) for node, block in replacements] == [
+        ('Purpose', ['## purpose', 'Sell more things.']), ('UI Layout', ['## UI Layout', 'Three pages.'])]
+    assert appended == [['## Billing', 'Invoices monthly.']]
+
+def test_extract_updated_sections_unwraps_fenced_reply_and_drops_trailing_summary():
+    nodes = nodes_for(SPEC, 'Purpose')
+    reply = "```markdown\n## Purpose\nNew purpose.\n\nUpdate Summary:\n- rewrote it\n```\n"
+    replacements, appended = autobot.extract_updated_sections(reply, nodes)
+    assert [block for _, block in replacements] == [['## Purpose', 'New purpose.']]
+    assert appended == []
+
+def test_extract_updated_sections_ignores_repeats_and_headings_in_code():
+    nodes = nodes_for(SPEC, 'Purpose')
+    reply = ("## Purpose\nFirst.\n\n## Purpose\nSecond.\n\n## Extra\n```\n## Purpose\n```\n\n"
+             "## Extra\nAgain.\n")
+    replacements, appended = autobot.extract_updated_sections(reply, nodes)
+    assert [block for _, block in replacements] == [['## Purpose', 'First.']]
+    assert appended == [['## Extra', '```', '## Purpose', '```']]
+
+# Includes
+
+def test_includes_expand_whole_specs_and_single_sections_recursively(workspace):
+    write_files(workspace / 'specs', {
+        'app.md': "# App\n<!-- @include shared/auth -->\n```\n<!-- @include shared/auth -->\n```\n",
+        'shared/auth.md': "# Auth\n\n## Tokens\nUse JWT.\n<!-- @include style#Tone -->\n\n## Other\nNo.\n",
+        'style.md': "# Style\n\n## Tone\nBe brief.\n",
+    })
+    text = autobot.read_spec_prompt(str(workspace / 'specs' / 'app.md'))
+    assert text == ("# App\n# Auth\n\n## Tokens\nUse JWT.\n## Tone\nBe brief.\n\n## Other\nNo.\n"
+                    "```\n<!-- @include shared/auth -->\n```\n")
+    includes = autobot.get_spec_includes(str(workspace / 'specs' / 'app.md'))
+    assert sorted(os.path.basename(path) for path in includes) == ['auth.md', 'style.md']
+
+def test_include_cycles_and_unknown_specs_are_errors(workspace):
+    write_files(workspace / 'specs', {
+        'a.md': "<!-- @include b -->\n", 'b.md': "<!-- @include a -->\n", 'c.md': "<!-- @include nope -->\n",
+    })
+    with pytest.raises(ValueError, match='Include cycle: a -> b -> a'):
+        autobot.read_spec_prompt(str(workspace / 'specs' / 'a.md'))
+    with pytest.raises(ValueError, match="unknown spec 'nope'"):
+        autobot.read_spec_prompt(str(workspace / 'specs' / 'c.md'))
+
+def test_dryrun_describes_the_expanded_prompt_rather_than_the_spec_file(workspace, capsys):
+    write_tool(workspace, 'stub', "print('ok')")
+    write_files(workspace / 'ai-tools', {'inline.py': "def build_invocation(prompt):\n"
+                                                      "    return ['agent', '--prompt', prompt], None\n"})
+    write_files(workspace / 'specs', {'app.md': "# App\n<!-- @include part -->\n", 'part.md': "Shared.\n"})
+    autobot.dryrun_generation('app', 'stub')
+    out = capsys.readouterr().out
+    assert 'app.md' not in out and ' < ' not in out
+    assert 'Prompt (on stdin): 14 chars, ~4 tokens after expanding 1 include(s): part' in out
+    autobot.dryrun_generation('app', 'inline')
+    out = capsys.readouterr().out
+    assert "agent --prompt '<prompt>'" in out and 'Prompt (as an argument)' in out
+
+def test_cached_expansion_is_rebuilt_when_an_included_spec_changes(workspace):
+    write_files(workspace / 'specs', {'app.md': "<!-- @include part -->\n", 'part.md': "old\n"})
+    app = str(workspace / 'specs' / 'app.md')
+    assert autobot.read_spec_prompt(app) == "old\n"
+    write_files(workspace / 'specs', {'part.md': "new text\n"})
+    assert autobot.read_spec_prompt(app) == "new text\n"
+
+# Chunking
+
+def make_spec(sections, words=200):
+    body = "\n".join(f"## Section {i}\n" + " ".join(f"word{j}" for j in range(words)) for i in range(sections))
+    return f"# Big Spec\n\nShared context.\n\n{body}\n"
+
+def test_chunk_spec_splits_on_section_boundaries_within_budget():
+    preamble, chunks = autobot.chunk_spec(make_spec(6), 800)
+    assert preamble == "# Big Spec\n\nShared context."
+    assert len(chunks) > 1
+    budget = 800 - autobot.estimate_tokens(preamble) - autobot.CHUNK_NOTE_TOKENS
+    for headings, body in chunks:
+        assert autobot.estimate_tokens(body) <= budget
+        assert body.startswith("## " + headings[0])
+    covered = [heading for headings, _ in chunks for heading in headings]
+    assert covered == [f"Section {i}" for i in range(6)]
+
+def test_chunk_spec_merges_small_sections():
+    _, chunks = autobot.chunk_spec(make_spec(4, words=5), 800)
+    assert [headings for headings, _ in chunks] == [[f"Section {i}" for i in range(4)]]
+
+def test_chunk_spec_moves_long_preamble_into_its_own_chunk():
+    text = "# Title\n\n" + "intro " * 400 + "\n\n## Only\nBody.\n"
+    preamble, chunks = autobot.chunk_spec(text, 1000)
+    assert preamble == "# Title"
+    assert chunks[0][0][0] == 'Title' and 'intro intro' in chunks[0][1]
+    assert [heading for headings, _ in chunks for heading in headings] == ['Title', 'Only']
+
+def test_chunk_spec_splits_oversized_section_between_paragraphs():
+    paragraphs = "\n\n".join("para%d " % i + "x " * 150 for i in range(6))
+    _, chunks = autobot.chunk_spec(f"# T\n\n## Huge\n{paragraphs}\n", 400)
+    assert len(chunks) > 1
+    assert all(headings == ['Huge'] for headings, _ in chunks)
+
+
+# Daemon
+
+def test_daemon_serves_read_only_commands_with_a_fresh_spec_index(workspace, monkeypatch):
+    monkeypatch.setattr(autobot, '_daemon_mode', False)
+    write_files(workspace / 'specs', {'app.md': '# App\n'})
+    # The socket must be private from the moment it exists, not only after a later chmod
+    monkeypatch.setattr(os, 'chmod', lambda *args, **kwargs: None)
+    old_umask = os.umask(0o022)
+    thread = threading.Thread(target=autobot.run_daemon, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not autobot.send_daemon_request({'ping': True}, timeout=1):
+        assert time.monotonic() < deadline, "daemon did not start"
+        time.sleep(0.05)
+    assert os.stat(autobot.get_daemon_socket_path()).st_mode & 0o077 == 0
+    assert os.umask(old_umask) == 0o022
+    assert 'app' in autobot.send_daemon_request({'args': ['ls']})['stdout']
+    write_files(workspace / 'specs', {'blog.md': '# Blog\n'})
+    assert 'blog' in autobot.send_daemon_request({'args': ['ls']})['stdout']
+    # The server enforces the allowlist itself rather than trusting the client
+    for args in (['generate', 'app'], ['config', 'set', 'x'], ['ls', '--trace', 'x.json'], 'ls', [1]):
+        assert 'the daemon only runs' in autobot.send_daemon_request({'args': args})['stdout']
+    assert autobot.send_daemon_request({'stop': True}) == {'stopped': True}
+    thread.join(10)
+    assert not os.path.exists(autobot.get_daemon_socket_path())
+    assert autobot.send_daemon_request({'ping': True}) is None
+
+def test_only_read_only_commands_are_forwarded_to_the_daemon(monkeypatch):
+    monkeypatch.delenv('AUTOBOT_NO_DAEMON', raising=False)
+    monkeypatch.setattr(autobot, '_daemon_mode', False)
+    sent = []
+    monkeypatch.setattr(autobot, 'send_daemon_request',
+                        lambda request, timeout=None: sent.append(request['args']) or {'stdout': '', 'stderr': ''})
+    for args in (['ls'], ['search', 'auth'], ['config', 'show'], ['generate', 'app'], ['config', 'set', 'x'],
+                 ['refine', 'app']):
+        autobot.forward_to_daemon(args)
+    assert sent == [['ls'], ['search', 'auth'], ['config', 'show']]
+    monkeypatch.setenv('AUTOBOT_NO_DAEMON', '1')
+    assert not autobot.forward_to_daemon(['ls'])
+
+# Plugin registry
+
+def test_plugin_registry_reads_manifests_without_importing_plugins(workspace):
+    write_files(workspace / 'ai-tools', {
+        'slow.py': "raise SystemExit('imported')\nMANIFEST = {'name': 'Slow', 'max_prompt_tokens': 500}\n"
+                   "def build_invocation(prompt):\n    pass\n",
+        '_helpers.py': "",
+    })
+    assert autobot.get_plugin_registry() == {
+        'slow': {'name': 'Slow', 'max_prompt_tokens': 500, 'entry_points': ['build_invocation']}}
+    assert autobot.get_context_tokens('slow') == 500
+    # A changed plugin file is read again
+    write_files(workspace / 'ai-tools', {'slow.py': "MANIFEST = {'name': 'Slower'}\n"})
+    os.utime(str(workspace / 'ai-tools' / 'slow.py'), ns=(0, 10 ** 18))
+    autobot._plugin_registry = None
+    assert autobot.get_ai_tool_manifest('slow') == {'name': 'Slower', 'entry_points': []}
+
+def test_manifest_limit_only_lowers_the_context_size(workspace):
+    write_files(workspace / 'ai-tools', {'big.py': "MANIFEST = {'max_prompt_tokens': 180000}\n",
+                                         'small.py': "MANIFEST = {'max_prompt_tokens': 30000}\n"})
+    assert autobot.get_context_tokens() == autobot.DEFAULT_CONTEXT_TOKENS
+    assert autobot.get_context_tokens('big') == autobot.DEFAULT_CONTEXT_TOKENS
+    assert autobot.get_context_tokens('small') == 30000
+    autobot.save_config({'context_tokens': 250000})
+    assert autobot.get_context_tokens('big') == 180000
+    autobot.save_config({'context_tokens': 20000})
+    assert autobot.get_context_tokens('small') == 20000
+
+# Tracing
+
+def test_trace_records_nested_spans_and_counters(workspace, monkeypatch, capsys):
+    monkeypatch.setattr(autobot, '_trace', None)
+    write_files(workspace / 'project', {'README.md': 'hello\n', 'main.py': 'def main():\n    pass\n'})
+    write_files(workspace / 'specs', {'app.md': '# App\n'})
+    trace_path = str(workspace / 'trace.json')
+    autobot.main(['ls', '--trace', trace_path])
+    assert 'app' in capsys.readouterr().out
+    with open(trace_path, encoding='utf-8') as f:
+        (command,) = [event for event in json.load(f)['traceEvents'] if event['ph'] == 'X']
+    assert (command['name'], command['args']['argv']) == ('command', ['ls'])
+    autobot.start_trace()
+    with autobot.trace_span('command'):
+        autobot.create_codebase_summary(str(workspace / 'project'))
+    autobot.write_trace(trace_path)
+    with open(trace_path, encoding='utf-8') as f:
+        events = json.load(f)['traceEvents']
+    spans = {event['name']: event for event in events if event['ph'] == 'X'}
+    assert {'command', 'codebase-summary', 'scan-codebase', 'read-files'} <= set(spans)
+    assert spans['read-files']['args']['bytes_read'] > 0
+    assert spans['command']['dur'] >= spans['codebase-summary']['dur']
+    assert 'codebase-summary' in capsys.readouterr().err
+
+# Record and replay
+
+def test_replay_serves_recorded_output_and_files_without_running_the_agent(workspace, capsys):
+    output = workspace / 'out.md'
+    write_tool(workspace, 'stub', (
+        "import sys, time\n"
+        f"open({str(output)!r}, 'w').write(sys.stdin.read().upper())\n"
+        "print('first', flush=True)\n"
+        "time.sleep(0.2)\n"
+        "print('second')\n"
+        "sys.exit(3)\n"))
+    recording = str(workspace / 'calls.jsonl')
+    autobot.start_agent_session('record', recording)
+    live = autobot.run_ai_tool('stub', 'the prompt', outputs=[str(output)], echo=False)
+    assert live.returncode == 3
+    # Replay must not need the plugin, and restores the file the agent wrote
+    os.unlink(str(workspace / 'ai-tools' / 'stub.py'))
+    output.write_text('changed')
+    capsys.readouterr()
+    autobot.start_agent_session('replay', recording)
+    lines = []
+    start = time.monotonic()
+    replayed = autobot.run_ai_tool('stub', 'the prompt', on_line=lines.append)
+    assert time.monotonic() - start >= 0.2
+    assert (replayed.returncode, lines) == (3, ['first', 'second'])
+    assert capsys.readouterr().out == 'first\nsecond\n'
+    assert output.read_text() == 'THE PROMPT'
+    autobot.start_agent_session('replay', recording, latency='zero')
+    start = time.monotonic()
+    assert autobot.run_ai_tool('stub', 'the prompt', capture_output=True).stdout == 'first\nsecond\n'
+    assert time.monotonic() - start < 0.2
+    missing = autobot.run_ai_tool('stub', 'another prompt', capture_output=True)
+    assert missing.returncode == 1 and 'No recorded stub call' in missing.stderr
+
+# Execution policy
+
+def test_execution_policy_prefers_flags_and_drops_unknown_fallback_tools(workspace):
+    write_tool(workspace, 'ok', "print('ok')")
+    autobot.save_config({'ai_timeout': 30, 'ai_retries': 2, 'fallback_ai_tools': ['ok', 'nope'], 'hedge_after': -1})
+    autobot._policy_overrides['ai_timeout'] = 5
+    policy = autobot.get_execution_policy()
+    assert (policy['timeout'], policy['retries'], policy['fallback'], policy['hedge_after']) == (5, 2, ['ok'], None)
+
+def test_timed_out_runs_are_retried_then_fall_back(workspace, capsys):
+    write_tool(workspace, 'hang', "import time\ntime.sleep(30)")
+    write_tool(workspace, 'ok', "print('ok')")
+    write_files(workspace / 'ai-tools', {'missing.py': "def build_invocation(prompt):\n"
+                                                       "    return ['/nonexistent/agent'], prompt\n"})
+    autobot.save_config({'ai_timeout': 0.3, 'ai_retries': 1, 'ai_retry_backoff': 0, 'fallback_ai_tools': ['ok']})
+    attempts = []
+    start = time.monotonic()
+    result = autobot.run_ai_tool('hang', 'prompt', capture_output=True, on_attempt=attempts.append)
+    assert time.monotonic() - start < 10
+    assert (attempts, result.ai_tool, result.stdout) == (['hang', 'hang', 'ok'], 'ok', 'ok\n')
+    assert 'hang failed (timed out after 0.3s); retrying' in capsys.readouterr().err
+    # A missing command is not retried
+    attempts = []
+    assert autobot.run_ai_tool('missing', 'prompt', capture_output=True, on_attempt=attempts.append).returncode == 0
+    assert attempts == ['missing', 'ok']
+    autobot.save_config({'ai_timeout': 0.3})
+    assert autobot.describe_failure(autobot.run_ai_tool('hang', 'prompt', capture_output=True)) == 'timed out after 0.3s'
+
+def test_hedged_run_returns_the_first_success_and_kills_the_slower_attempt(workspace, capsys):
+    marker = workspace / 'slow-finished'
+    write_tool(workspace, 'slow', f"import time\ntime.sleep(1.5)\nopen({str(marker)!r}, 'w').close()\nprint('slow')")
+    write_tool(workspace, 'fast', "print('fast')")
+    autobot.save_config({'hedge_after': 0.2, 'fallback_ai_tools': ['fast']})
+    start = time.monotonic()
+    result = autobot.run_ai_tool('slow', 'prompt', capture_output=True)
+    assert (result.ai_tool, result.stdout) == ('fast', 'fast\n')
+    assert time.monotonic() - start < 1.2
+    assert 'slow is still running after 0.2s; also starting fast' in capsys.readouterr().err
+    time.sleep(max(0, 1.8 - (time.monotonic() - start)))
+    assert not marker.exists()
+
+def test_hedged_batch_run_keeps_only_the_winners_changes(workspace, capsys):
+    out = workspace / 'out'
+    write_files(out, {'shared.txt': 'original\n', 'other.txt': 'original\n', '.gitignore': 'node_modules/\n',
+                      '.git/HEAD': 'ref: refs/heads/main\n', 'node_modules/dep.js': ''})
+    # The first agent only starts writing after the hedge, then stalls until it is killed
+    write_tool(workspace, 'slow', "import time\ntime.sleep(0.4)\nopen('shared.txt', 'w').write('slow\\n')\n"
+                                  "open('partial.txt', 'w').write('half')\ntime.sleep(5)")
+    write_tool(workspace, 'fast', "import os, time\ntime.sleep(0.6)\n"
+                                  "seen = repr(sorted(os.listdir('.')))\nopen('result.txt', 'w').write(seen)\n"
+                                  "open('other.txt', 'w').write('fast\\n')\nos.unlink('shared.txt')")
+    autobot.save_config({'hedge_after': 0.2, 'fallback_ai_tools': ['fast']})
+    result = autobot.run_ai_tool('slow', 'prompt', echo=False, cwd=str(out))
+    assert result.ai_tool == 'fast'
+    assert 'fast finished first' in capsys.readouterr().err
+    # The scratch copy held only the files the codebase walk visits
+    assert (out / 'result.txt').read_text() == repr(['.gitignore', 'other.txt', 'shared.txt'])
+    assert (out / 'other.txt').read_text() == 'fast\n'
+    assert not (out / 'shared.txt').exists() and not (out / 'partial.txt').exists()
+    assert (out / '.git' / 'HEAD').exists() and (out / 'node_modules' / 'dep.js').exists()
+
+def test_hedge_is_skipped_once_the_first_agent_has_changed_existing_files(workspace, capsys):
+    out = workspace / 'out'
+    write_files(out, {'app.py': 'old\n'})
+    write_tool(workspace, 'slow', "import time\nopen('app.py', 'w').write('new\\n')\ntime.sleep(0.5)")
+    write_tool(workspace, 'fast', "open('app.py', 'w').write('fast\\n')")
+    autobot.save_config({'hedge_after': 0.2, 'fallback_ai_tools': ['fast']})
+    result = autobot.run_ai_tool('slow', 'prompt', echo=False, cwd=str(out))
+    assert (result.ai_tool, result.hedged_tools) == ('slow', ['slow'])
+    assert 'slow has already changed files' in capsys.readouterr().err
+    assert (out / 'app.py').read_text() == 'new\n'
+
+# Prompt assembly
+
+def test_assemble_prompt_keeps_literal_parts_and_caps_generated_ones():
+    closed = []
+    def generated(size):
+        try:
+            for i in range(100):
+                yield f"line {i:03} " + "x" * size + "\n"
+        finally:
+            closed.append(True)
+    assert autobot.assemble_prompt(['head\n', (p for p in ['a', 'b']), 'tail']) == ['head\n', 'a', 'b', 'tail']
+    for size in (50, 0):
+        prompt = autobot.join_prompt(autobot.assemble_prompt(['head\n', generated(size), 'tail\n'], max_chars=300))
+        assert prompt.startswith('head\nline 000 ') and prompt.endswith('tail\n')
+        # The cap holds even when the truncation note does not fit in full
+        assert len(prompt) <= 300
+    assert closed == [True, True]
+    assert autobot.PROMPT_TRUNCATION_NOTE in autobot.join_prompt(
+        autobot.assemble_prompt(['head\n', generated(50), 'tail\n'], max_chars=300))
+    # Literal parts are never cut, so a prompt they alone push over the cap is refused
+    pending = generated(0)
+    with pytest.raises(ValueError, match='alone are'):
+        autobot.assemble_prompt(['x' * 400, pending], max_chars=300)
+    assert pending.gi_frame is None
+
+def test_streamed_summary_matches_the_materialized_one(workspace):
+    write_files(workspace / 'project', {'README.md': 'Readme.\n', 'app.py': 'def main():\n    pass\n'})
+    path = str(workspace / 'project')
+    report = {}
+    streamed = ''.join(autobot.iter_codebase_summary(path, report=report))
+    assert streamed == autobot.create_codebase_summary(path)
+    assert sorted(name for name, _ in report['included']) == ['README.md', 'app.py']
+
+def test_prompts_too_long_for_argv_fail_cleanly_and_are_not_retried(workspace, capsys):
+    (workspace / 'ai-tools').mkdir()
+    shutil.copy(os.path.join(ROOT, 'ai-tools', 'codex.py'), str(workspace / 'ai-tools'))
+    write_files(workspace / 'ai-tools', {'inline.py': "def build_invocation(prompt):\n"
+                                                      "    return ['true', prompt * 200000], None\n"})
+    write_tool(workspace, 'ok', "print('ok')")
+    autobot.save_config({'ai_retries': 2, 'ai_retry_backoff': 0, 'fallback_ai_tools': ['ok']})
+    # Under the token estimate, but well over 128 KiB once encoded
+    attempts = []
+    result = autobot.run_ai_tool('codex', '\u00e9' * 70000, capture_output=True, on_attempt=attempts.append)
+    assert (attempts, result.stdout) == (['codex', 'ok'], 'ok\n')
+    assert 'codex: could not be started: prompt is 140000 bytes' in capsys.readouterr().err
+    result = autobot.invoke_ai_tool('inline', 'x', capture_output=True)
+    assert result.returncode == 126 and result.stderr.startswith('true: could not be started:')